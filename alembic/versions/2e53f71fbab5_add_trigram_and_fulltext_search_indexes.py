@@ -0,0 +1,58 @@
+"""add trigram and full-text search indexes on products
+
+Revision ID: 2e53f71fbab5
+Revises: c58a3f3a6022
+Create Date: 2026-10-18 11:03:27.640512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2e53f71fbab5'
+down_revision: Union[str, Sequence[str], None] = 'c58a3f3a6022'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # ILIKE '%q%' и 'q%' по name обслуживаются этим индексом вместо seq scan
+    op.create_index(
+        "ix_products_name_trgm",
+        "products",
+        ["name"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    )
+
+    op.add_column(
+        "products",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "to_tsvector('russian', coalesce(name, '') || ' ' || coalesce(description, ''))",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_products_search_vector",
+        "products",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_products_search_vector", table_name="products")
+    op.drop_column("products", "search_vector")
+    op.drop_index("ix_products_name_trgm", table_name="products")
@@ -0,0 +1,32 @@
+"""add partial index on sharded products (concurrently)
+
+Revision ID: a6c1e9d3f047
+Revises: d4a8e6f2b913
+Create Date: 2026-10-18 17:42:18.371905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c1e9d3f047'
+down_revision: Union[str, Sequence[str], None] = 'd4a8e6f2b913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не работает в транзакции; миграцию можно катить на живую базу
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_products_sharded", "products", ["id"], unique=False,
+            postgresql_where=sa.text("stock_shards > 0"), postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_products_sharded", table_name="products", postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,60 @@
+"""add order_items unit_price/line_total, numeric orders.total_price, sales covering indexes
+
+Revision ID: a9d4e2b7c651
+Revises: f1a7c3e95b28
+Create Date: 2026-10-18 19:12:40.731904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d4e2b7c651'
+down_revision: Union[str, Sequence[str], None] = 'f1a7c3e95b28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("order_items", sa.Column("unit_price", sa.Numeric(12, 2), nullable=True))
+    # Цена на момент старых заказов не сохранилась — берём текущую цену товара
+    op.execute("""
+        UPDATE order_items AS oi
+        SET unit_price = p.price::numeric(12, 2)
+        FROM products AS p
+        WHERE p.id = oi.product_id
+    """)
+    op.alter_column("order_items", "unit_price", nullable=False)
+    op.add_column(
+        "order_items",
+        sa.Column("line_total", sa.Numeric(14, 2), sa.Computed("quantity * unit_price", persisted=True)),
+    )
+    # Итог старых заказов оставляем как был посчитан, только переводим в numeric
+    op.alter_column(
+        "orders", "total_price",
+        type_=sa.Numeric(14, 2), existing_type=sa.Float(), existing_nullable=False,
+        postgresql_using="round(total_price::numeric, 2)",
+    )
+    op.create_index(
+        "ix_order_items_product_sales", "order_items", ["product_id"],
+        unique=False, postgresql_include=["quantity", "line_total"],
+    )
+    op.create_index(
+        "ix_order_items_order_totals", "order_items", ["order_id"],
+        unique=False, postgresql_include=["quantity", "line_total"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_order_items_order_totals", table_name="order_items")
+    op.drop_index("ix_order_items_product_sales", table_name="order_items")
+    op.alter_column(
+        "orders", "total_price",
+        type_=sa.Float(), existing_type=sa.Numeric(14, 2), existing_nullable=False,
+        postgresql_using="total_price::double precision",
+    )
+    op.drop_column("order_items", "line_total")
+    op.drop_column("order_items", "unit_price")
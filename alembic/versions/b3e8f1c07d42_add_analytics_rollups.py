@@ -0,0 +1,78 @@
+"""add analytics rollups: sales_daily, order_status_daily, rollup_deltas
+
+Revision ID: b3e8f1c07d42
+Revises: a9d4e2b7c651
+Create Date: 2026-10-18 20:41:03.116587
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e8f1c07d42'
+down_revision: Union[str, Sequence[str], None] = 'a9d4e2b7c651'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Тип уже создан миграцией init вместе с orders.status
+ORDER_STATUS = postgresql.ENUM("pending", "shipped", "delivered", "cancelled", name="orderstatusenum", create_type=False)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sales_daily",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("units", sa.BigInteger(), nullable=False),
+        sa.Column("revenue", sa.Numeric(16, 2), nullable=False),
+        sa.Column("orders", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("day", "product_id", name="pk_sales_daily"),
+    )
+    op.create_index(
+        "ix_sales_daily_product_day", "sales_daily", ["product_id", "day"],
+        unique=False, postgresql_include=["units", "revenue"],
+    )
+    op.create_table(
+        "order_status_daily",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("status", ORDER_STATUS, nullable=False),
+        sa.Column("orders", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("day", "status", name="pk_order_status_daily"),
+    )
+    op.create_table(
+        "rollup_deltas",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=True),
+        sa.Column("status", ORDER_STATUS, nullable=True),
+        sa.Column("units", sa.BigInteger(), nullable=False),
+        sa.Column("revenue", sa.Numeric(16, 2), nullable=False),
+        sa.Column("orders", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    # Бэкфилл — то же, что python -m app.jobs.analytics_rollup --rebuild
+    op.execute("""
+        INSERT INTO sales_daily (day, product_id, units, revenue, orders)
+        SELECT date(timezone('UTC', o.created_at)), oi.product_id,
+               sum(oi.quantity), sum(oi.line_total), count(DISTINCT oi.order_id)
+        FROM order_items AS oi JOIN orders AS o ON o.id = oi.order_id
+        WHERE o.status != 'cancelled'
+        GROUP BY 1, 2
+    """)
+    op.execute("""
+        INSERT INTO order_status_daily (day, status, orders)
+        SELECT date(timezone('UTC', created_at)), status, count(*)
+        FROM orders
+        GROUP BY 1, 2
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table("rollup_deltas")
+    op.drop_table("order_status_daily")
+    op.drop_index("ix_sales_daily_product_day", table_name="sales_daily")
+    op.drop_table("sales_daily")
@@ -0,0 +1,28 @@
+"""add keyset pagination indexes on products
+
+Revision ID: c58a3f3a6022
+Revises: 84f6938126a4
+Create Date: 2026-10-18 10:12:41.305117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c58a3f3a6022'
+down_revision: Union[str, Sequence[str], None] = '84f6938126a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_products_price_id", "products", ["price", "id"], unique=False)
+    op.create_index("ix_products_quantity_id", "products", ["quantity", "id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_products_quantity_id", table_name="products")
+    op.drop_index("ix_products_price_id", table_name="products")
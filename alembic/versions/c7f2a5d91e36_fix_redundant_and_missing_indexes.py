@@ -0,0 +1,50 @@
+"""drop redundant id/name indexes, add orders customer_name and created_at indexes (concurrently)
+
+Revision ID: c7f2a5d91e36
+Revises: b3e8f1c07d42
+Create Date: 2026-10-18 22:03:27.540118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7f2a5d91e36'
+down_revision: Union[str, Sequence[str], None] = 'b3e8f1c07d42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Дублируют первичные ключи и uq_products_name
+REDUNDANT = [
+    ("ix_orders_id", "orders", ["id"]),
+    ("ix_products_id", "products", ["id"]),
+    ("ix_order_items_id", "order_items", ["id"]),
+    ("ix_products_name", "products", ["name"]),
+]
+# order_items.order_id / product_id уже покрыты ix_order_items_order_totals и
+# ix_order_items_product_sales, orders.status — ix_orders_status_created_at
+ADDED = [
+    ("ix_orders_customer_name_id", "orders", ["customer_name", "id"]),
+    ("ix_orders_created_at", "orders", ["created_at"]),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не работает в транзакции; миграцию можно катить на живую базу.
+    # IF [NOT] EXISTS — повторный запуск после прерванной миграции не падает
+    with op.get_context().autocommit_block():
+        for name, table, columns in ADDED:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+        for name, table, _ in REDUNDANT:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in REDUNDANT:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+        for name, table, _ in ADDED:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,203 @@
+"""partition orders and order_items by month of created_at, add orders_archive and order_items_archive
+
+Revision ID: d4a8e6f2b913
+Revises: c7f2a5d91e36
+Create Date: 2026-10-18 23:12:45.208311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8e6f2b913'
+down_revision: Union[str, Sequence[str], None] = 'c7f2a5d91e36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Тип уже создан миграцией init вместе с orders.status
+ORDER_STATUS = postgresql.ENUM("pending", "shipped", "delivered", "cancelled", name="orderstatusenum", create_type=False)
+# Секции создаются от месяца самого старого заказа до текущего + столько месяцев вперёд
+# (дальше их создаёт python -m app.jobs.order_archive --partitions)
+PARTITIONS_AHEAD = 3
+
+
+def _order_columns(id_default=None):
+    return [
+        sa.Column("id", sa.Integer(), server_default=id_default, nullable=False),
+        sa.Column("customer_name", sa.String(), nullable=False),
+        sa.Column("total_price", sa.Numeric(14, 2), nullable=False),
+        sa.Column("status", ORDER_STATUS, nullable=True),
+    ]
+
+
+def _item_columns(id_default=None):
+    return [
+        sa.Column("id", sa.Integer(), server_default=id_default, nullable=False),
+        sa.Column("order_id", sa.Integer(), nullable=False),
+        sa.Column("order_created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("unit_price", sa.Numeric(12, 2), nullable=False),
+        sa.Column("line_total", sa.Numeric(14, 2), sa.Computed("quantity * unit_price", persisted=True), nullable=True),
+    ]
+
+
+def _set_aside(table: str) -> None:
+    # Старая таблица остаётся источником копирования; имена индексов и
+    # последовательность освобождаются для новой
+    op.rename_table(table, f"{table}_old")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+
+
+def upgrade() -> None:
+    # Переписывает обе таблицы целиком под эксклюзивной блокировкой — в окно обслуживания
+    _set_aside("order_items")
+    _set_aside("orders")
+
+    op.create_table(
+        "orders",
+        *_order_columns(sa.text("nextval('orders_id_seq'::regclass)")),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    op.create_table(
+        "order_items",
+        *_item_columns(sa.text("nextval('order_items_id_seq'::regclass)")),
+        postgresql_partition_by="RANGE (order_created_at)",
+    )
+    op.execute("CREATE TABLE orders_default PARTITION OF orders DEFAULT")
+    op.execute("CREATE TABLE order_items_default PARTITION OF order_items DEFAULT")
+    # Секции и CHECK с их границами — как в app.crud.archive.create_month_partitions
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month date := date_trunc('month', timezone('UTC', coalesce((SELECT min(created_at) FROM orders_old), now())));
+            last date := date_trunc('month', timezone('UTC', now())) + interval '{PARTITIONS_AHEAD} months';
+            lower text;
+            upper text;
+        BEGIN
+            WHILE month <= last LOOP
+                lower := quote_literal(month::text || ' 00:00:00+00');
+                upper := quote_literal((month + interval '1 month')::date::text || ' 00:00:00+00');
+                EXECUTE format(
+                    'CREATE TABLE %1$I PARTITION OF orders (CONSTRAINT %2$I CHECK (created_at >= %3$s AND created_at < %4$s)) '
+                    'FOR VALUES FROM (%3$s) TO (%4$s)',
+                    'orders_p' || to_char(month, 'YYYY_MM'), 'orders_p' || to_char(month, 'YYYY_MM') || '_range', lower, upper
+                );
+                EXECUTE format(
+                    'CREATE TABLE %1$I PARTITION OF order_items (CONSTRAINT %2$I CHECK (order_created_at >= %3$s AND order_created_at < %4$s)) '
+                    'FOR VALUES FROM (%3$s) TO (%4$s)',
+                    'order_items_p' || to_char(month, 'YYYY_MM'), 'order_items_p' || to_char(month, 'YYYY_MM') || '_range', lower, upper
+                );
+                month := month + interval '1 month';
+            END LOOP;
+        END $$
+    """)
+
+    op.execute("""
+        INSERT INTO orders (id, customer_name, total_price, status, created_at)
+        SELECT id, customer_name, total_price, status, coalesce(created_at, now()) FROM orders_old
+    """)
+    op.execute("""
+        INSERT INTO order_items (id, order_id, order_created_at, product_id, quantity, unit_price)
+        SELECT i.id, i.order_id, o.created_at, i.product_id, i.quantity, i.unit_price
+        FROM order_items_old AS i JOIN orders AS o ON o.id = i.order_id
+    """)
+    op.drop_table("order_items_old")
+    op.drop_table("orders_old")
+    op.execute("ALTER SEQUENCE orders_id_seq OWNED BY orders.id")
+    op.execute("ALTER SEQUENCE order_items_id_seq OWNED BY order_items.id")
+
+    # Ключи и индексы — после копирования: строятся один раз по готовым данным
+    op.create_primary_key("orders_pkey", "orders", ["id", "created_at"])
+    op.create_index("ix_orders_status_created_at", "orders", ["status", "created_at"], unique=False)
+    op.create_index("ix_orders_customer_name_id", "orders", ["customer_name", "id"], unique=False)
+    op.create_index("ix_orders_created_at", "orders", ["created_at"], unique=False)
+    op.create_primary_key("order_items_pkey", "order_items", ["id", "order_created_at"])
+    op.create_foreign_key(
+        "order_items_order_fkey", "order_items", "orders",
+        ["order_id", "order_created_at"], ["id", "created_at"], ondelete="CASCADE", onupdate="CASCADE",
+    )
+    op.create_foreign_key("order_items_product_id_fkey", "order_items", "products", ["product_id"], ["id"])
+    op.create_index(
+        "ix_order_items_product_sales", "order_items", ["product_id"],
+        unique=False, postgresql_include=["quantity", "line_total"],
+    )
+    op.create_index(
+        "ix_order_items_order_totals", "order_items", ["order_id"],
+        unique=False, postgresql_include=["quantity", "line_total"],
+    )
+
+    op.create_table(
+        "orders_archive",
+        *_order_columns(),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id", "created_at", name="orders_archive_pkey"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    op.create_table(
+        "order_items_archive",
+        *_item_columns(),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"]),
+        sa.PrimaryKeyConstraint("id", "order_created_at", name="order_items_archive_pkey"),
+        postgresql_partition_by="RANGE (order_created_at)",
+    )
+    op.create_index(
+        "ix_order_items_archive_order_totals", "order_items_archive", ["order_id"],
+        unique=False, postgresql_include=["quantity", "line_total"],
+    )
+
+
+def downgrade() -> None:
+    # Архив возвращается в обычные таблицы вместе с живыми заказами
+    _set_aside("order_items")
+    _set_aside("orders")
+
+    op.create_table(
+        "orders",
+        *_order_columns(sa.text("nextval('orders_id_seq'::regclass)")),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+    )
+    op.create_table(
+        "order_items",
+        *[column for column in _item_columns(sa.text("nextval('order_items_id_seq'::regclass)")) if column.name != "order_created_at"],
+    )
+    op.execute("""
+        INSERT INTO orders (id, customer_name, total_price, status, created_at)
+        SELECT id, customer_name, total_price, status, created_at FROM orders_old
+        UNION ALL
+        SELECT id, customer_name, total_price, status, created_at FROM orders_archive
+    """)
+    op.execute("""
+        INSERT INTO order_items (id, order_id, product_id, quantity, unit_price)
+        SELECT id, order_id, product_id, quantity, unit_price FROM order_items_old
+        UNION ALL
+        SELECT id, order_id, product_id, quantity, unit_price FROM order_items_archive
+    """)
+    # Секции удаляются вместе с родительскими таблицами
+    op.drop_table("order_items_archive")
+    op.drop_table("orders_archive")
+    op.drop_table("order_items_old")
+    op.drop_table("orders_old")
+    op.execute("ALTER SEQUENCE orders_id_seq OWNED BY orders.id")
+    op.execute("ALTER SEQUENCE order_items_id_seq OWNED BY order_items.id")
+
+    op.create_primary_key("orders_pkey", "orders", ["id"])
+    op.create_index("ix_orders_status_created_at", "orders", ["status", "created_at"], unique=False)
+    op.create_index("ix_orders_customer_name_id", "orders", ["customer_name", "id"], unique=False)
+    op.create_index("ix_orders_created_at", "orders", ["created_at"], unique=False)
+    op.create_primary_key("order_items_pkey", "order_items", ["id"])
+    op.create_foreign_key("order_items_order_id_fkey", "order_items", "orders", ["order_id"], ["id"], ondelete="CASCADE")
+    op.create_foreign_key("order_items_product_id_fkey", "order_items", "products", ["product_id"], ["id"])
+    op.create_index(
+        "ix_order_items_product_sales", "order_items", ["product_id"],
+        unique=False, postgresql_include=["quantity", "line_total"],
+    )
+    op.create_index(
+        "ix_order_items_order_totals", "order_items", ["order_id"],
+        unique=False, postgresql_include=["quantity", "line_total"],
+    )
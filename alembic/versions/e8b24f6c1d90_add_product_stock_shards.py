@@ -0,0 +1,42 @@
+"""add sharded stock counters for hot products
+
+Revision ID: e8b24f6c1d90
+Revises: a3c9f2d84e17
+Create Date: 2026-10-18 19:11:06.203517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b24f6c1d90'
+down_revision: Union[str, Sequence[str], None] = 'a3c9f2d84e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("products", sa.Column("stock_shards", sa.Integer(), server_default="0", nullable=False))
+    op.create_table(
+        "product_stock_shards",
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("shard", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.CheckConstraint("quantity >= 0", name="ck_product_stock_shards_quantity"),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("product_id", "shard", name="pk_product_stock_shards"),
+    )
+
+
+def downgrade() -> None:
+    # Остаток из шардов возвращается в products.quantity
+    op.execute("""
+        UPDATE products p SET quantity = p.quantity + s.total
+        FROM (SELECT product_id, sum(quantity) AS total FROM product_stock_shards GROUP BY product_id) s
+        WHERE p.id = s.product_id
+    """)
+    op.drop_table("product_stock_shards")
+    op.drop_column("products", "stock_shards")
@@ -0,0 +1,26 @@
+"""add orders (status, created_at) index for reservation expiry
+
+Revision ID: f1a7c3e95b28
+Revises: e8b24f6c1d90
+Create Date: 2026-10-18 17:05:12.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a7c3e95b28'
+down_revision: Union[str, Sequence[str], None] = 'e8b24f6c1d90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_orders_status_created_at", "orders", ["status", "created_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_orders_status_created_at", table_name="orders")
@@ -0,0 +1,53 @@
+from typing import Annotated, List
+
+from fastapi import APIRouter, Depends, Query
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_read_db
+from app.core.responses import validated_response
+from app.crud import analytics
+from app.schemas.analytics import AnalyticsRange, OrderStatusCounts, SalesDailyRow, SalesQuery, StockRiskRow
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+_SALES_ROWS = TypeAdapter(List[SalesDailyRow])
+_STOCK_RISK_ROWS = TypeAdapter(List[StockRiskRow])
+
+
+@router.get("/sales/daily", response_model=List[SalesDailyRow])
+async def daily_sales(
+    params: Annotated[SalesQuery, Query()],
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Продано штук и выручка по товару за каждый день периода (по дню создания заказа, UTC).
+    Отменённые заказы не учитываются.
+    """
+    rows = await analytics.daily_sales(db, params.date_from, params.date_to, params.product_id, params.limit)
+    return validated_response(_SALES_ROWS, rows)
+
+
+@router.get("/orders/status", response_model=OrderStatusCounts)
+async def order_status_counts(
+    period: Annotated[AnalyticsRange, Query()],
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Сколько заказов, созданных за период, сейчас в каждом статусе.
+    """
+    by_status = await analytics.order_status_counts(db, period.date_from, period.date_to)
+    return OrderStatusCounts(
+        date_from=period.date_from, date_to=period.date_to, total=sum(by_status.values()), by_status=by_status,
+    )
+
+
+@router.get("/stock-risk", response_model=List[StockRiskRow])
+async def stock_risk(
+    days: int = Query(14, ge=1, le=90, description="за сколько последних дней считать темп продаж"),
+    horizon: float = Query(7, gt=0, le=365, description="показывать товары, которых хватит меньше чем на столько дней"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db),
+):
+    rows = await analytics.stock_risk(db, days, horizon, limit)
+    return validated_response(_STOCK_RISK_ROWS, rows)
@@ -0,0 +1,40 @@
+import os
+import time
+
+from fastapi import APIRouter, Depends, Query
+
+from app.core.database import get_read_session_factory
+from app.crud import outbox
+from app.schemas.change import ChangeEvent, ChangesPage
+
+router = APIRouter(prefix="/changes", tags=["changes"])
+
+# Как часто long-poll перечитывает outbox: изменения из других воркеров не будят ожидание
+CHANGES_POLL_INTERVAL = float(os.getenv("CHANGES_POLL_INTERVAL", "1"))
+
+
+@router.get("", response_model=ChangesPage)
+async def read_changes(
+    since: int = Query(0, ge=0, description="seq последнего обработанного события"),
+    limit: int = Query(100, ge=1, le=1000),
+    wait: float = Query(25.0, ge=0, le=60, description="сколько секунд ждать новых событий"),
+    session_factory=Depends(get_read_session_factory),
+):
+    """
+    Изменения товаров и заказов после since в порядке seq. Если новых нет — ждёт
+    до wait секунд. Следующий запрос — с since=next_since.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        # Сессия на одну выборку: ожидание не держит соединение из пула
+        async with session_factory() as db:
+            events = await outbox.list_changes(db, since, limit)
+        remaining = deadline - time.monotonic()
+        if events or remaining <= 0:
+            break
+        await outbox.notifier.wait(min(remaining, CHANGES_POLL_INTERVAL))
+
+    return ChangesPage(
+        events=[ChangeEvent.model_validate(e) for e in events],
+        next_since=events[-1].seq if events else since,
+    )
@@ -1,23 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Annotated
+import json
 import logging
-import uuid
+import time
 
-from app.core.database import get_db
-from app.schemas.order import OrderCreate, OrderRead, OrderStatusUpdate
+from app.core.database import get_db, get_read_db, get_read_session_factory
+from app.core.instrumentation import current_trace_id
+from app.core.responses import validated_response
+from app.schemas.order import (
+    OrderCreate, OrderRead, OrderStatusUpdate, OrderFilter, OrderPageParams,
+    OrderBulkCancel, OrderBulkCancelResult, OrderBatchRow, OrderBatchResult, ORDER_BATCH_MAX,
+)
 from app.crud import order as crud_order
+from app.crud import idempotency
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 logger = logging.getLogger(__name__)
 
+_ORDER_LIST = TypeAdapter(List[OrderRead])
+_CANCEL_RESULT = TypeAdapter(OrderBulkCancelResult)
+
 @router.post("/", response_model=OrderRead)
-async def create_order(order: OrderCreate, db: AsyncSession = Depends(get_db)):
-    trace_id = str(uuid.uuid4())
+async def create_order(
+    order: OrderCreate,
+    idempotency_key: idempotency.IdempotencyKeyHeader = None,
+    db: AsyncSession = Depends(get_db),
+):
+    # Тот же trace id, что в заголовке X-Trace-Id ответа и в логе медленных запросов
+    trace_id = current_trace_id()
     logger.info("[%s] ➕ Incoming create_order request from customer: %s", trace_id, order.customer_name)
 
     try:
-        result = await crud_order.create_order(db, order, trace_id=trace_id)
+        # Ключ и ответ по нему коммитятся в одной транзакции с заказом: повтор ждёт исходный запрос и получает его ответ
+        claimed = None
+        if idempotency_key is not None:
+            claimed = idempotency.ClaimedKey("POST /orders", idempotency_key)
+            stored = await idempotency.claim(db, claimed.scope, claimed.key, idempotency.request_hash(order))
+            if stored is not None:
+                logger.info("[%s] 🔁 Duplicate request for Idempotency-Key %s, replaying", trace_id, idempotency_key)
+                return stored.to_response()
+
+        result = await crud_order.create_order(db, order, trace_id=trace_id, idempotency_key=claimed)
         logger.info("[%s] ✅ Order created successfully with total: %.2f", trace_id, result.total_price)
         return result
 
@@ -29,12 +55,99 @@ async def create_order(order: OrderCreate, db: AsyncSession = Depends(get_db)):
         logger.exception("[%s] ❌ Order creation failed: %s", trace_id, str(e))
         raise
 
+async def _parse_batch_body(request: Request) -> tuple[list, list]:
+    """
+    JSON-массив OrderCreate. Невалидный заказ не валит весь пакет, а попадает в rejected.
+    """
+    try:
+        payload = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array of orders")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array of orders")
+    if len(payload) > ORDER_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Batch must contain at most {ORDER_BATCH_MAX} orders")
+
+    valid, rejected = [], []
+    for index, raw in enumerate(payload):
+        try:
+            valid.append((index, OrderCreate.model_validate(raw)))
+        except ValidationError as e:
+            err = e.errors()[0]
+            field = ".".join(str(p) for p in err["loc"]) or "row"
+            rejected.append(OrderBatchRow(index=index, status="rejected", error=f"{field}: {err['msg']}"))
+    return valid, rejected
+
+
+_BATCH_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"type": "array", "items": OrderCreate.model_json_schema()}}},
+    }
+}
+
+@router.post("/batch", response_model=OrderBatchResult, openapi_extra=_BATCH_BODY)
+async def create_orders_batch(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Пакетный импорт заказов (до ORDER_BATCH_MAX за запрос) одной транзакцией.
+    Ответ — статус каждого заказа по его индексу в массиве: created с id или rejected с причиной.
+    """
+    trace_id = current_trace_id()
+    started = time.perf_counter()
+    valid, rejected = await _parse_batch_body(request)
+    logger.info("[%s] 📦 Incoming batch of %d orders", trace_id, len(valid) + len(rejected))
+    outcomes = await crud_order.create_orders_batch(db, valid, trace_id=trace_id) if valid else []
+    elapsed = time.perf_counter() - started
+
+    rows = sorted(outcomes + rejected, key=lambda r: r.index)
+    created = sum(r.status == "created" for r in rows)
+    return OrderBatchResult(
+        created=created,
+        rejected=len(rows) - created,
+        elapsed_ms=round(elapsed * 1000, 3),
+        orders_per_sec=round(created / elapsed, 1) if elapsed > 0 else 0.0,
+        rows=rows,
+    )
+
 @router.get("/", response_model=List[OrderRead])
-async def read_orders(db: AsyncSession = Depends(get_db)):
-    return await crud_order.get_orders(db)
+async def read_orders(
+    filters: Annotated[OrderFilter, Depends()],
+    page_params: Annotated[OrderPageParams, Depends()],
+    db: AsyncSession = Depends(get_read_db),
+):
+    orders, next_cursor = await crud_order.get_orders(db, filters, page_params)
+    # Тело осталось списком ради совместимости — курсор следующей страницы отдаём заголовком
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+    return validated_response(_ORDER_LIST, orders, headers=headers)
+
+@router.get("/export")
+async def export_orders(
+    filters: Annotated[OrderFilter, Depends()],
+    session_factory=Depends(get_read_session_factory),
+):
+    """
+    Выгрузка всех заказов под фильтр в NDJSON (по одному OrderRead на строку).
+    """
+    async def lines():
+        # Сессия живёт столько же, сколько поток: зависимости с yield закрываются до отправки тела
+        async with session_factory() as db:
+            async for order in crud_order.stream_orders(db, filters):
+                yield OrderRead.model_validate(order).model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/cancel", response_model=OrderBulkCancelResult)
+async def cancel_orders(params: OrderBulkCancel, db: AsyncSession = Depends(get_db)):
+    """
+    Массовая отмена: например, все pending-заказы покупателя. Остатки всех позиций
+    возвращаются одним запросом; уже отменённые заказы пропускаются.
+    """
+    orders = await crud_order.cancel_orders(db, params)
+    logger.info("🚫 Cancelled %d orders", len(orders))
+    return validated_response(_CANCEL_RESULT, {"cancelled": len(orders), "orders": orders})
 
 @router.get("/{order_id}", response_model=OrderRead)
-async def read_order(order_id: int, db: AsyncSession = Depends(get_db)):
+async def read_order(order_id: int, db: AsyncSession = Depends(get_read_db)):
     return await crud_order.get_order(db, order_id)
 
 @router.patch("/{order_id}", response_model=OrderRead)
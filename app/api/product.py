@@ -1,13 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import json
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Annotated
 from app.crud import product as product_crud
+from app.crud import idempotency
+from app.crud import stock
 from app.schemas.product import (
     ProductCreate, ProductRead,
     ProductPage, ProductSearch,
-    PageParams
+    PageParams, BulkRowResult, ProductBulkResult,
+    StockShardsUpdate, StockShardsRead,
 )
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
+from app.core.responses import FastJSONResponse, validated_response
 
 
 router = APIRouter(
@@ -15,41 +23,144 @@ router = APIRouter(
     tags=["products"],
 )
 
+_PRODUCT_PAGE = TypeAdapter(ProductPage)
+
+
+def _page_response(page: product_crud.ProductPageResult, page_params: PageParams) -> FastJSONResponse:
+    # Строки из БД проверяются схемой один раз; response_model ниже остаётся только для OpenAPI
+    return validated_response(_PRODUCT_PAGE, {
+        "items": page.items,
+        "total": page.total,
+        "has_more": page.has_more,
+        "limit": page_params.limit,
+        "offset": page_params.offset,
+        "next_cursor": page.next_cursor,
+    })
+
+
 @router.get("/list", response_model=ProductPage)
 async def list_products(
     page_params: Annotated[PageParams, Depends()],
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    items, total = await product_crud.list_products(
+    page = await product_crud.list_products(
         db, page_params=page_params
     )
-    return ProductPage(
-        items=[ProductRead.model_validate(i) for i in items],
-        total=total, limit=page_params.limit, offset=page_params.offset
-    )
+    return _page_response(page, page_params)
 
 @router.get("/search", response_model=ProductPage)
 async def search_products(
         product_search: Annotated[ProductSearch, Depends()],
         page_params: Annotated[PageParams, Depends()],
-        db: AsyncSession = Depends(get_db)):
-    items, total =  await product_crud.search_products(db=db, product_search=product_search, page_params=page_params)
-    return ProductPage(
-        items=[ProductRead.model_validate(i) for i in items],
-        total=total, limit=page_params.limit, offset=page_params.offset
-    )
+        db: AsyncSession = Depends(get_read_db)):
+    page = await product_crud.search_products(db=db, product_search=product_search, page_params=page_params)
+    return _page_response(page, page_params)
 
 
 @router.post("/", response_model=ProductRead)
-async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_db)):
-    return await product_crud.create_product(db=db, product=product)
+async def create_product(
+    product: ProductCreate,
+    idempotency_key: idempotency.IdempotencyKeyHeader = None,
+    db: AsyncSession = Depends(get_db),
+):
+    # Повтор с тем же ключом не прибавляет количество второй раз, а получает сохранённый ответ
+    claimed = None
+    if idempotency_key is not None:
+        claimed = idempotency.ClaimedKey("POST /products", idempotency_key)
+        stored = await idempotency.claim(db, claimed.scope, claimed.key, idempotency.request_hash(product))
+        if stored is not None:
+            return stored.to_response()
+
+    return await product_crud.create_product(db=db, product=product, idempotency_key=claimed)
+
+def _validate_bulk_row(index: int, raw: object, valid: list, rejected: list) -> None:
+    try:
+        valid.append((index, ProductCreate.model_validate(raw)))
+    except ValidationError as e:
+        err = e.errors()[0]
+        field = ".".join(str(p) for p in err["loc"]) or "row"
+        rejected.append(BulkRowResult(index=index, status="rejected", error=f"{field}: {err['msg']}"))
+
+
+async def _parse_bulk_body(request: Request) -> tuple[list, list]:
+    """
+    application/x-ndjson читается потоком построчно, всё остальное — как JSON-массив.
+    Невалидная строка не валит весь payload, а попадает в rejected.
+    """
+    valid, rejected = [], []
+
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        index, buffer = 0, b""
+
+        def consume(line: bytes):
+            nonlocal index
+            if not line.strip():
+                return
+            try:
+                raw = json.loads(line)
+            except ValueError:
+                rejected.append(BulkRowResult(index=index, status="rejected", error="invalid JSON"))
+            else:
+                _validate_bulk_row(index, raw, valid, rejected)
+            index += 1
+
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                consume(line)
+        consume(buffer)
+        return valid, rejected
+
+    try:
+        payload = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+
+    for index, raw in enumerate(payload):
+        _validate_bulk_row(index, raw, valid, rejected)
+    return valid, rejected
+
+
+_BULK_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": {"type": "array", "items": ProductCreate.model_json_schema()}},
+            "application/x-ndjson": {"schema": {"type": "string", "description": "Один ProductCreate на строку"}},
+        },
+    }
+}
+
+
+@router.post("/bulk", response_model=ProductBulkResult, openapi_extra=_BULK_BODY)
+async def bulk_upsert_products(request: Request, db: AsyncSession = Depends(get_db)):
+    started = time.perf_counter()
+    valid, rejected = await _parse_bulk_body(request)
+    outcomes, method = await product_crud.bulk_upsert_products(db, valid)
+    elapsed = time.perf_counter() - started
+
+    rows = sorted(outcomes + rejected, key=lambda r: r.index)
+    inserted = sum(r.status == "inserted" for r in outcomes)
+    return ProductBulkResult(
+        inserted=inserted,
+        updated=len(outcomes) - inserted,
+        rejected=len(rejected),
+        method=method,
+        elapsed_ms=round(elapsed * 1000, 3),
+        rows_per_sec=round(len(outcomes) / elapsed, 1) if elapsed > 0 else 0.0,
+        rows=rows,
+    )
+
 
 @router.get("/", response_model=List[ProductRead])
-async def read_products(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+async def read_products(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_read_db)):
     return await product_crud.get_products(db=db, skip=skip, limit=limit)
 
 @router.get("/{product_id:int}", response_model=ProductRead)
-async def read_product(product_id: int, db: AsyncSession = Depends(get_db)):
+async def read_product(product_id: int, db: AsyncSession = Depends(get_read_db)):
     db_product = await product_crud.get_product(db, product_id)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -62,6 +173,20 @@ async def update_product(product_id: int, product: ProductCreate, db: AsyncSessi
         raise HTTPException(status_code=404, detail="Product not found")
     return updated
 
+@router.put("/{product_id}/stock-shards", response_model=StockShardsRead)
+async def set_stock_shards(product_id: int, payload: StockShardsUpdate, db: AsyncSession = Depends(get_db)):
+    """
+    Шардированный склад для горячих товаров: остаток делится на N строк,
+    и параллельные заказы списывают с разных строк, не ожидая друг друга.
+    """
+    split = await stock.set_stock_shards(db, product_id, payload.shards)
+    if split is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    product = await product_crud.get_product(db, product_id)
+    return StockShardsRead(
+        product_id=product_id, shards=payload.shards, quantity=product.quantity, shard_quantities=split,
+    )
+
 @router.delete("/{product_id}", response_model=ProductRead)
 async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
     deleted = await product_crud.delete_product(db, product_id)
@@ -1,7 +1,16 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Response
+from fastapi.responses import PlainTextResponse
 
 
-from app.schemas.system import HealthResponse, EchoResponse, EchoRequest
+from app.core.database import pool_status
+from app.core import prometheus
+from app.core.health import readiness
+from app.core.metrics import pool_checkout_seconds, order_expiry_run_seconds, orders_expired_per_run
+from app.crud.product import product_cache
+from app.schemas.system import (
+    HealthResponse, EchoResponse, EchoRequest, PoolStatsResponse, CacheStatsResponse, OrderExpiryStatsResponse,
+    ReadinessResponse,
+)
 
 router = APIRouter(
     prefix= "/system",
@@ -12,8 +21,48 @@ router = APIRouter(
 async def check_health() -> HealthResponse:
     return HealthResponse(status="OK", service="warehouse api", version="0.1")
 
+@router.get("/readyz", response_model=ReadinessResponse, responses={503: {"model": ReadinessResponse}})
+async def check_ready(response: Response) -> ReadinessResponse:
+    """
+    Готов ли воркер принимать трафик: БД отвечает, в пуле есть свободные соединения,
+    воркер не останавливается. 503 — убрать из балансировки, но не перезапускать:
+    для перезапуска остаётся /system/healthz.
+    """
+    result = await readiness.check()
+    if not result["ready"]:
+        response.status_code = 503
+    return ReadinessResponse(**result)
+
 @router.post("/echo", response_model=EchoResponse)
 async def echo(payload: EchoRequest) -> EchoResponse:
     text = payload.message.upper() if payload.uppercase else payload.message
     text = text * payload.times
-    return EchoResponse(message=text, length=len(text))
\ No newline at end of file
+    return EchoResponse(message=text, length=len(text))
+
+@router.get("/pool", response_model=PoolStatsResponse)
+async def pool_stats() -> PoolStatsResponse:
+    return PoolStatsResponse(**pool_status(), checkout_wait_seconds=pool_checkout_seconds.snapshot())
+
+
+@router.get("/cache", response_model=CacheStatsResponse)
+async def cache_stats() -> CacheStatsResponse:
+    return CacheStatsResponse(**product_cache.stats())
+
+
+@router.get("/order-expiry", response_model=OrderExpiryStatsResponse)
+async def order_expiry_stats() -> OrderExpiryStatsResponse:
+    return OrderExpiryStatsResponse(
+        expired_per_run=orders_expired_per_run.snapshot(),
+        run_seconds=order_expiry_run_seconds.snapshot(),
+    )
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """
+    Метрики в текстовом формате Prometheus; при METRICS_MULTIPROC_DIR — сумма по всем воркерам.
+    """
+    return PlainTextResponse(
+        prometheus.render(prometheus.collect()),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
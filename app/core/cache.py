@@ -0,0 +1,242 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from pydantic import BaseModel
+
+
+class TTLCache:
+    """
+    Маленький in-process кэш с временем жизни записей.
+    Рассчитан на один event loop, поэтому без блокировок.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: dict[Hashable, tuple[float, Any]] = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.ttl <= 0:
+            return
+        if key not in self._data and len(self._data) >= self.maxsize:
+            # Самая старая вставка уходит первой — dict сохраняет порядок
+            del self._data[next(iter(self._data))]
+        self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class LRUCache:
+    """
+    Ограниченный LRU-кэш с TTL и счётчиками попаданий/промахов/вытеснений.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class CacheBackend(ABC):
+    """
+    Общий для всех воркеров кэш (например, Redis): хранилище строк плюс канал
+    инвалидаций, через который воркеры сбрасывают свои локальные копии.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> str | None: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: float) -> None: ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None: ...
+
+    @abstractmethod
+    async def publish_invalidation(self, key: str) -> None: ...
+
+    @abstractmethod
+    def subscribe(self, callback: Callable[[str], None]) -> None: ...
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """
+    Реализация CacheBackend в памяти процесса — для тестов и одиночного воркера.
+    Несколько ModelCache на одном бэкенде ведут себя как несколько воркеров.
+    """
+
+    def __init__(self):
+        self._data: dict[str, tuple[float, str]] = {}
+        self._subscribers: list[Callable[[str], None]] = []
+
+    async def get(self, key: str) -> str | None:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def publish_invalidation(self, key: str) -> None:
+        for callback in self._subscribers:
+            callback(key)
+
+    def subscribe(self, callback: Callable[[str], None]) -> None:
+        self._subscribers.append(callback)
+
+
+class ModelCache:
+    """
+    Read-through кэш pydantic-моделей: локальный LRU воркера + необязательный общий бэкенд.
+
+    Инвалидация сбрасывает локальную копию, удаляет ключ из бэкенда и рассылает
+    её остальным воркерам. Поколение ключа (номер его последней инвалидации) не
+    даёт чтению, начатому до инвалидации, положить в кэш устаревшее значение.
+    Чтение из отстающего источника (реплики) не кэшируется ещё stale_window секунд
+    после инвалидации: реплика могла не успеть получить запись.
+
+    Помнятся только maxsize последних инвалидаций; про вытесненные ключи кэш
+    считает, что их инвалидировали вместе с последней вытесненной записью.
+    """
+
+    def __init__(self, namespace: str, model: type[BaseModel], maxsize: int, ttl: float,
+                 backend: CacheBackend | None = None, stale_window: float = 0.0):
+        self.namespace = namespace
+        self.model = model
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.backend: CacheBackend | None = None
+        self.stale_window = stale_window
+        self._epoch = 0
+        # Ключ -> (поколение, time.monotonic() инвалидации), от старых к новым
+        self._invalidated: OrderedDict[Hashable, tuple[int, float]] = OrderedDict()
+        self._forgotten: tuple[int, float] = (0, float("-inf"))
+        if backend is not None:
+            self.use_backend(backend)
+
+    def use_backend(self, backend: CacheBackend) -> None:
+        self.backend = backend
+        backend.subscribe(self._on_remote_invalidation)
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _on_remote_invalidation(self, raw_key: str) -> None:
+        prefix = f"{self.namespace}:"
+        if raw_key.startswith(prefix):
+            key = raw_key[len(prefix):]
+            key = int(key) if key.isdigit() else key
+            self._mark_invalidated(key)
+            self.local.delete(key)
+
+    def _mark_invalidated(self, key: Hashable) -> None:
+        self._epoch += 1
+        self._invalidated[key] = (self._epoch, time.monotonic())
+        self._invalidated.move_to_end(key)
+        while len(self._invalidated) > max(self.local.maxsize, 1):
+            _, self._forgotten = self._invalidated.popitem(last=False)
+
+    def _last_invalidation(self, key: Hashable) -> tuple[int, float]:
+        return self._invalidated.get(key, self._forgotten)
+
+    def generation(self, key: Hashable) -> int:
+        return self._last_invalidation(key)[0]
+
+    async def get(self, key: Hashable) -> BaseModel | None:
+        value = self.local.get(key)
+        if value is not None or self.backend is None:
+            return value
+        raw = await self.backend.get(self._key(key))
+        if raw is None:
+            return None
+        value = self.model.model_validate_json(raw)
+        self.local.set(key, value)
+        return value
+
+    async def set(self, key: Hashable, value: BaseModel, generation: int, lagging: bool = False) -> None:
+        """
+        lagging — значение прочитано из источника, который может отставать от записи (реплика).
+        """
+        epoch, invalidated_at = self._last_invalidation(key)
+        # Ключ успели инвалидировать, пока значение читалось из БД, — не кладём устаревшее
+        if epoch != generation:
+            return
+        if lagging and time.monotonic() - invalidated_at < self.stale_window:
+            return
+        self.local.set(key, value)
+        if self.backend is not None:
+            await self.backend.set(self._key(key), value.model_dump_json(), self.local.ttl)
+
+    async def invalidate(self, *keys: Hashable) -> None:
+        for key in keys:
+            self._mark_invalidated(key)
+            self.local.delete(key)
+            if self.backend is not None:
+                await self.backend.delete(self._key(key))
+                await self.backend.publish_invalidation(self._key(key))
+
+    def clear(self) -> None:
+        self.local.clear()
+        self._invalidated.clear()
+        self._forgotten = (self._epoch, float("-inf"))
+
+    def stats(self) -> dict:
+        return self.local.stats()
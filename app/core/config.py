@@ -0,0 +1,96 @@
+import os
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    """
+    Настройки подключения и пула. Все значения читаются из переменных окружения DB_*.
+    """
+    url: str | None
+    echo: bool = False
+    pool_size: int = 10
+    max_overflow: int = 10
+    pool_timeout: float = 10.0
+    pool_pre_ping: bool = True
+    pool_recycle: int = 1800
+    # 0 — без ограничения
+    statement_timeout_ms: int = 0
+    # Через сколько выполнений psycopg готовит server-side prepared statement; пусто — никогда
+    prepare_threshold: int | None = 5
+    # PgBouncer в transaction pooling: без prepared statements и startup-параметров
+    pgbouncer: bool = False
+    # Реплика для чтения; пусто — все запросы идут в основную БД
+    replica_url: str | None = None
+    # Сколько секунд после записи клиент читает из основной БД (read-your-writes)
+    read_primary_window: float = 5.0
+    # Операторы дольше порога логируются с планом; 0 — не логировать
+    slow_query_ms: int = 500
+    slow_query_explain: bool = True
+
+    @classmethod
+    def from_env(cls) -> "DatabaseSettings":
+        threshold = os.getenv("DB_PREPARE_THRESHOLD")
+        return cls(
+            url=os.getenv("DATABASE_URL"),
+            echo=_env_bool("DB_ECHO", cls.echo),
+            pool_size=_env_int("DB_POOL_SIZE", cls.pool_size),
+            max_overflow=_env_int("DB_MAX_OVERFLOW", cls.max_overflow),
+            pool_timeout=_env_float("DB_POOL_TIMEOUT", cls.pool_timeout),
+            pool_pre_ping=_env_bool("DB_POOL_PRE_PING", cls.pool_pre_ping),
+            pool_recycle=_env_int("DB_POOL_RECYCLE", cls.pool_recycle),
+            statement_timeout_ms=_env_int("DB_STATEMENT_TIMEOUT_MS", cls.statement_timeout_ms),
+            prepare_threshold=cls.prepare_threshold if threshold is None else (int(threshold) if threshold else None),
+            pgbouncer=_env_bool("DB_PGBOUNCER", cls.pgbouncer),
+            replica_url=os.getenv("REPLICA_DATABASE_URL") or None,
+            read_primary_window=_env_float("DB_READ_PRIMARY_WINDOW", cls.read_primary_window),
+            slow_query_ms=_env_int("DB_SLOW_QUERY_MS", cls.slow_query_ms),
+            slow_query_explain=_env_bool("DB_SLOW_QUERY_EXPLAIN", cls.slow_query_explain),
+        )
+
+    def engine_options(self) -> dict:
+        connect_args: dict = {}
+        if self.pgbouncer:
+            # Prepared statements живут на серверном соединении, а PgBouncer отдаёт
+            # транзакции разным соединениям — отключаем их полностью.
+            # statement_timeout в этом режиме задаётся на роли: ALTER ROLE ... SET statement_timeout
+            connect_args["prepare_threshold"] = None
+        else:
+            connect_args["prepare_threshold"] = self.prepare_threshold
+            if self.statement_timeout_ms:
+                connect_args["options"] = f"-c statement_timeout={self.statement_timeout_ms}"
+
+        return {
+            "echo": self.echo,
+            "future": True,
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_timeout": self.pool_timeout,
+            "pool_pre_ping": self.pool_pre_ping,
+            "pool_recycle": self.pool_recycle,
+            "connect_args": connect_args,
+        }
+
+
+db_settings = DatabaseSettings.from_env()
@@ -1,17 +1,132 @@
-import os
-from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import time
+from contextlib import asynccontextmanager
+from functools import partial
+
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-load_dotenv()
+from app.core.config import db_settings
+from app.core.instrumentation import instrument
+from app.core.metrics import pool_checkout_seconds
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_URL = db_settings.url
 
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+engine = create_async_engine(DATABASE_URL, **db_settings.engine_options())
 SessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
+# Необязательная реплика для read-only ручек
+replica_engine = (
+    create_async_engine(db_settings.replica_url, **db_settings.engine_options())
+    if db_settings.replica_url else None
+)
+ReplicaSessionLocal = (
+    sessionmaker(bind=replica_engine, class_=AsyncSession, expire_on_commit=False)
+    if replica_engine is not None else None
+)
+
+for _engine in (engine, replica_engine):
+    if _engine is not None:
+        instrument(_engine.sync_engine, db_settings.slow_query_ms, db_settings.slow_query_explain)
+
 Base = declarative_base()
 
+# Кука с unix-временем, до которого клиент читает из основной БД
+PRIMARY_PIN_COOKIE = "wh_primary_until"
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# Метка в Session.info у сессий реплики: прочитанное могло отстать от записи
+REPLICA_INFO_KEY = "replica"
+
+
+@asynccontextmanager
+async def _open_session(factory):
+    async with factory() as session:
+        # Берём соединение сразу, чтобы измерить ожидание пула под нагрузкой
+        started = time.perf_counter()
+        await session.connection()
+        pool_checkout_seconds.observe(time.perf_counter() - started)
+        yield session
+
+
 async def get_db():
-    async with SessionLocal() as session:
+    async with _open_session(SessionLocal) as session:
+        yield session
+
+
+def pinned_to_primary(request: Request) -> bool:
+    value = request.cookies.get(PRIMARY_PIN_COOKIE)
+    if value is None:
+        return False
+    try:
+        until = float(value)
+    except ValueError:
+        return False
+    # Кука приходит от клиента: срок дальше окна сервер сам выставить не мог
+    now = time.time()
+    return now < until <= now + db_settings.read_primary_window
+
+
+def make_read_session_factory(primary_factory, replica_factory=None):
+    """
+    Выбирает фабрику сессий для read-only ручек: реплика, если она настроена и
+    клиент не закреплён за основной БД после недавней записи.
+    """
+    def get_read_session_factory(request: Request):
+        if replica_factory is not None and not pinned_to_primary(request):
+            return partial(replica_factory, info={REPLICA_INFO_KEY: True})
+        return primary_factory
+
+    return get_read_session_factory
+
+
+get_read_session_factory = make_read_session_factory(SessionLocal, ReplicaSessionLocal)
+
+
+async def get_read_db(factory=Depends(get_read_session_factory)):
+    async with _open_session(factory) as session:
         yield session
+
+
+def reads_from_replica(db: AsyncSession) -> bool:
+    return db.info.get(REPLICA_INFO_KEY, False)
+
+
+class PrimaryPinMiddleware:
+    """
+    После успешного небезопасного запроса ставит куку PRIMARY_PIN_COOKIE:
+    следующие чтения этого клиента в течение окна идут в основную БД и видят
+    собственную запись, даже если реплика отстаёт.
+    """
+
+    def __init__(self, app, window: float = db_settings.read_primary_window):
+        self.app = app
+        self.window = window
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or self.window <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_pin(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + self.window
+                cookie = f"{PRIMARY_PIN_COOKIE}={until:.3f}; Max-Age={int(self.window) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_pin)
+
+
+def pool_status(db_engine: AsyncEngine = engine) -> dict:
+    pool = db_engine.pool
+    capacity = pool.size() + max(db_settings.max_overflow, 0)
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": checked_out,
+        # QueuePool считает overflow от -pool_size, пока пул не заполнен
+        "overflow": max(pool.overflow(), 0),
+        "capacity": capacity,
+        "saturation": round(checked_out / capacity, 4) if capacity else 0.0,
+    }
@@ -0,0 +1,141 @@
+"""
+Готовность принимать трафик (/system/readyz) и плавная остановка.
+
+Проверка БД и запаса пула кэшируется на READY_CACHE_TTL: сколько бы раз в секунду
+ни спрашивал оркестратор, в БД уходит не больше одного SELECT 1 на воркер.
+По SIGTERM воркер сначала объявляет себя неготовым и ещё SHUTDOWN_DRAIN_DELAY
+секунд принимает запросы — балансировщик успевает убрать его из ротации, —
+и только потом отдаёт сигнал uvicorn, который дожидается запросов в работе.
+"""
+import asyncio
+import logging
+import os
+import signal
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.database import engine, pool_status
+from app.core.metrics import http_metrics
+
+logger = logging.getLogger(__name__)
+
+READY_CACHE_TTL = float(os.getenv("READY_CACHE_TTL", "2"))
+READY_DB_TIMEOUT = float(os.getenv("READY_DB_TIMEOUT", "1"))
+# Сколько соединений пула должно оставаться свободными, чтобы брать новый трафик
+READY_MIN_POOL_HEADROOM = int(os.getenv("READY_MIN_POOL_HEADROOM", "1"))
+SHUTDOWN_DRAIN_DELAY = float(os.getenv("SHUTDOWN_DRAIN_DELAY", "5"))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "30"))
+
+
+class Readiness:
+    def __init__(self, engine: AsyncEngine, ttl: float = READY_CACHE_TTL, timeout: float = READY_DB_TIMEOUT,
+                 min_headroom: int = READY_MIN_POOL_HEADROOM):
+        self.engine = engine
+        self.ttl = ttl
+        self.timeout = timeout
+        self.min_headroom = min_headroom
+        self.draining = False
+        self._result: dict | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def check(self) -> dict:
+        """
+        {"ready": bool, "checks": {...}, "age_seconds": float}. Одновременные
+        пробы ждут одну проверку, а не запускают каждая свою.
+        """
+        if self.draining:
+            return {"ready": False, "checks": {"draining": {"ok": False, "detail": "shutting down"}}, "age_seconds": 0.0}
+        if self._fresh():
+            return self._with_age()
+        async with self._lock:
+            if not self._fresh():
+                self._result = await self._probe()
+                self._checked_at = time.monotonic()
+        return self._with_age()
+
+    def _fresh(self) -> bool:
+        return self._result is not None and time.monotonic() - self._checked_at < self.ttl
+
+    def _with_age(self) -> dict:
+        return {**self._result, "age_seconds": round(time.monotonic() - self._checked_at, 3)}
+
+    async def _probe(self) -> dict:
+        pool = pool_status(self.engine)
+        capacity = pool["capacity"]
+        headroom = capacity - pool["checked_out"]
+        checks = {"pool": {"ok": headroom >= self.min_headroom, "detail": f"{headroom} of {capacity} connections free"}}
+
+        if not checks["pool"]["ok"]:
+            # Пул исчерпан — не встаём в очередь за соединением ради пробы
+            checks["database"] = {"ok": False, "detail": "skipped: pool exhausted"}
+        else:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._ping(), self.timeout)
+                checks["database"] = {"ok": True, "detail": f"{(time.perf_counter() - started) * 1000:.1f} ms"}
+            except Exception as e:
+                detail = "timeout" if isinstance(e, asyncio.TimeoutError) else f"{type(e).__name__}: {e}".splitlines()[0]
+                checks["database"] = {"ok": False, "detail": detail}
+
+        ready = all(c["ok"] for c in checks.values())
+        if not ready:
+            logger.warning("🚦 Not ready: %s", {name: c["detail"] for name, c in checks.items() if not c["ok"]})
+        return {"ready": ready, "checks": checks}
+
+    async def _ping(self) -> None:
+        async with self.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+
+async def wait_for_in_flight(timeout: float = SHUTDOWN_DRAIN_TIMEOUT, interval: float = 0.05) -> int:
+    """
+    Ждёт, пока закончатся HTTP-запросы в работе (не дольше timeout). Возвращает, сколько осталось.
+    """
+    deadline = time.monotonic() + timeout
+    while http_metrics.in_flight > 0 and time.monotonic() < deadline:
+        await asyncio.sleep(interval)
+    if http_metrics.in_flight:
+        logger.warning("⏳ Shutdown drain timed out with %d requests in flight", http_metrics.in_flight)
+    return http_metrics.in_flight
+
+
+def install_sigterm_drain(readiness: Readiness, delay: float = SHUTDOWN_DRAIN_DELAY):
+    """
+    Оборачивает текущий обработчик SIGTERM (у uvicorn — плавная остановка сервера):
+    сразу переводит readiness в draining, а исходный обработчик вызывает через delay секунд.
+    Повторный SIGTERM не ждёт. Возвращает функцию, которая ставит исходный обработчик обратно.
+    """
+    # Обработчики сигналов ставятся только из главного потока
+    if threading.current_thread() is not threading.main_thread():
+        return lambda: None
+    original = signal.getsignal(signal.SIGTERM)
+    if not callable(original) or delay <= 0:
+        return lambda: None
+    loop = asyncio.get_running_loop()
+    pending: list[asyncio.TimerHandle] = []
+
+    def handle_sigterm(sig, frame):
+        if readiness.draining:
+            for handle in pending:
+                handle.cancel()
+            original(sig, frame)
+            return
+        readiness.draining = True
+        logger.info("🛑 SIGTERM received, draining for %.1fs before shutdown", delay)
+        # Обработчик сигнала может сработать, пока цикл спит в select — будим его
+        loop.call_soon_threadsafe(lambda: pending.append(loop.call_later(delay, original, sig, frame)))
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    def restore() -> None:
+        if signal.getsignal(signal.SIGTERM) is handle_sigterm:
+            signal.signal(signal.SIGTERM, original)
+
+    return restore
+
+
+readiness = Readiness(engine)
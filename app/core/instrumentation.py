@@ -0,0 +1,173 @@
+"""
+Статистика SQL по запросам: число операторов, время в БД и строки.
+
+Слушатели событий движка (instrument) пишут в QueryStats из contextvar, который
+ставит QueryStatsMiddleware на каждый HTTP-запрос. Итог уходит клиенту заголовком
+Server-Timing, а trace id запроса — заголовком X-Trace-Id и в логи медленных запросов.
+"""
+import contextvars
+import logging
+import re
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = "x-trace-id"
+_TRACE_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+# EXPLAIN имеет смысл только для DML; DDL, COPY и служебные команды пропускаем
+EXPLAINABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+
+class QueryStats:
+    """
+    Счётчики одного запроса. parent — внешний сбор (например, assert_max_queries
+    в тестах): всё, что записано сюда, добавляется и в него.
+    """
+
+    __slots__ = ("trace_id", "statements", "db_seconds", "rows", "parent")
+
+    def __init__(self, trace_id: str = "-", parent: "QueryStats | None" = None):
+        self.trace_id = trace_id
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.parent = parent
+
+    def record(self, seconds: float, rows: int) -> None:
+        stats = self
+        while stats is not None:
+            stats.statements += 1
+            stats.db_seconds += seconds
+            stats.rows += rows
+            stats = stats.parent
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.db_seconds * 1000:.2f};desc="{self.statements} statements, {self.rows} rows"'
+
+
+_current: contextvars.ContextVar[QueryStats | None] = contextvars.ContextVar("query_stats", default=None)
+
+
+def current_stats() -> QueryStats | None:
+    return _current.get()
+
+
+def current_trace_id() -> str:
+    stats = _current.get()
+    return stats.trace_id if stats is not None else str(uuid.uuid4())
+
+
+@contextmanager
+def capture_queries(trace_id: str = "-") -> Iterator[QueryStats]:
+    """
+    Собирает статистику всего, что выполнится внутри блока, включая вложенные HTTP-запросы.
+    """
+    stats = QueryStats(trace_id, parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+_instrumented: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+
+def instrument(sync_engine: Engine, slow_query_ms: int = 0, explain: bool = True) -> None:
+    """
+    Вешает слушатели на движок. slow_query_ms > 0 — операторы дольше порога
+    логируются с trace id и планом (EXPLAIN в savepoint той же транзакции).
+    """
+    if sync_engine in _instrumented:
+        return
+    _instrumented.add(sync_engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        if conn.info.get("explaining"):
+            return
+        stats = _current.get()
+        if stats is not None:
+            stats.record(elapsed, max(cursor.rowcount, 0))
+        if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+            plan = _explain(conn, statement, parameters) if explain and not executemany else None
+            logger.warning(
+                "[%s] 🐢 Slow query %.1f ms: %s%s",
+                stats.trace_id if stats is not None else "-",
+                elapsed * 1000,
+                " ".join(statement.split()),
+                f"\n{plan}" if plan else "",
+            )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        # Упавший оператор не дошёл до after_cursor_execute — не оставляем его время в стеке
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+def _explain(conn, statement: str, parameters) -> str | None:
+    if not EXPLAINABLE.match(statement):
+        return None
+    conn.info["explaining"] = True
+    try:
+        # Ошибка EXPLAIN не должна ломать транзакцию запроса — откатываемся к savepoint
+        conn.exec_driver_sql("SAVEPOINT slow_query_explain")
+        try:
+            rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters).all()
+        except Exception:
+            conn.exec_driver_sql("ROLLBACK TO SAVEPOINT slow_query_explain")
+            raise
+        conn.exec_driver_sql("RELEASE SAVEPOINT slow_query_explain")
+        return "\n".join(row[0] for row in rows)
+    except Exception as e:
+        logger.debug("EXPLAIN failed: %s", e)
+        return None
+    finally:
+        conn.info["explaining"] = False
+
+
+class QueryStatsMiddleware:
+    """
+    Заводит QueryStats на каждый HTTP-запрос и дописывает в ответ Server-Timing
+    (db — время, операторы и строки; app — всё время обработки) и X-Trace-Id.
+    Trace id берётся из входящего X-Trace-Id, если он корректный, иначе генерируется.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(TRACE_HEADER.encode(), b"").decode("latin-1")
+        trace_id = incoming if _TRACE_ID_RE.match(incoming) else str(uuid.uuid4())
+        started = time.perf_counter()
+
+        with capture_queries(trace_id) as stats:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    timing = f"{stats.server_timing()}, app;dur={(time.perf_counter() - started) * 1000:.2f}"
+                    message = {**message, "headers": [
+                        *message.get("headers", []),
+                        (b"server-timing", timing.encode()),
+                        (TRACE_HEADER.encode(), trace_id.encode()),
+                    ]}
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
@@ -1,14 +1,173 @@
+"""
+Логирование без блокировки event loop.
+
+Корневой логгер пишет только в QueueHandler: запись в очередь — микросекунды.
+Файл (с ротацией по размеру) и консоль обслуживает QueueListener в отдельном потоке.
+
+    LOG_LEVEL (INFO), LOG_FORMAT (text | json), LOG_FILE (logs/warehouse.log),
+    LOG_MAX_BYTES (10 МБ), LOG_BACKUP_COUNT (5), LOG_ITEM_RATE (50 строк/с на позиции заказа)
+
+Ротация по размеру безопасна, только пока файл пишет один процесс. Под uvicorn --workers N
+(и при LOG_MAX_BYTES=0) воркеры пишут в один общий файл без встроенной ротации
+(WatchedFileHandler): ротирует logrotate, воркеры переоткрывают файл после переименования.
+"""
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import multiprocessing
 import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from app.core.instrumentation import current_stats
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+# Логгер для строк «на каждую позицию заказа»: под нагрузкой их поток ограничивается
+ITEM_LOGGER = "app.items"
+
+_listener: logging.handlers.QueueListener | None = None
+_installed: list[tuple[logging.Filterer, logging.Filterer]] = []
+
+
+class TraceIdFilter(logging.Filter):
+    """
+    Проставляет record.trace_id из текущего запроса. Работает в потоке, где
+    вызван логгер, — до очереди, пока contextvar запроса ещё доступен.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        stats = current_stats()
+        record.trace_id = stats.trace_id if stats is not None else "-"
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket: не больше rate записей в секунду (с запасом burst). Лишние
+    записи отбрасываются до форматирования; число пропущенных дописывается
+    к следующей прошедшей записи.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                self.suppressed += 1
+                return False
+            self.tokens -= 1
+            suppressed, self.suppressed = self.suppressed, 0
+        if suppressed:
+            record.msg = f"{record.msg} (+{suppressed} similar suppressed)"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Базовый prepare форматирует запись целиком — в потоке event loop. Здесь только
+        # подставляем аргументы; форматирование делает поток QueueListener.
+        # С исключением — базовый путь: traceback превращается в текст сразу
+        if record.exc_info:
+            return super().prepare(record)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _file_handler(log_file: str) -> logging.Handler:
+    max_bytes = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    # Воркер uvicorn --workers N: RotatingFileHandler переименовывает файл, не зная о соседях,
+    # и их записи уходят в уже ротированный файл. Свой файл на pid тоже не годится — после
+    # каждого перезапуска воркера остаётся файл, который ничто не ротирует и не удаляет
+    if max_bytes <= 0 or multiprocessing.parent_process() is not None:
+        # Общий файл: запись идёт с O_APPEND, после переименования logrotate файл переоткрывается
+        return logging.handlers.WatchedFileHandler(log_file, encoding="utf-8")
+    return logging.handlers.RotatingFileHandler(
+        log_file,
+        maxBytes=max_bytes,
+        backupCount=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+        encoding="utf-8",
+    )
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    log_file = os.getenv("LOG_FILE", "logs/warehouse.log")
+    os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)  # 🧩 <-- создаёт папку, если её нет
+
+    formatter = JsonFormatter() if os.getenv("LOG_FORMAT", "text").lower() == "json" else logging.Formatter(TEXT_FORMAT)
+    file_handler = _file_handler(log_file)
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(TraceIdFilter())
+
+    root = logging.getLogger()
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    root.addHandler(queue_handler)
+    item_logger = logging.getLogger(ITEM_LOGGER)
+    rate_limit = RateLimitFilter(float(os.getenv("LOG_ITEM_RATE", "50")))
+    item_logger.addFilter(rate_limit)
+    _installed[:] = [(root, queue_handler), (item_logger, rate_limit)]
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    # Дописываем очередь при выходе процесса
+    atexit.register(shutdown_logging)
+    return _listener
+
 
-def setup_logging():
-    os.makedirs("logs", exist_ok=True)  # 🧩 <-- создаёт папку, если её нет
-
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        handlers=[
-            logging.FileHandler("logs/warehouse.log"),
-            logging.StreamHandler()
-        ]
-    )
\ No newline at end of file
+def shutdown_logging() -> None:
+    """
+    Дописывает очередь, закрывает файлы и снимает всё, что поставил setup_logging.
+    """
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    for owner, installed in _installed:
+        if isinstance(installed, logging.Handler):
+            owner.removeHandler(installed)
+        else:
+            owner.removeFilter(installed)
+    _installed.clear()
+    _listener = None
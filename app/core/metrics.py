@@ -0,0 +1,113 @@
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Sequence
+
+# Бакеты в секундах: от 1 мс до 10 с
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Кумулятивная гистограмма в духе Prometheus. observe() — O(log n) без аллокаций.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # последний — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        cumulative, running = {}, 0
+        for bound, n in zip((*self.buckets, float("inf")), self.counts):
+            running += n
+            cumulative["+Inf" if bound == float("inf") else str(bound)] = running
+        return {"buckets": cumulative, "sum": self.sum, "count": self.count}
+
+
+# Время ожидания соединения из пула (checkout + connect/pre-ping), секунды
+pool_checkout_seconds = Histogram()
+
+# Фоновая отмена просроченных pending-заказов: длительность запуска и сколько заказов отменено за запуск
+order_expiry_run_seconds = Histogram()
+orders_expired_per_run = Histogram(buckets=(0, 1, 10, 50, 100, 500, 1000, 5000, 10000))
+
+
+class RequestMetrics:
+    """
+    Счётчики HTTP по маршрутам: гистограмма длительности на (method, route)
+    и число ответов на (method, route, status). Маршрут — шаблон пути
+    (/products/{product_id}), а не сам путь: число меток ограничено числом ручек.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.latency: dict[tuple[str, str], Histogram] = {}
+        self.responses: dict[tuple[str, str, int], int] = {}
+        self.in_flight = 0
+
+    def observe(self, method: str, route: str, status: int, seconds: float) -> None:
+        key = (method, route)
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram(self.buckets)
+        histogram.observe(seconds)
+        key = (method, route, status)
+        self.responses[key] = self.responses.get(key, 0) + 1
+
+
+http_metrics = RequestMetrics()
+
+# Задержка event loop: сколько ждёт готовая к выполнению корутина
+event_loop_lag_seconds = Histogram(buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+
+async def measure_loop_lag() -> float:
+    # sleep(0) возвращает управление в конец очереди готовых колбэков — время до возврата и есть задержка
+    started = time.perf_counter()
+    await asyncio.sleep(0)
+    lag = time.perf_counter() - started
+    event_loop_lag_seconds.observe(lag)
+    return lag
+
+
+class MetricsMiddleware:
+    """
+    Длительность, статус и число запросов в работе для каждого HTTP-запроса.
+    На запрос — два perf_counter, пара поисков в dict и bisect.
+    """
+
+    def __init__(self, app, metrics: RequestMetrics = http_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.in_flight -= 1
+            # FastAPI кладёт совпавший маршрут в scope; 404 без маршрута — одной меткой
+            route = scope.get("route")
+            metrics.observe(scope["method"], route.path if route is not None else "unmatched", status, elapsed)
@@ -0,0 +1,51 @@
+import base64
+import json
+from typing import Any, Sequence
+
+from fastapi import HTTPException
+
+
+def encode_cursor(sort_by: str, sort_order: str, key: list[Any]) -> str:
+    """
+    Непрозрачный курсор: последний ключ сортировки страницы + параметры сортировки,
+    чтобы курсор нельзя было молча применить к другой сортировке.
+    """
+    raw = json.dumps({"s": sort_by, "o": sort_order, "k": key}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str) -> list[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key = data["k"]
+        if not isinstance(key, list):
+            raise ValueError("cursor key must be a list")
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if data.get("s") != sort_by or data.get("o") != sort_order:
+        raise HTTPException(status_code=400, detail="Cursor does not match sort_by/sort_order")
+
+    return key
+
+
+def check_cursor_key(key: list[Any], types: Sequence[type]) -> None:
+    """
+    Сверяет ключ курсора с Python-типами колонок сортировки: подделанный ключ
+    даёт 400 здесь, а не ошибку приведения типов в БД.
+    """
+    if len(key) != len(types) or not all(_key_matches(v, t) for v, t in zip(key, types)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _key_matches(value: Any, expected: type) -> bool:
+    # bool — подкласс int, но в ключе сортировки его не бывает
+    if isinstance(value, bool):
+        return False
+    if expected is float:
+        return isinstance(value, (int, float))
+    if expected is int:
+        # Не шире bigint: большее число Postgres не сравнит с целочисленной колонкой
+        return isinstance(value, int) and -2**63 <= value < 2**63
+    return isinstance(value, expected)
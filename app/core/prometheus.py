@@ -0,0 +1,189 @@
+"""
+Экспорт метрик в текстовом формате Prometheus для GET /system/metrics.
+
+Под uvicorn --workers N у каждого воркера свои счётчики в памяти. Если задан
+METRICS_MULTIPROC_DIR, воркеры периодически сбрасывают снимок в
+<dir>/<pid>.json, а /system/metrics складывает снимки всех живых воркеров —
+какой бы воркер ни принял запрос, ответ один и тот же.
+"""
+import json
+import logging
+import os
+from typing import Iterable
+
+from app.core.database import pool_status
+from app.core.metrics import (
+    Histogram,
+    event_loop_lag_seconds,
+    http_metrics,
+    order_expiry_run_seconds,
+    orders_expired_per_run,
+    pool_checkout_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR") or None
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+PREFIX = "warehouse_"
+
+HELP = {
+    "http_requests_total": ("counter", "HTTP responses by route and status"),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency by route"),
+    "http_requests_in_flight": ("gauge", "HTTP requests being processed"),
+    "db_pool_size": ("gauge", "DB connection pool size"),
+    "db_pool_checked_out": ("gauge", "DB connections in use"),
+    "db_pool_overflow": ("gauge", "DB overflow connections open"),
+    "db_pool_capacity": ("gauge", "DB pool size plus max overflow"),
+    "db_pool_checkout_wait_seconds": ("histogram", "Time waiting for a pooled DB connection"),
+    "event_loop_lag_seconds": ("histogram", "Delay before a ready coroutine gets to run"),
+    "order_expiry_run_seconds": ("histogram", "Duration of pending order expiry runs"),
+    "orders_expired_per_run": ("histogram", "Pending orders cancelled per expiry run"),
+}
+
+
+def local_snapshot() -> dict:
+    """
+    Снимок метрик этого процесса: {name: [[labels, value], ...]}, где value —
+    число или снимок гистограммы. Сериализуется в JSON как есть.
+    """
+    pool = pool_status()
+
+    def histogram(h: Histogram) -> list:
+        return [[{}, h.snapshot()]]
+
+    return {
+        "http_requests_total": [
+            [{"method": m, "route": r, "status": str(s)}, n] for (m, r, s), n in http_metrics.responses.items()
+        ],
+        "http_request_duration_seconds": [
+            [{"method": m, "route": r}, h.snapshot()] for (m, r), h in http_metrics.latency.items()
+        ],
+        "http_requests_in_flight": [[{}, http_metrics.in_flight]],
+        "db_pool_size": [[{}, pool["size"]]],
+        "db_pool_checked_out": [[{}, pool["checked_out"]]],
+        "db_pool_overflow": [[{}, pool["overflow"]]],
+        "db_pool_capacity": [[{}, pool["capacity"]]],
+        "db_pool_checkout_wait_seconds": histogram(pool_checkout_seconds),
+        "event_loop_lag_seconds": histogram(event_loop_lag_seconds),
+        "order_expiry_run_seconds": histogram(order_expiry_run_seconds),
+        "orders_expired_per_run": histogram(orders_expired_per_run),
+    }
+
+
+def _snapshot_path(directory: str, pid: int) -> str:
+    return os.path.join(directory, f"{pid}.json")
+
+
+def write_snapshot(directory: str | None = METRICS_MULTIPROC_DIR) -> None:
+    if directory is None:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = _snapshot_path(directory, os.getpid())
+    # Атомарная замена: читатель никогда не увидит недописанный файл
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(local_snapshot(), f)
+    os.replace(tmp, path)
+
+
+def remove_snapshot(directory: str | None = METRICS_MULTIPROC_DIR) -> None:
+    if directory is None:
+        return
+    try:
+        os.remove(_snapshot_path(directory, os.getpid()))
+    except FileNotFoundError:
+        pass
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_snapshots(directory: str) -> Iterable[dict]:
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        pid = int(name[:-5]) if name[:-5].isdigit() else None
+        if pid is None:
+            continue
+        path = os.path.join(directory, name)
+        if pid != os.getpid() and not _alive(pid):
+            # Воркер умер — его счётчики пропадают, Prometheus увидит это как сброс
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            with open(path, encoding="utf-8") as f:
+                yield json.load(f)
+        except (OSError, ValueError):
+            logger.warning("⚠️ Skipping unreadable metrics snapshot %s", path)
+
+
+def merge(snapshots: Iterable[dict]) -> dict:
+    """
+    Складывает снимки процессов: счётчики, gauge и бакеты гистограмм суммируются по меткам.
+    """
+    merged: dict[str, dict[tuple, object]] = {}
+    for snapshot in snapshots:
+        for name, samples in snapshot.items():
+            series = merged.setdefault(name, {})
+            for labels, value in samples:
+                key = tuple(sorted(labels.items()))
+                current = series.get(key)
+                if current is None:
+                    series[key] = value
+                elif isinstance(value, dict):
+                    series[key] = {
+                        "buckets": {b: current["buckets"].get(b, 0) + n for b, n in value["buckets"].items()},
+                        "sum": current["sum"] + value["sum"],
+                        "count": current["count"] + value["count"],
+                    }
+                else:
+                    series[key] = current + value
+    return {name: [[dict(key), value] for key, value in series.items()] for name, series in merged.items()}
+
+
+def collect(directory: str | None = METRICS_MULTIPROC_DIR) -> dict:
+    if directory is None:
+        return local_snapshot()
+    # Свой снимок — свежий, остальные — с последнего сброса воркера
+    write_snapshot(directory)
+    return merge(_read_snapshots(directory))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict, extra: dict | None = None) -> str:
+    items = {**labels, **(extra or {})}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items.items()) + "}"
+
+
+def render(snapshot: dict) -> str:
+    lines = []
+    for name, samples in snapshot.items():
+        kind, help_text = HELP.get(name, ("untyped", name))
+        full = PREFIX + name
+        lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} {kind}")
+        for labels, value in sorted(samples, key=lambda s: sorted(s[0].items())):
+            if isinstance(value, dict):
+                for bound, count in value["buckets"].items():
+                    lines.append(f"{full}_bucket{_labels(labels, {'le': bound})} {count}")
+                lines.append(f"{full}_sum{_labels(labels)} {value['sum']}")
+                lines.append(f"{full}_count{_labels(labels)} {value['count']}")
+            else:
+                lines.append(f"{full}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,90 @@
+"""
+Проверка планов запросов: последовательное сканирование большой таблицы в запросе
+ручки почти всегда означает недостающий индекс.
+
+capture_statements собирает SQL, который выполнило приложение (с параметрами),
+seq_scans прогоняет каждый оператор через EXPLAIN и возвращает Seq Scan с
+фильтром по таблицам, где строк не меньше порога. Seq Scan без фильтра — чтение
+всей таблицы, которое нужно запросу (count(*), хэш-соединение), а не пропущенный
+индекс. Используется тестом tests/test_query_plans.py на засеянной БД.
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.instrumentation import EXPLAINABLE
+
+
+@dataclass
+class Statement:
+    sql: str
+    parameters: object
+
+
+@dataclass
+class SeqScan:
+    table: str
+    filter: str
+    sql: str
+
+    def __str__(self) -> str:
+        return f"Seq Scan on {self.table} filter {self.filter}: {' '.join(self.sql.split())[:300]}"
+
+
+@contextmanager
+def capture_statements(target=Engine) -> Iterator[list[Statement]]:
+    """
+    Собирает операторы всех движков (или одного target), выполненные внутри блока.
+    executemany пропускается: это вставки, сканировать в них нечего.
+    """
+    statements: list[Statement] = []
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and not conn.info.get("explaining") and EXPLAINABLE.match(statement):
+            statements.append(Statement(statement, parameters))
+
+    event.listen(target, "before_cursor_execute", collect)
+    try:
+        yield statements
+    finally:
+        event.remove(target, "before_cursor_execute", collect)
+
+
+async def large_tables(conn: AsyncConnection, min_rows: int) -> set[str]:
+    """
+    Таблицы схемы public, в которых по статистике (ANALYZE) не меньше min_rows строк.
+    """
+    result = await conn.execute(text("""
+        SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND c.reltuples >= :min_rows
+    """), {"min_rows": min_rows})
+    return set(result.scalars())
+
+
+def _walk(plan: dict) -> Iterator[dict]:
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from _walk(child)
+
+
+async def seq_scans(conn: AsyncConnection, statements: list[Statement], tables: set[str]) -> list[SeqScan]:
+    """
+    EXPLAIN каждого уникального оператора; Seq Scan с условием Filter по любой из
+    tables — нарушение: строки отбираются перебором, хотя их мог найти индекс.
+    """
+    found: list[SeqScan] = []
+    seen: set[str] = set()
+    for statement in statements:
+        if statement.sql in seen:
+            continue
+        seen.add(statement.sql)
+        # EXPLAIN без ANALYZE оператор не выполняет и строк не блокирует
+        plan = (await conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement.sql, statement.parameters)).scalar_one()
+        for node in _walk(plan[0]["Plan"]):
+            if node["Node Type"] == "Seq Scan" and "Filter" in node and node.get("Relation Name") in tables:
+                found.append(SeqScan(node["Relation Name"], node["Filter"], statement.sql))
+    return found
@@ -0,0 +1,39 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+
+def _default(value: Any) -> Any:
+    # datetime/date orjson пишет сам; Decimal — только если content не прошёл через схему
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    # Как в pydantic: UTC записывается суффиксом Z
+    return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON-ответ без jsonable_encoder: dict/list из примитивов и datetime сериализуются
+    orjson за один проход.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def validated_response(adapter: TypeAdapter, content: Any, **kwargs) -> FastJSONResponse:
+    """
+    Проверяет content схемой ответа ровно один раз и отдаёт проверенное значение.
+    Готовый Response FastAPI не прогоняет повторно через response_model, поэтому
+    приведения схемы (Decimal -> float, лишние поля) применяются здесь: dump_python
+    отдаёт поля схемы, а datetime остаются объектами, которые orjson пишет сам.
+    """
+    validated = adapter.validate_python(content)
+    return FastJSONResponse(adapter.dump_python(validated), **kwargs)
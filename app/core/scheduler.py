@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """
+    Фоновая задача в event loop приложения: вызывает func раз в interval секунд.
+    Ошибка одного запуска логируется и не останавливает расписание.
+    """
+
+    def __init__(self, name: str, interval: float, func: Callable[[], Awaitable[object]]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._task: asyncio.Task | None = None
+
+    async def run_once(self) -> object:
+        try:
+            return await self.func()
+        except Exception:
+            logger.exception("❌ Job %s failed", self.name)
+            return None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop(), name=f"job:{self.name}")
+            logger.info("⏱️ Job %s scheduled every %.1fs", self.name, self.interval)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs: dict[str, PeriodicJob] = {}
+
+    def add(self, name: str, interval: float, func: Callable[[], Awaitable[object]]) -> PeriodicJob:
+        job = PeriodicJob(name, interval, func)
+        self.jobs[name] = job
+        return job
+
+    def start(self) -> None:
+        for job in self.jobs.values():
+            job.start()
+
+    async def stop(self) -> None:
+        for job in self.jobs.values():
+            await job.stop()
+
+
+scheduler = Scheduler()
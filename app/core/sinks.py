@@ -0,0 +1,143 @@
+"""
+Куда outbox relay отправляет события. Выбирается переменной OUTBOX_SINK:
+queue — очередь в памяти процесса, file — NDJSON-файл, webhook — POST на URL.
+
+Локальная заглушка webhook для разработки:
+
+    python -m app.core.sinks --port 8099
+    OUTBOX_SINK=webhook OUTBOX_WEBHOOK_URL=http://127.0.0.1:8099/events uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import threading
+import urllib.request
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+class EventSink(ABC):
+    """
+    Получатель пачки событий. Исключение из publish — пачка не отправлена,
+    relay повторит её на следующем запуске (доставка at-least-once).
+    """
+
+    @abstractmethod
+    async def publish(self, events: list[dict]) -> None: ...
+
+
+class QueueSink(EventSink):
+    def __init__(self, maxsize: int = 10_000):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    async def publish(self, events: list[dict]) -> None:
+        if self.queue.maxsize and self.queue.qsize() + len(events) > self.queue.maxsize:
+            raise RuntimeError("outbox queue is full")
+        for event in events:
+            self.queue.put_nowait(event)
+
+
+class FileSink(EventSink):
+    def __init__(self, path: str):
+        self.path = path
+
+    def _append(self, lines: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def publish(self, events: list[dict]) -> None:
+        lines = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events)
+        await asyncio.to_thread(self._append, lines)
+
+
+class WebhookSink(EventSink):
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def _post(self, body: bytes) -> None:
+        request = urllib.request.Request(
+            self.url, data=body, method="POST", headers={"Content-Type": "application/json"}
+        )
+        # Не-2xx поднимает HTTPError — пачка останется неотправленной
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    async def publish(self, events: list[dict]) -> None:
+        body = json.dumps({"events": events}, ensure_ascii=False).encode("utf-8")
+        await asyncio.to_thread(self._post, body)
+
+
+def sink_from_env() -> EventSink | None:
+    kind = os.getenv("OUTBOX_SINK", "").strip().lower()
+    if not kind:
+        return None
+    if kind == "queue":
+        return QueueSink()
+    if kind == "file":
+        return FileSink(os.getenv("OUTBOX_FILE", "logs/outbox.ndjson"))
+    if kind == "webhook":
+        url = os.getenv("OUTBOX_WEBHOOK_URL")
+        if not url:
+            raise RuntimeError("OUTBOX_WEBHOOK_URL is required for OUTBOX_SINK=webhook")
+        return WebhookSink(url, timeout=float(os.getenv("OUTBOX_WEBHOOK_TIMEOUT", "5")))
+    raise RuntimeError(f"Unknown OUTBOX_SINK: {kind}")
+
+
+class WebhookStub:
+    """
+    Локальный приёмник webhook: складывает полученные события в self.events.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, fail: bool = False):
+        self.events: list[dict] = []
+        self.fail = fail
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if stub.fail:
+                    self.send_response(503)
+                else:
+                    events = json.loads(body)["events"]
+                    stub.events.extend(events)
+                    logger.info("📨 Webhook stub received %d events", len(events))
+                    self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                logger.debug("webhook stub: " + format, *args)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/events"
+
+    def start(self) -> "WebhookStub":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local webhook stub for the outbox relay")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    stub = WebhookStub(port=args.port)
+    print(f"listening on {stub.url}")
+    stub.server.serve_forever()
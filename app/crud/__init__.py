@@ -1,3 +1,6 @@
 from . import product
 from . import order
 from . import order_item
+from . import stock
+from . import idempotency
+from . import outbox
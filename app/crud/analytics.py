@@ -0,0 +1,268 @@
+"""
+Аналитика продаж и заказов по дневным rollup-таблицам.
+
+Транзакции заказов не обновляют sales_daily и order_status_daily напрямую — иначе
+строка «сегодня, pending» стала бы блокировкой, за которую борются все заказы.
+Они дописывают дельты в rollup_deltas (record), фоновая задача складывает дельты
+в rollup-таблицы (fold_deltas). Чтение суммирует rollup и ещё не сложенные дельты,
+поэтому ответ точный, а не отстаёт на интервал задачи.
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import Mapping, Sequence
+
+from sqlalchemy import BigInteger, Date, Integer, Numeric, cast, column, func, insert, literal, null, select, text, union_all, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.stock import QUANTITY_TOTAL
+from app.models.order import Order, OrderStatusEnum
+from app.models.order_archive import OrderArchive
+from app.models.order_item import OrderItem
+from app.models.order_item_archive import OrderItemArchive
+from app.models.order_status_daily import OrderStatusDaily
+from app.models.product import Product
+from app.models.rollup_delta import RollupDelta
+from app.models.sales_daily import SalesDaily
+
+# Ключ advisory-блокировки: дельты складывает один воркер за раз
+ANALYTICS_ROLLUP_LOCK = 0x726F6C6C7570
+
+
+def _order_day(created_at):
+    # День заказа — дата created_at в UTC, как в rollup-таблицах
+    return func.date(func.timezone("UTC", created_at))
+
+
+ORDER_DAY = _order_day(Order.created_at)
+
+_DELTA_COLUMNS = ("day", "product_id", "status", "units", "revenue", "orders")
+_STATUS_TYPE = RollupDelta.__table__.c.status.type
+
+
+def utc_day(ts: datetime) -> date:
+    return ts.astimezone(timezone.utc).date()
+
+
+async def record(
+    db: AsyncSession,
+    sales_order_ids: Sequence[int] = (),
+    sales_sign: int = 1,
+    statuses: Mapping[tuple[date, OrderStatusEnum], int] | None = None,
+) -> None:
+    """
+    Одним INSERT дописывает дельты аналитики в текущей транзакции:
+    продажи по позициям заказов sales_order_ids (sales_sign=-1 — отмена или удаление)
+    и изменения числа заказов {(день, статус): +n/-n}.
+    """
+    parts = []
+    if sales_order_ids:
+        parts.append(
+            select(
+                ORDER_DAY,
+                OrderItem.product_id,
+                cast(null(), _STATUS_TYPE),
+                sales_sign * func.sum(OrderItem.quantity),
+                sales_sign * func.sum(OrderItem.line_total),
+                sales_sign * func.count(OrderItem.order_id.distinct()),
+            )
+            .join(Order, Order.id == OrderItem.order_id)
+            .where(OrderItem.order_id.in_(sales_order_ids))
+            .group_by(ORDER_DAY, OrderItem.product_id)
+        )
+    changed = [(day, status, n) for (day, status), n in (statuses or {}).items() if n]
+    if changed:
+        status_values = values(
+            column("day", Date), column("status", _STATUS_TYPE), column("orders", BigInteger), name="status_delta",
+        ).data(changed)
+        parts.append(select(
+            status_values.c.day,
+            cast(null(), Integer),
+            # Параметры VALUES уходят без типа — приводим к enum явно
+            cast(status_values.c.status, _STATUS_TYPE),
+            literal(0, BigInteger),
+            literal(0, Numeric(16, 2)),
+            status_values.c.orders,
+        ))
+    if not parts:
+        return
+    source = parts[0] if len(parts) == 1 else union_all(*parts)
+    await db.execute(insert(RollupDelta).from_select(_DELTA_COLUMNS, source))
+
+
+def status_changes(rows, new_status: OrderStatusEnum) -> dict[tuple[date, OrderStatusEnum], int]:
+    """
+    Дельты статусов для заказов, сменивших статус: строки с created_at и previous.
+    """
+    deltas: dict[tuple[date, OrderStatusEnum], int] = {}
+    for row in rows:
+        day = utc_day(row.created_at)
+        deltas[day, row.previous] = deltas.get((day, row.previous), 0) - 1
+        deltas[day, new_status] = deltas.get((day, new_status), 0) + 1
+    return deltas
+
+
+_FOLD = text("""
+    WITH d AS (
+        DELETE FROM rollup_deltas
+        WHERE id IN (SELECT id FROM rollup_deltas ORDER BY id LIMIT :limit)
+        RETURNING day, product_id, status, units, revenue, orders
+    ),
+    sales AS (
+        INSERT INTO sales_daily (day, product_id, units, revenue, orders)
+        SELECT day, product_id, sum(units), sum(revenue), sum(orders)
+        FROM d WHERE product_id IS NOT NULL
+        GROUP BY day, product_id
+        ON CONFLICT (day, product_id) DO UPDATE
+        SET units = sales_daily.units + EXCLUDED.units,
+            revenue = sales_daily.revenue + EXCLUDED.revenue,
+            orders = sales_daily.orders + EXCLUDED.orders
+    ),
+    statuses AS (
+        INSERT INTO order_status_daily (day, status, orders)
+        SELECT day, status, sum(orders)
+        FROM d WHERE status IS NOT NULL
+        GROUP BY day, status
+        ON CONFLICT (day, status) DO UPDATE
+        SET orders = order_status_daily.orders + EXCLUDED.orders
+    )
+    SELECT count(*) FROM d
+""")
+
+
+async def fold_deltas(db: AsyncSession, limit: int) -> int | None:
+    """
+    Складывает до limit самых старых дельт в rollup-таблицы одним оператором и коммитит.
+    None — складывает другой воркер. Дельты незавершённых транзакций не видны
+    и будут сложены следующим запуском.
+    """
+    if not await db.scalar(select(func.pg_try_advisory_xact_lock(ANALYTICS_ROLLUP_LOCK))):
+        await db.rollback()
+        return None
+    folded = await db.scalar(_FOLD, {"limit": limit})
+    await db.commit()
+    return folded
+
+
+async def rebuild(db: AsyncSession) -> dict[str, int]:
+    """
+    Пересчитывает rollup-таблицы с нуля по заказам и позициям — живым и архивным
+    (бэкфилл, починка).
+    TRUNCATE rollup_deltas ждёт транзакции заказов, уже записавших дельты, и держит
+    новые до коммита — каждый заказ учитывается ровно один раз: либо в пересчёте,
+    либо дельтой после него. На это время оформление заказов останавливается.
+    """
+    await db.execute(select(func.pg_advisory_xact_lock(ANALYTICS_ROLLUP_LOCK)))
+    await db.execute(text("TRUNCATE rollup_deltas, sales_daily, order_status_daily"))
+    lines = union_all(*[
+        select(
+            _order_day(orders.created_at).label("day"),
+            items.product_id, items.quantity, items.line_total, items.order_id,
+        )
+        .join(orders, (orders.id == items.order_id) & (orders.created_at == items.order_created_at))
+        .where(orders.status != OrderStatusEnum.cancelled)
+        for orders, items in ((Order, OrderItem), (OrderArchive, OrderItemArchive))
+    ]).subquery("lines")
+    sales = await db.execute(
+        insert(SalesDaily).from_select(
+            ("day", "product_id", "units", "revenue", "orders"),
+            select(
+                lines.c.day,
+                lines.c.product_id,
+                func.sum(lines.c.quantity),
+                func.sum(lines.c.line_total),
+                func.count(lines.c.order_id.distinct()),
+            ).group_by(lines.c.day, lines.c.product_id),
+        )
+    )
+    orders = union_all(*[
+        select(_order_day(table.created_at).label("day"), table.status) for table in (Order, OrderArchive)
+    ]).subquery("orders")
+    statuses = await db.execute(
+        insert(OrderStatusDaily).from_select(
+            ("day", "status", "orders"),
+            select(orders.c.day, orders.c.status, func.count()).group_by(orders.c.day, orders.c.status),
+        )
+    )
+    await db.commit()
+    return {"sales_daily": sales.rowcount, "order_status_daily": statuses.rowcount}
+
+
+def _sales_source(date_from: date, date_to: date, product_id: int | None = None):
+    # Сложенные продажи плюс ещё не сложенные дельты
+    parts = []
+    for table in (SalesDaily, RollupDelta):
+        stmt = select(table.day, table.product_id, table.units, table.revenue, table.orders).where(
+            table.product_id.is_not(None), table.day >= date_from, table.day <= date_to,
+        )
+        if product_id is not None:
+            stmt = stmt.where(table.product_id == product_id)
+        parts.append(stmt)
+    return union_all(*parts).subquery("sales")
+
+
+async def daily_sales(
+    db: AsyncSession, date_from: date, date_to: date, product_id: int | None, limit: int,
+) -> list[dict]:
+    sales = _sales_source(date_from, date_to, product_id)
+    orders = func.sum(sales.c.orders)
+    # sum(bigint) в Postgres — numeric; штуки и заказы отдаём целыми
+    result = await db.execute(
+        select(
+            sales.c.day,
+            sales.c.product_id,
+            cast(func.sum(sales.c.units), BigInteger).label("units"),
+            func.sum(sales.c.revenue).label("revenue"),
+            cast(orders, BigInteger).label("orders"),
+        )
+        .group_by(sales.c.day, sales.c.product_id)
+        # Всё отменено — строки нет
+        .having(orders != 0)
+        .order_by(sales.c.day, sales.c.product_id)
+        .limit(limit)
+    )
+    return [row._asdict() for row in result]
+
+
+async def order_status_counts(db: AsyncSession, date_from: date, date_to: date) -> dict[str, int]:
+    parts = [
+        select(table.status, table.orders).where(
+            table.status.is_not(None), table.day >= date_from, table.day <= date_to,
+        )
+        for table in (OrderStatusDaily, RollupDelta)
+    ]
+    counts = union_all(*parts).subquery("counts")
+    result = await db.execute(select(counts.c.status, func.sum(counts.c.orders)).group_by(counts.c.status))
+    by_status = {status.name: 0 for status in OrderStatusEnum}
+    for status, orders in result:
+        by_status[status.name] = int(orders)
+    return by_status
+
+
+async def stock_risk(db: AsyncSession, days: int, horizon: float, limit: int) -> list[dict]:
+    """
+    Товары, которых при среднем темпе продаж за последние days дней хватит меньше
+    чем на horizon дней: остаток / (продано за период / days), по возрастанию запаса.
+    """
+    today = datetime.now(timezone.utc).date()
+    sales = _sales_source(today - timedelta(days=days - 1), today)
+    sold = (
+        select(sales.c.product_id, func.sum(sales.c.units).label("units"))
+        .group_by(sales.c.product_id)
+        .having(func.sum(sales.c.units) > 0)
+        .subquery("sold")
+    )
+    avg_daily = cast(sold.c.units, Numeric) / days
+    cover = QUANTITY_TOTAL / avg_daily
+    result = await db.execute(
+        select(
+            Product.id.label("product_id"),
+            Product.name,
+            QUANTITY_TOTAL.label("quantity"),
+            func.round(avg_daily, 2).label("avg_daily_units"),
+            func.round(cover, 1).label("days_of_cover"),
+        )
+        .join(sold, sold.c.product_id == Product.id)
+        .where(cover < horizon)
+        .order_by(cover, Product.id)
+        .limit(limit)
+    )
+    return [row._asdict() for row in result]
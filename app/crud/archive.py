@@ -0,0 +1,213 @@
+"""
+Месячные секции orders / order_items и архив старых заказов.
+
+Секция месяца — пара orders_pYYYY_MM и order_items_pYYYY_MM с одинаковыми границами
+(UTC). У каждой есть CHECK, повторяющий границы секции: при присоединении к архиву
+Postgres видит, что строки уже в диапазоне, и не сканирует таблицу.
+
+Архивация не копирует строки: секции месяца, где все заказы в итоговом статусе,
+отсоединяются от orders / order_items (DETACH PARTITION) и присоединяются к
+orders_archive / order_items_archive. Индексы, нужные только живым заказам,
+удаляются — в архиве остаются первичный ключ и индекс позиций по order_id.
+"""
+import logging
+import re
+from datetime import date, datetime, timezone
+
+from sqlalchemy import column, func, select, table, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.models.order import FINAL_STATUSES, Order
+from app.models.order_archive import OrderArchive
+from app.models.order_item import OrderItem
+
+logger = logging.getLogger(__name__)
+
+# Таблица и ключ секционирования
+PARTITIONED = (("orders", "created_at"), ("order_items", "order_created_at"))
+# Индексы живых таблиц, которые в архиве не нужны: поиск, фильтры, отчёты по товару
+LIVE_ONLY_INDEXES = [
+    index.name
+    for index in (*Order.__table__.indexes, *OrderItem.__table__.indexes)
+    if index.name != "ix_order_items_order_totals"
+]
+_PARTITION_NAME = re.compile(r"^orders_p(\d{4})_(\d{2})$")
+# Ключ advisory-блокировки: секции создаёт и архивирует один воркер за раз
+ORDER_ARCHIVE_LOCK = 0x61726368697665
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(table_name: str, month: date) -> str:
+    return f"{table_name}_p{month:%Y_%m}"
+
+
+def month_range(month: date) -> tuple[datetime, datetime]:
+    # Границы секций — в UTC, как дни в аналитике; не зависят от TimeZone сессии
+    upper = next_month(month)
+    return (
+        datetime(month.year, month.month, 1, tzinfo=timezone.utc),
+        datetime(upper.year, upper.month, 1, tzinfo=timezone.utc),
+    )
+
+
+def _bounds(month: date) -> tuple[str, str]:
+    lower, upper = month_range(month)
+    return f"'{lower.isoformat()}'", f"'{upper.isoformat()}'"
+
+
+async def _set_lock_timeout(db: AsyncSession, lock_timeout_ms: int) -> None:
+    # DDL над orders ждёт блокировку всей таблицы; пока ждёт, за ним встают заказы
+    await db.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+
+
+async def _try_lock(db: AsyncSession) -> bool:
+    # Без неё воркеры одновременно создают одну секцию (CREATE TABLE падает на второй)
+    # и отсоединяют один месяц (DETACH падает, когда секция уже в архиве)
+    return await db.scalar(select(func.pg_try_advisory_xact_lock(ORDER_ARCHIVE_LOCK)))
+
+
+async def create_month_partitions(db: AsyncSession, month: date) -> list[str]:
+    """
+    Создаёт секции месяца month в orders и order_items, если их ещё нет (без коммита).
+    Возвращает имена созданных таблиц. Падает, если в orders_default уже есть
+    строки этого месяца — поэтому секции создаются заранее (ensure_partitions).
+    """
+    lower, upper = _bounds(month)
+    created = []
+    for table_name, key in PARTITIONED:
+        name = partition_name(table_name, month)
+        if await db.scalar(select(func.to_regclass(name))) is not None:
+            continue
+        await db.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {table_name} "
+            f"(CONSTRAINT {name}_range CHECK ({key} >= {lower} AND {key} < {upper})) "
+            f"FOR VALUES FROM ({lower}) TO ({upper})"
+        ))
+        created.append(name)
+    return created
+
+
+async def ensure_partitions(db: AsyncSession, today: date, months_ahead: int, lock_timeout_ms: int) -> list[str]:
+    """
+    Секции текущего месяца и months_ahead следующих; новые заказы не попадают в orders_default.
+    Если секциями сейчас занят другой воркер, ничего не делает — секции создаются с запасом.
+    """
+    if not await _try_lock(db):
+        await db.rollback()
+        return []
+    await _set_lock_timeout(db, lock_timeout_ms)
+    created = []
+    month = month_start(today)
+    for _ in range(months_ahead + 1):
+        created.extend(await create_month_partitions(db, month))
+        month = next_month(month)
+    await db.commit()
+    return created
+
+
+async def live_months(db: AsyncSession) -> list[date]:
+    """
+    Месяцы, секции которых сейчас присоединены к orders, по возрастанию.
+    """
+    result = await db.execute(text("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'orders'::regclass
+    """))
+    months = []
+    for (name,) in result:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+
+async def archive_month(db: AsyncSession, month: date, lock_timeout_ms: int) -> int | None:
+    """
+    Переносит секции месяца month в архив одной транзакцией и возвращает число заказов.
+    None — месяц пропущен: в нём есть незавершённые заказы, секциями занят другой
+    воркер или таблицы заняты дольше lock_timeout_ms (следующий запуск попробует снова).
+    """
+    orders_part = partition_name("orders", month)
+    items_part = partition_name("order_items", month)
+    lower, upper = month_range(month)
+
+    if not await _try_lock(db):
+        await db.rollback()
+        logger.warning("🗄️ Partitions are maintained by another worker, %s postponed", orders_part)
+        return None
+    # Список месяцев прочитан до блокировки: другой воркер мог уже перенести этот месяц
+    if month not in await live_months(db):
+        await db.rollback()
+        return None
+
+    # Дешёвая проверка до блокировок: секция с живыми заказами не трогается
+    open_orders = await db.scalar(
+        select(func.count()).select_from(Order).where(
+            Order.created_at >= lower, Order.created_at < upper, Order.status.not_in(FINAL_STATUSES),
+        )
+    )
+    if open_orders:
+        await db.rollback()
+        logger.warning("🗄️ %s has open orders, not archived", orders_part)
+        return None
+
+    # Индексы секции, которые не нужны архиву, — по родительскому индексу; после DETACH связь теряется
+    result = await db.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_index x ON x.indexrelid = c.oid
+        WHERE p.relname = ANY(:parents) AND x.indrelid IN (CAST(:orders AS regclass), CAST(:items AS regclass))
+    """), {"parents": LIVE_ONLY_INDEXES, "orders": orders_part, "items": items_part})
+    live_only = result.scalars().all()
+
+    await _set_lock_timeout(db, lock_timeout_ms)
+    try:
+        # Сначала позиции: после отсоединения их внешний ключ на orders больше не нужен
+        await db.execute(text(f"ALTER TABLE order_items DETACH PARTITION {items_part}"))
+        await db.execute(text(f"ALTER TABLE {items_part} DROP CONSTRAINT order_items_order_fkey"))
+        await db.execute(text(f"ALTER TABLE orders DETACH PARTITION {orders_part}"))
+    except OperationalError:
+        await db.rollback()
+        logger.warning("🗄️ %s is busy, archiving postponed", orders_part)
+        return None
+
+    # Проверка под блокировкой: пока шла транзакция, заказ мог сменить статус
+    detached = table(orders_part, column("status", Order.__table__.c.status.type))
+    if await db.scalar(select(func.count()).select_from(detached).where(detached.c.status.not_in(FINAL_STATUSES))):
+        await db.rollback()
+        logger.warning("🗄️ %s has open orders, not archived", orders_part)
+        return None
+    archived = await db.scalar(select(func.count()).select_from(detached))
+
+    for index_name in live_only:
+        await db.execute(text(f"DROP INDEX {index_name}"))
+
+    lower_sql, upper_sql = _bounds(month)
+    for part, archive in ((orders_part, "orders_archive"), (items_part, "order_items_archive")):
+        # id архива не выдаётся последовательностью живой таблицы
+        await db.execute(text(f"ALTER TABLE {part} ALTER COLUMN id DROP DEFAULT"))
+        await db.execute(text(f"ALTER TABLE {archive} ATTACH PARTITION {part} FOR VALUES FROM ({lower_sql}) TO ({upper_sql})"))
+    await db.commit()
+    logger.info("🗄️ Archived %s: %d orders", orders_part, archived)
+    return archived
+
+
+async def get_archived_order(db: AsyncSession, order_id: int) -> OrderArchive | None:
+    result = await db.execute(
+        select(OrderArchive).options(joinedload(OrderArchive.items)).where(OrderArchive.id == order_id)
+    )
+    return result.unique().scalar_one_or_none()
+
+
+async def is_archived(db: AsyncSession, order_id: int) -> bool:
+    return await db.scalar(select(OrderArchive.id).where(OrderArchive.id == order_id)) is not None
@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from datetime import timedelta
+from typing import Annotated, NamedTuple
+
+from fastapi import Header, HTTPException, Response
+from pydantic import BaseModel
+from sqlalchemy import select, update, delete, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.idempotency_key import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+# Сколько хранится ответ по ключу
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+# Сколько повтор ждёт, пока исходный запрос сохранит ответ
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "5"))
+IDEMPOTENCY_POLL_INTERVAL = 0.05
+IDEMPOTENCY_PURGE_BATCH = 5000
+
+
+# Заголовок Idempotency-Key: необязателен, без него запрос выполняется как раньше
+IdempotencyKeyHeader = Annotated[str | None, Header(alias="Idempotency-Key", min_length=1, max_length=255)]
+
+
+class ClaimedKey(NamedTuple):
+    # Ключ, занятый claim в текущей транзакции; ответ пишется в неё же через store_response
+    scope: str
+    key: str
+
+
+class StoredResponse(NamedTuple):
+    status_code: int
+    body: str
+
+    def to_response(self) -> Response:
+        return Response(
+            content=self.body,
+            status_code=self.status_code,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+
+def request_hash(payload: BaseModel) -> str:
+    # Хэшируем уже провалидированную модель: порядок ключей и пробелы в JSON не важны
+    return hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+
+def _expired():
+    return IdempotencyKey.created_at < func.now() - timedelta(seconds=IDEMPOTENCY_TTL)
+
+
+async def claim(db: AsyncSession, scope: str, key: str, req_hash: str) -> StoredResponse | None:
+    """
+    Занимает ключ в текущей транзакции. None — ключ наш, запрос выполняется как обычно,
+    записывает ответ через store_response и коммитится вместе с ключом и ответом: занятый
+    ключ без ответа никогда не виден другим. Иначе возвращает сохранённый ответ исходного запроса.
+
+    Пока исходный запрос не закоммичен, INSERT повтора ждёт на уникальном индексе;
+    если исходный откатился (ошибка), повтор сам занимает ключ и выполняется.
+    """
+    stmt = insert(IdempotencyKey).values(scope=scope, key=key, request_hash=req_hash)
+    # Просроченный, но ещё не удалённый ключ занимается заново
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IdempotencyKey.scope, IdempotencyKey.key],
+        set_={
+            "request_hash": stmt.excluded.request_hash,
+            "status_code": None,
+            "response_body": None,
+            "created_at": func.now(),
+        },
+        where=_expired(),
+    ).returning(IdempotencyKey.key)
+
+    if (await db.execute(stmt)).first() is not None:
+        return None
+    # Ключ уже занят закоммиченным запросом — транзакция нам больше не нужна
+    await db.rollback()
+    return await _wait_for_response(db, scope, key, req_hash)
+
+
+async def _wait_for_response(db: AsyncSession, scope: str, key: str, req_hash: str) -> StoredResponse:
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_TIMEOUT
+    while True:
+        row = (await db.execute(
+            select(IdempotencyKey.request_hash, IdempotencyKey.status_code, IdempotencyKey.response_body)
+            .where(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+        )).first()
+        await db.rollback()
+
+        if row is not None and row.request_hash != req_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body")
+        if row is not None and row.status_code is not None:
+            logger.info("🔁 Replaying stored response for %s key %s", scope, key)
+            return StoredResponse(row.status_code, row.response_body)
+        if time.monotonic() >= deadline:
+            raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is still in progress")
+        await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+
+async def store_response(db: AsyncSession, claimed: ClaimedKey, status_code: int, body: str) -> None:
+    """
+    Записывает ответ в транзакцию запроса (без коммита): ключ, результат и ответ
+    коммитятся вместе, и падение между ними не оставит ключ «в работе».
+    """
+    await db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.scope == claimed.scope, IdempotencyKey.key == claimed.key)
+        .values(status_code=status_code, response_body=body)
+    )
+
+
+async def purge_expired(db: AsyncSession) -> int:
+    """
+    Удаляет просроченные ключи пачками, чтобы не держать долгих блокировок.
+    """
+    purged = 0
+    while True:
+        batch = (
+            select(IdempotencyKey.scope, IdempotencyKey.key)
+            .where(_expired())
+            .limit(IDEMPOTENCY_PURGE_BATCH)
+        )
+        result = await db.execute(
+            delete(IdempotencyKey).where(
+                tuple_(IdempotencyKey.scope, IdempotencyKey.key).in_(batch)
+            )
+        )
+        await db.commit()
+        purged += result.rowcount
+        if result.rowcount < IDEMPOTENCY_PURGE_BATCH:
+            return purged
@@ -1,68 +1,248 @@
 import logging
+from datetime import timedelta
+from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert, update, func
 from sqlalchemy.future import select
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, selectinload
+from typing import AsyncIterator
 from fastapi import HTTPException
 
 from app.models.order import Order
 from app.models.order_item import OrderItem
-from app.models.product import Product
-from app.schemas.order import OrderCreate, OrderStatusEnum
+from app.core.logging import ITEM_LOGGER
+from app.core.pagination import encode_cursor, decode_cursor, check_cursor_key
+from app.schemas.order import (
+    OrderCreate, OrderRead, OrderStatusEnum, OrderFilter, OrderPageParams, OrderBulkCancel, OrderBatchRow,
+)
+from app.crud import order_item as crud_order_item
+from app.crud import stock
+from app.crud import analytics
+from app.crud import archive
+from app.crud import idempotency
+from app.crud import outbox
+from app.crud.product import product_cache
 
 logger = logging.getLogger(__name__)
+# Строки на каждую позицию заказа — через отдельный логгер с ограничением частоты (LOG_ITEM_RATE)
+item_logger = logging.getLogger(ITEM_LOGGER)
 
-async def create_order(db: AsyncSession, order_data: OrderCreate, trace_id: str = "-"):
+def _order_total(order_data: OrderCreate, unit_prices: dict[int, Decimal]) -> Decimal:
+    return sum((unit_prices[item.product_id] * item.quantity for item in order_data.items), Decimal(0))
+
+
+async def create_order(
+    db: AsyncSession,
+    order_data: OrderCreate,
+    trace_id: str = "-",
+    idempotency_key: idempotency.ClaimedKey | None = None,
+):
     if not order_data.items:
         logger.warning("[%s] 🚫 Empty order received", trace_id)
         raise HTTPException(status_code=400, detail="Order must contain at least one item")
 
-    order = Order(customer_name=order_data.customer_name)
-    db.add(order)
-    await db.flush()  # Получаем order.id
-
-    total_price = 0.0
-
-    for item_data in order_data.items:
-        result = await db.execute(select(Product).filter(Product.id == item_data.product_id))
-        product = result.scalar_one_or_none()
-        if not product:
-            logger.warning("[%s] ❌ Product ID %s not found", trace_id, item_data.product_id)
-            raise HTTPException(status_code=404, detail=f"Product ID {item_data.product_id} not found")
+    # Один UPDATE на все позиции: проверка остатка и списание атомарны
+    need = stock.merge_items(order_data.items)
+    reserved = await stock.reserve_stock(db, need, trace_id=trace_id)
 
-        if product.quantity < item_data.quantity:
-            logger.warning("[%s] ❗ Not enough stock for product %s (have %d, need %d)", trace_id, product.name, product.quantity, item_data.quantity)
-            raise HTTPException(status_code=400, detail=f"Not enough stock for product {product.name}")
+    # Точная сумма в Decimal по ценам, зафиксированным в резервировании
+    unit_prices = {row.id: row.unit_price for row in reserved.values()}
+    total_price = _order_total(order_data, unit_prices)
 
-        product.quantity -= item_data.quantity
-        total_price += product.price * item_data.quantity
+    result = await db.execute(
+        insert(Order)
+        .values(customer_name=order_data.customer_name, total_price=total_price)
+        .returning(Order.id, Order.created_at)
+    )
+    order_id, created_at = result.one()
 
-        logger.info("[%s] 🛒 Reserved %d of %s for order %d", trace_id, item_data.quantity, product.name, order.id)
+    for row in reserved.values():
+        item_logger.info("[%s] 🛒 Reserved %d of %s for order %d", trace_id, row.need, row.name, order_id)
 
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=item_data.product_id,
-            quantity=item_data.quantity
-        )
-        db.add(order_item)
+    await crud_order_item.bulk_create_order_items(db, order_id, created_at, order_data.items, unit_prices)
+    await analytics.record(db, [order_id], statuses={(analytics.utc_day(created_at), OrderStatusEnum.pending): 1})
+    logger.info("[%s] 💰 Total price for order %d calculated: %.2f", trace_id, order_id, total_price)
 
-    order.total_price = total_price
-    logger.info("[%s] 💰 Total price for order %d calculated: %.2f", trace_id, order.id, total_price)
+    await outbox.add_events(db, [
+        outbox.event("order", order_id, "order.created", {
+            "id": order_id,
+            "customer_name": order_data.customer_name,
+            "total_price": float(total_price),
+            "status": OrderStatusEnum.pending.name,
+            "items": [item.model_dump() for item in order_data.items],
+        }),
+        *[
+            outbox.event("product", row.id, "product.stock_changed", {"id": row.id, "quantity": row.quantity})
+            for row in reserved.values()
+        ],
+    ])
 
-    await db.commit()
-
-    # 🔁 Вместо await db.refresh(order), сразу делаем полную выборку с нужными связями
+    # 🔁 Вместо await db.refresh(order), сразу делаем полную выборку с нужными связями —
+    # до коммита, чтобы ответ по ключу идемпотентности закоммитился вместе с заказом
     stmt = select(Order).options(
         joinedload(Order.items).joinedload(OrderItem.product)
-    ).where(Order.id == order.id)
+    ).where(Order.id == order_id)
 
     result = await db.execute(stmt)
     order_with_items = result.unique().scalar_one()
+    if idempotency_key is not None:
+        await idempotency.store_response(db, idempotency_key, 200, OrderRead.model_validate(order_with_items).model_dump_json())
+
+    await db.commit()
+    outbox.notifier.notify()
+    await product_cache.invalidate(*reserved)
 
     return order_with_items
 
-async def get_orders(db: AsyncSession):
-    result = await db.execute(select(Order).options(joinedload(Order.items)))
-    return result.scalars().all()
+async def create_orders_batch(
+    db: AsyncSession, orders: list[tuple[int, OrderCreate]], trace_id: str = "-"
+) -> list[OrderBatchRow]:
+    """
+    Пакет заказов (пары (index, заказ)) одной транзакцией. Остатки резервируются
+    под весь пакет сразу (stock.reserve_batch), заказы и позиции вставляются
+    многострочными INSERT. Частичный успех: заказ без позиций, с несуществующим
+    товаром или без остатка отклоняется, остальные создаются.
+    Число SQL-операторов не зависит от размера пакета (кроме шардированных товаров).
+    """
+    rows: dict[int, OrderBatchRow] = {}
+    candidates = []
+    for index, order_data in orders:
+        if not order_data.items:
+            rows[index] = OrderBatchRow(index=index, status="rejected", error="Order must contain at least one item")
+        else:
+            candidates.append((index, order_data))
+
+    touched, rejected = await stock.reserve_batch(db, [stock.merge_items(o.items) for _, o in candidates])
+    unit_prices = {product_id: row.unit_price for product_id, row in touched.items()}
+    accepted = []
+    for position, (index, order_data) in enumerate(candidates):
+        if position in rejected:
+            rows[index] = OrderBatchRow(index=index, status="rejected", error=rejected[position])
+        else:
+            accepted.append((index, order_data, _order_total(order_data, unit_prices)))
+
+    if not accepted:
+        await db.rollback()
+        logger.warning("[%s] 🚫 Batch of %d orders rejected entirely", trace_id, len(orders))
+        return sorted(rows.values(), key=lambda r: r.index)
+
+    # sort_by_parameter_order: id в RETURNING идут в порядке строк пакета
+    result = await db.execute(
+        insert(Order).returning(Order.id, Order.created_at, sort_by_parameter_order=True),
+        [{"customer_name": o.customer_name, "total_price": total} for _, o, total in accepted],
+    )
+    created = result.all()
+    order_ids = [row.id for row in created]
+
+    await crud_order_item.bulk_create_batch_items(db, [
+        (row.id, row.created_at, item) for row, (_, order_data, _) in zip(created, accepted) for item in order_data.items
+    ], unit_prices)
+    statuses: dict = {}
+    for row in created:
+        key = (analytics.utc_day(row.created_at), OrderStatusEnum.pending)
+        statuses[key] = statuses.get(key, 0) + 1
+    await analytics.record(db, order_ids, statuses=statuses)
+    await outbox.add_events(db, [
+        *[
+            outbox.event("order", order_id, "order.created", {
+                "id": order_id,
+                "customer_name": order_data.customer_name,
+                "total_price": float(total_price),
+                "status": OrderStatusEnum.pending.name,
+                "items": [item.model_dump() for item in order_data.items],
+            })
+            for order_id, (_, order_data, total_price) in zip(order_ids, accepted)
+        ],
+        *[
+            outbox.event("product", product_id, "product.stock_changed", {"id": product_id, "quantity": row.quantity})
+            for product_id, row in touched.items()
+        ],
+    ])
+    await db.commit()
+    outbox.notifier.notify()
+    await product_cache.invalidate(*touched)
+
+    for order_id, (index, _, total_price) in zip(order_ids, accepted):
+        rows[index] = OrderBatchRow(index=index, status="created", id=order_id, total_price=total_price)
+    logger.info("[%s] 📦 Batch: %d orders created, %d rejected", trace_id, len(accepted), len(rows) - len(accepted))
+    return sorted(rows.values(), key=lambda r: r.index)
+
+def _filtered_orders(filters: OrderFilter, stmt=None):
+    # Позиции подгружаются отдельным SELECT ... WHERE order_id IN (...) — без декартова JOIN
+    if stmt is None:
+        stmt = select(Order).options(selectinload(Order.items))
+    if filters.status is not None:
+        stmt = stmt.where(Order.status == OrderStatusEnum[filters.status])
+    if filters.customer_name is not None:
+        stmt = stmt.where(Order.customer_name == filters.customer_name)
+    if filters.created_from is not None:
+        stmt = stmt.where(Order.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        stmt = stmt.where(Order.created_at < filters.created_to)
+    return stmt.order_by(Order.id)
+
+
+# Список заказов читается колонками: строки сразу складываются в поля OrderRead
+ORDER_COLUMNS = (Order.id, Order.customer_name, Order.created_at, Order.status)
+ORDER_ITEM_COLUMNS = (
+    OrderItem.order_id, OrderItem.id, OrderItem.product_id, OrderItem.quantity, OrderItem.unit_price, OrderItem.line_total,
+)
+
+
+def _item_dict(row) -> dict:
+    item_id, product_id, quantity, unit_price, line_total = row
+    return {"id": item_id, "product_id": product_id, "quantity": quantity, "unit_price": unit_price, "line_total": line_total}
+
+
+async def get_orders(db: AsyncSession, filters: OrderFilter, page_params: OrderPageParams) -> tuple[list[dict], str | None]:
+    """
+    Страница заказов по возрастанию id (keyset). Возвращает словари с полями OrderRead
+    и курсор следующей страницы. Позиции всех заказов страницы — одним запросом.
+    """
+    stmt = _filtered_orders(filters, select(*ORDER_COLUMNS))
+    if page_params.cursor is not None:
+        key = decode_cursor(page_params.cursor, "id", "asc")
+        check_cursor_key(key, [int])
+        stmt = stmt.where(Order.id > key[0])
+
+    result = await db.execute(stmt.limit(page_params.limit + 1))
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > page_params.limit:
+        rows = rows[:page_params.limit]
+        next_cursor = encode_cursor("id", "asc", [rows[-1].id])
+
+    orders = {
+        row.id: {
+            "id": row.id,
+            "customer_name": row.customer_name,
+            "created_at": row.created_at,
+            "status": row.status.name,
+            "items": [],
+        }
+        for row in rows
+    }
+    if orders:
+        items = await db.execute(
+            select(*ORDER_ITEM_COLUMNS)
+            .where(OrderItem.order_id.in_(list(orders)))
+            .order_by(OrderItem.order_id, OrderItem.id)
+        )
+        for order_id, *item in items:
+            orders[order_id]["items"].append(_item_dict(item))
+    return list(orders.values()), next_cursor
+
+
+async def stream_orders(db: AsyncSession, filters: OrderFilter, batch_size: int = 500) -> AsyncIterator[Order]:
+    """
+    Все заказы под фильтр через server-side курсор: в памяти одновременно не больше batch_size заказов.
+    """
+    result = await db.stream_scalars(
+        _filtered_orders(filters).execution_options(yield_per=batch_size)
+    )
+    async for order in result:
+        yield order
 
 async def get_order(db: AsyncSession, order_id: int):
     result = await db.execute(
@@ -71,38 +251,155 @@ async def get_order(db: AsyncSession, order_id: int):
         .filter(Order.id == order_id)
     )
     order = result.unique().scalar_one_or_none()
+    if not order:
+        # Старые завершённые заказы живут в архиве — отдаём их в том же виде
+        order = await archive.get_archived_order(db, order_id)
 
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
     return order
 
-async def update_order_status(db: AsyncSession, order_id: int, new_status: OrderStatusEnum):
-    result = await db.execute(select(Order).options(joinedload(Order.items)).filter(Order.id == order_id))
-    order = result.unique().scalar_one_or_none()
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
+async def _raise_if_archived(db: AsyncSession, order_id: int) -> None:
+    if await archive.is_archived(db, order_id):
+        raise HTTPException(status_code=400, detail="Заказ в архиве, изменить его нельзя")
+
+async def _set_status(
+    db: AsyncSession,
+    conds: list,
+    new_status: OrderStatusEnum,
+    limit: int | None = None,
+    order_by=Order.id,
+    skip_locked: bool = False,
+) -> list[dict]:
+    """
+    Меняет статус не отменённых заказов под условия одним UPDATE ... RETURNING.
+    Прежний статус берётся из CTE с FOR UPDATE — строки заказов блокируются по id,
+    а параллельная отмена того же заказа после ожидания блокировки увидит, что он уже отменён.
+    При отмене позиции всех заказов возвращаются на склад одним UPDATE.
+    С skip_locked заказы, занятые другой транзакцией, пропускаются без ожидания.
+    Возвращает словари с полями OrderRead; заказы, которые не подошли, пропускаются.
+    """
+    prev = (
+        select(Order.id, Order.status)
+        .where(*conds, Order.status != OrderStatusEnum.cancelled)
+        .order_by(order_by)
+        .with_for_update(skip_locked=skip_locked)
+    )
+    if limit is not None:
+        prev = prev.limit(limit)
+    prev = prev.cte("prev")
 
-    if order.status == OrderStatusEnum.cancelled:
-        raise HTTPException(status_code=400, detail="Нельзя изменить отменённый заказ")
+    result = await db.execute(
+        update(Order)
+        .where(Order.id == prev.c.id)
+        .values(status=new_status)
+        .returning(Order.id, Order.customer_name, Order.created_at, prev.c.status.label("previous"))
+        .execution_options(synchronize_session=False)
+    )
+    rows = sorted(result.all(), key=lambda row: row.id)
+    if not rows:
+        return []
+
+    orders = {
+        row.id: {
+            "id": row.id,
+            "customer_name": row.customer_name,
+            "created_at": row.created_at,
+            "status": new_status.name,
+            "items": [],
+        }
+        for row in rows
+    }
+    items = await db.execute(
+        select(*ORDER_ITEM_COLUMNS)
+        .where(OrderItem.order_id.in_(list(orders)))
+        .order_by(OrderItem.order_id, OrderItem.id)
+    )
+    for order_id, *item in items:
+        orders[order_id]["items"].append(_item_dict(item))
 
+    events = [
+        outbox.event("order", row.id, "order.status_changed", {
+            "id": row.id, "status": new_status.name, "previous": row.previous.name,
+        })
+        for row in rows
+    ]
+    restored = {}
     if new_status == OrderStatusEnum.cancelled:
-        for item in order.items:
-            result = await db.execute(select(Product).filter(Product.id == item.product_id))
-            product = result.unique().scalar_one_or_none()
-            if product:
-                product.quantity += item.quantity
+        restored = await stock.restore_stock(db, list(orders))
+        events.extend(
+            outbox.event("product", product_id, "product.stock_changed", {"id": product_id, "quantity": quantity})
+            for product_id, quantity in restored.items()
+        )
 
-    order.status = new_status
+    # Отмена вычитает продажи заказов из аналитики; смена статуса переносит заказ между счётчиками
+    cancelled = list(orders) if new_status == OrderStatusEnum.cancelled else []
+    await analytics.record(db, cancelled, sales_sign=-1, statuses=analytics.status_changes(rows, new_status))
+    await outbox.add_events(db, events)
     await db.commit()
-    await db.refresh(order)
-    return order
+    outbox.notifier.notify()
+    if restored:
+        await product_cache.invalidate(*restored)
+    return list(orders.values())
+
+async def update_order_status(db: AsyncSession, order_id: int, new_status: OrderStatusEnum) -> dict:
+    orders = await _set_status(db, [Order.id == order_id], new_status)
+    if orders:
+        return orders[0]
+
+    # Сюда попадаем только на неуспешном пути: заказа нет, он уже отменён или в архиве
+    await db.rollback()
+    if await db.scalar(select(Order.id).where(Order.id == order_id)) is None:
+        await _raise_if_archived(db, order_id)
+        raise HTTPException(status_code=404, detail="Order not found")
+    raise HTTPException(status_code=400, detail="Нельзя изменить отменённый заказ")
+
+async def cancel_orders(db: AsyncSession, params: OrderBulkCancel) -> list[dict]:
+    """
+    Отменяет пачку заказов (по id и/или всех заказов покупателя) и возвращает склад
+    за постоянное число запросов. Уже отменённые заказы пропускаются.
+    """
+    conds = []
+    if params.order_ids is not None:
+        conds.append(Order.id.in_(params.order_ids))
+    if params.customer_name is not None:
+        conds.append(Order.customer_name == params.customer_name)
+    if params.status is not None:
+        conds.append(Order.status == OrderStatusEnum[params.status])
+    return await _set_status(db, conds, OrderStatusEnum.cancelled, limit=params.limit)
+
+async def expire_pending_orders(db: AsyncSession, ttl: float, batch_size: int) -> list[dict]:
+    """
+    Отменяет до batch_size самых старых pending-заказов старше ttl секунд и возвращает их остатки.
+    Пачка берётся по индексу (status, created_at); FOR UPDATE SKIP LOCKED — несколько
+    воркеров делят просроченные заказы между собой, а не отменяют одни и те же.
+    """
+    return await _set_status(
+        db,
+        [
+            Order.status == OrderStatusEnum.pending,
+            Order.created_at < func.now() - timedelta(seconds=ttl),
+        ],
+        OrderStatusEnum.cancelled,
+        limit=batch_size,
+        order_by=Order.created_at,
+        skip_locked=True,
+    )
 
 async def delete_order(db: AsyncSession, order_id: int):
     result = await db.execute(select(Order).filter(Order.id == order_id))
     order = result.scalar_one_or_none()
     if not order:
+        await _raise_if_archived(db, order_id)
         return None
+    # Позиции удаляются каскадом — дельты аналитики пишем до удаления
+    await analytics.record(
+        db,
+        [order.id] if order.status != OrderStatusEnum.cancelled else [],
+        sales_sign=-1,
+        statuses={(analytics.utc_day(order.created_at), order.status): -1},
+    )
     await db.delete(order)
     await db.commit()
     return order
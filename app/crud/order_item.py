@@ -0,0 +1,55 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Mapping, Sequence
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.order_item import OrderItem
+from app.schemas.order_item import OrderItemCreate
+
+
+async def bulk_create_order_items(
+    db: AsyncSession,
+    order_id: int,
+    order_created_at: datetime,
+    items: Sequence[OrderItemCreate],
+    unit_prices: Mapping[int, Decimal],
+) -> None:
+    """
+    Вставляет все позиции заказа одним многострочным INSERT.
+    order_created_at — created_at заказа, ключ секции позиций.
+    unit_prices — цены товаров из резервирования; line_total считает сама БД.
+    """
+    await db.execute(
+        insert(OrderItem).values([
+            {
+                "order_id": order_id,
+                "order_created_at": order_created_at,
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "unit_price": unit_prices[item.product_id],
+            }
+            for item in items
+        ])
+    )
+
+
+async def bulk_create_batch_items(
+    db: AsyncSession, items: Sequence[tuple[int, datetime, OrderItemCreate]], unit_prices: Mapping[int, Decimal]
+) -> None:
+    """
+    Позиции сразу многих заказов: тройки (order_id, created_at заказа, позиция).
+    executemany, который SQLAlchemy сворачивает в многострочные INSERT пачками —
+    лимит параметров не грозит.
+    """
+    await db.execute(insert(OrderItem), [
+        {
+            "order_id": order_id,
+            "order_created_at": order_created_at,
+            "product_id": item.product_id,
+            "quantity": item.quantity,
+            "unit_price": unit_prices[item.product_id],
+        }
+        for order_id, order_created_at, item in items
+    ])
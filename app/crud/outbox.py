@@ -0,0 +1,119 @@
+import asyncio
+from datetime import timedelta
+from typing import Any, Sequence
+
+from sqlalchemy import select, update, delete, func, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.outbox_event import OutboxEvent
+
+OUTBOX_INSERT_BATCH = 1000
+OUTBOX_PURGE_BATCH = 5000
+# Один relay на все воркеры: события уходят в sink строго по seq
+OUTBOX_RELAY_LOCK = 0x6F7574626F78
+
+# Видимы только события транзакций старше самой старой активной: иначе
+# закоммиченный позже меньший seq проскочил бы мимо потребителя, уже ушедшего дальше
+_VISIBLE = OutboxEvent.txid < literal_column("pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+
+
+class ChangeNotifier:
+    """
+    Будит long-poll ожидающих после коммита событий в этом процессе.
+    Изменения из других воркеров подхватываются периодическим опросом.
+    """
+
+    def __init__(self):
+        self._waiters: set[asyncio.Future] = set()
+
+    def notify(self) -> None:
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def wait(self, timeout: float) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._waiters.discard(waiter)
+
+
+notifier = ChangeNotifier()
+
+
+def event(aggregate: str, aggregate_id: int, event_type: str, payload: dict[str, Any]) -> dict:
+    return {"aggregate": aggregate, "aggregate_id": aggregate_id, "event_type": event_type, "payload": payload}
+
+
+def product_snapshot(row) -> dict[str, Any]:
+    return {
+        "id": row.id,
+        "name": row.name,
+        "description": row.description,
+        "price": row.price,
+        "quantity": row.quantity,
+    }
+
+
+async def add_events(db: AsyncSession, events: Sequence[dict]) -> None:
+    """
+    Пишет события в текущей транзакции — они коммитятся вместе с изменением.
+    """
+    for start in range(0, len(events), OUTBOX_INSERT_BATCH):
+        await db.execute(insert(OutboxEvent).values(list(events[start:start + OUTBOX_INSERT_BATCH])))
+
+
+async def list_changes(db: AsyncSession, since: int, limit: int) -> Sequence[OutboxEvent]:
+    result = await db.execute(
+        select(OutboxEvent)
+        .where(OutboxEvent.seq > since, _VISIBLE)
+        .order_by(OutboxEvent.seq)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
+async def claim_unpublished(db: AsyncSession, limit: int) -> Sequence[OutboxEvent] | None:
+    """
+    Следующая пачка неотправленных событий. None — relay сейчас держит другой воркер.
+    Advisory-блокировка транзакционная и отпускается на commit/rollback.
+    """
+    if not await db.scalar(select(func.pg_try_advisory_xact_lock(OUTBOX_RELAY_LOCK))):
+        return None
+    result = await db.execute(
+        select(OutboxEvent)
+        .where(OutboxEvent.published_at.is_(None), _VISIBLE)
+        .order_by(OutboxEvent.seq)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
+async def mark_published(db: AsyncSession, seqs: Sequence[int]) -> None:
+    await db.execute(
+        update(OutboxEvent).where(OutboxEvent.seq.in_(seqs)).values(published_at=func.now())
+    )
+
+
+async def purge_events(db: AsyncSession, retention: float, require_published: bool = True) -> int:
+    """
+    Удаляет события старше retention секунд пачками. С require_published
+    неотправленные события не трогаются.
+    """
+    conds = [OutboxEvent.created_at < func.now() - timedelta(seconds=retention)]
+    if require_published:
+        conds.append(OutboxEvent.published_at.is_not(None))
+
+    purged = 0
+    while True:
+        batch = select(OutboxEvent.seq).where(*conds).order_by(OutboxEvent.seq).limit(OUTBOX_PURGE_BATCH)
+        result = await db.execute(delete(OutboxEvent).where(OutboxEvent.seq.in_(batch)))
+        await db.commit()
+        purged += result.rowcount
+        if result.rowcount < OUTBOX_PURGE_BATCH:
+            return purged
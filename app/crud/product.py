@@ -1,16 +1,30 @@
 
+import os
+
+from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import Float, exists, select, update, func, tuple_, literal, literal_column, text
 from sqlalchemy.dialects.postgresql import insert
-from app.models.product import Product
-from app.schemas.product import ProductCreate, ProductSearch, PageParams
-from typing import Sequence
+from app.core.cache import TTLCache, ModelCache
+from app.core.config import db_settings
+from app.core.database import reads_from_replica
+from app.core.pagination import encode_cursor, decode_cursor, check_cursor_key
+from app.crud import idempotency
+from app.crud import outbox
+from app.crud.stock import QUANTITY_TOTAL
+from app.models.product import Product, SEARCH_CONFIG
+from app.models.product_stock_shard import ProductStockShard
+from app.schemas.product import ProductCreate, ProductRead, ProductSearch, PageParams, BulkRowResult
+from typing import NamedTuple, Sequence
 
 # Создание или обновление существующего продукта
-async def create_product(db: AsyncSession, product: ProductCreate) -> Product:
+async def create_product(
+    db: AsyncSession, product: ProductCreate, idempotency_key: idempotency.ClaimedKey | None = None
+) -> ProductRead:
     """
     Атомарно: вставить товар, а при конфликте по name — увеличить quantity.
     price/description при конфликте не трогаем.
+    Ответ по idempotency_key коммитится в той же транзакции.
     """
     stmt = (
         insert(Product)
@@ -29,31 +43,72 @@ async def create_product(db: AsyncSession, product: ProductCreate) -> Product:
                 # "description": product.description,
             },
         )
-        .returning(Product.id)
+        .returning(*_RETURNING, _INSERTED)
     )
 
     res = await db.execute(stmt)
-    product_id = res.scalar_one()          # вернули id вставленной/обновлённой строки
+    row = res.one()                        # вставленная/обновлённая строка
+    product_id = row.id
+    [snapshot] = await _snapshots(db, [row])
+    await outbox.add_events(db, [outbox.event(
+        "product", product_id, "product.created" if row.inserted else "product.updated", snapshot,
+    )])
+    result = ProductRead.model_validate(snapshot)
+    if idempotency_key is not None:
+        await idempotency.store_response(db, idempotency_key, 200, result.model_dump_json())
     await db.commit()
-    return await db.get(Product, product_id)
+    outbox.notifier.notify()
+    count_cache.clear()
+    await product_cache.invalidate(product_id)
+    return result
+
+# Кэш горячих карточек товара. Сбрасывается при любом изменении товара и его остатка.
+# Чтение с реплики кэшируется не раньше, чем через окно чтения с основной БД после
+# изменения, — иначе отставшая строка раздавалась бы всем, включая закреплённых клиентов
+product_cache = ModelCache(
+    "product",
+    ProductRead,
+    maxsize=int(os.getenv("PRODUCT_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("PRODUCT_CACHE_TTL", "30")),
+    stale_window=db_settings.read_primary_window,
+)
 
 # Получение одного продукта по ID
-async def get_product(db: AsyncSession, product_id: int):
-    result = await db.execute(select(Product).where(Product.id == product_id))
-    return result.scalar_one_or_none()
+async def get_product(db: AsyncSession, product_id: int) -> ProductRead | None:
+    cached = await product_cache.get(product_id)
+    if cached is not None:
+        return cached
+
+    generation = product_cache.generation(product_id)
+    result = await db.execute(select(*PRODUCT_COLUMNS).where(Product.id == product_id))
+    row = result.one_or_none()
+    if row is None:
+        return None
+
+    data = ProductRead.model_validate(dict(row._mapping))
+    await product_cache.set(product_id, data, generation, lagging=reads_from_replica(db))
+    return data
 
 # Получение списка продуктов
 async def get_products(db: AsyncSession, skip: int = 0, limit: int = 100):
-    result = await db.execute(select(Product).offset(skip).limit(limit))
-    return result.scalars().all()
+    result = await db.execute(select(*PRODUCT_COLUMNS).offset(skip).limit(limit))
+    return [dict(row) for row in result.mappings()]
 
 # Удаление продукта
 async def delete_product(db: AsyncSession, product_id: int):
     result = await db.execute(select(Product).where(Product.id == product_id))
     product = result.scalar_one_or_none()
     if product:
+        # В ответе — полный остаток, а не только пул шардированного товара
+        total = await db.scalar(select(QUANTITY_TOTAL).where(Product.id == product_id)) if product.stock_shards else None
         await db.delete(product)
+        await outbox.add_events(db, [outbox.event("product", product_id, "product.deleted", {"id": product_id})])
         await db.commit()
+        outbox.notifier.notify()
+        count_cache.clear()
+        await product_cache.invalidate(product_id)
+        if total is not None:
+            product.quantity = total
     return product
 
 # Обновление продукта
@@ -65,25 +120,175 @@ async def update_product(db: AsyncSession, product_id: int, update_data: Product
 
     for key, value in update_data.model_dump().items():
         setattr(product, key, value)
+    if product.stock_shards:
+        # quantity задаёт полный остаток: шарды обнуляются, всё уходит в пул до ребалансировки
+        await db.execute(
+            update(ProductStockShard).where(ProductStockShard.product_id == product_id).values(quantity=0)
+        )
 
+    await outbox.add_events(db, [outbox.event("product", product_id, "product.updated", outbox.product_snapshot(product))])
     await db.commit()
+    outbox.notifier.notify()
+    count_cache.clear()
+    await product_cache.invalidate(product_id)
     await db.refresh(product)
     return product
 
+# quantity выбирается в _sort_columns: у шардированных товаров это не только products.quantity
 SORT_MAP = {
     "id": Product.id,
     "name": Product.name,
     "price": Product.price,
-    "quantity": Product.quantity,
 }
 
-async def search_products(db: AsyncSession, product_search: ProductSearch, page_params: PageParams) -> tuple[Sequence[Product], int]:
-    col = SORT_MAP[page_params.sort_by]
-    order_expr = col.desc() if page_params.sort_order == "desc" else col.asc()
+# Страницы читаются только нужными колонками — без ORM-сущностей и identity map
+PRODUCT_COLUMNS = (Product.id, Product.name, Product.description, Product.price, QUANTITY_TOTAL.label("quantity"))
+PRODUCT_FIELDS = tuple(c.key for c in PRODUCT_COLUMNS)
+# RETURNING у upsert: в нём нельзя коррелированный подзапрос по шардам, поэтому
+# полный остаток шардированных товаров досчитывается в _snapshots
+_RETURNING = (Product.id, Product.name, Product.description, Product.price, Product.quantity, Product.stock_shards)
+
+
+async def _snapshots(db: AsyncSession, rows: Sequence) -> list[dict]:
+    snapshots = [outbox.product_snapshot(r) for r in rows]
+    sharded = {r.id for r in rows if r.stock_shards}
+    if sharded:
+        totals = dict((await db.execute(
+            select(Product.id, QUANTITY_TOTAL).where(Product.id.in_(sharded))
+        )).all())
+        for snapshot in snapshots:
+            snapshot["quantity"] = totals.get(snapshot["id"], snapshot["quantity"])
+    return snapshots
+
+
+class ProductPageResult(NamedTuple):
+    # Словари с полями ProductRead
+    items: list[dict]
+    total: int | None
+    has_more: bool
+    next_cursor: str | None
+
+
+# Короткий кэш точных total: листание одной выборки не пересчитывает count(*) на каждой странице
+count_cache = TTLCache(ttl=float(os.getenv("COUNT_CACHE_TTL", "5")))
+
+
+async def _exact_total(db: AsyncSession, cache_key: tuple, conds: list) -> int:
+    total = count_cache.get(cache_key)
+    if total is None:
+        count_stmt = select(func.count()).select_from(Product)
+        if conds:
+            count_stmt = count_stmt.where(*conds)
+        total = int(await db.scalar(count_stmt) or 0)
+        count_cache.set(cache_key, total)
+    return total
+
+
+async def _estimated_total(db: AsyncSession, conds: list) -> int:
+    if not conds:
+        # Статистика таблицы: reltuples = -1, пока по таблице не было ANALYZE/VACUUM
+        reltuples = await db.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'products'::regclass")
+        )
+        if reltuples is not None and reltuples >= 0:
+            return int(reltuples)
+
+    # Оценка планировщика для запроса с фильтрами — сам запрос не выполняется
+    stmt = select(Product.id)
+    if conds:
+        stmt = stmt.where(*conds)
+    conn = await db.connection()
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    result = await conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + compiled.string, compiled.params)
+    plan = result.scalar_one()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def _total(db: AsyncSession, page_params: PageParams, cache_key: tuple, conds: list) -> int | None:
+    if page_params.total_mode == "exact":
+        return await _exact_total(db, cache_key, conds)
+    if page_params.total_mode == "estimate":
+        return await _estimated_total(db, conds)
+    return None
+
+
+async def _quantity_sort_column(db: AsyncSession):
+    """
+    Сортировка по quantity идёт по тому же полному остатку, что в ответе. Пока
+    шардированных товаров нет, он равен products.quantity — и страницы читаются по
+    ix_products_quantity_id; иначе — по выражению пул + шарды, без индекса.
+    """
+    sharded = await db.scalar(select(exists().where(Product.stock_shards > 0)))
+    return QUANTITY_TOTAL if sharded else Product.quantity
+
+
+async def _sort_columns(db: AsyncSession, page_params: PageParams, rank=None) -> tuple:
+    if page_params.sort_by == "relevance":
+        if rank is None:
+            raise HTTPException(status_code=400, detail="sort_by=relevance requires q")
+        col = rank
+    elif page_params.sort_by == "quantity":
+        col = await _quantity_sort_column(db)
+    else:
+        col = SORT_MAP[page_params.sort_by]
+    # id добавляется вторым ключом: без уникального хвоста keyset-пагинация теряет строки с равными значениями
+    return (col,) if col is Product.id else (col, Product.id)
+
+
+def _paginate(stmt, page_params: PageParams, cols: tuple):
+    desc = page_params.sort_order == "desc"
+    # Ключ сортировки выбирается вместе со строкой — из него строится next_cursor
+    stmt = stmt.add_columns(*cols).order_by(*[c.desc() if desc else c.asc() for c in cols])
+
+    if page_params.cursor is None:
+        stmt = stmt.offset(page_params.offset)
+    else:
+        key = decode_cursor(page_params.cursor, page_params.sort_by, page_params.sort_order)
+        check_cursor_key(key, [c.type.python_type for c in cols])
+        row, bound = tuple_(*cols), tuple_(*[literal(v, c.type) for v, c in zip(key, cols)])
+        stmt = stmt.where(row < bound if desc else row > bound)
+
+    # limit + 1: лишняя строка говорит, есть ли следующая страница, без отдельного запроса
+    return stmt.limit(page_params.limit + 1)
+
+
+def _page_result(rows: Sequence, total: int | None, page_params: PageParams) -> ProductPageResult:
+    width = len(PRODUCT_FIELDS)
+    items = [dict(zip(PRODUCT_FIELDS, row)) for row in rows[:page_params.limit]]
+    has_more = len(rows) > page_params.limit
+    next_cursor = None
+    if has_more:
+        key = list(rows[page_params.limit - 1][width:])
+        next_cursor = encode_cursor(page_params.sort_by, page_params.sort_order, key)
+    return ProductPageResult(items, total, has_more, next_cursor)
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _match_condition(product_search: ProductSearch):
+    """
+    Условие поиска по q. Все режимы обслуживаются индексами:
+    substring/prefix — GIN pg_trgm по name, fulltext — GIN по search_vector.
+    """
+    q = product_search.q
+    if product_search.match == "fulltext":
+        return Product.search_vector.op("@@")(func.websearch_to_tsquery(SEARCH_CONFIG, q))
+    if product_search.match == "prefix":
+        return Product.name.ilike(f"{_like_escape(q)}%")
+    return Product.name.ilike(f"%{_like_escape(q)}%")
+
+
+async def search_products(db: AsyncSession, product_search: ProductSearch, page_params: PageParams) -> ProductPageResult:
     conds = []
+    rank = None
 
     if product_search.q is not None:
-        conds.append(Product.name.ilike(f"%{product_search.q}%"))
+        conds.append(_match_condition(product_search))
+        rank = func.ts_rank_cd(
+            Product.search_vector, func.websearch_to_tsquery(SEARCH_CONFIG, product_search.q), type_=Float
+        )
 
     if product_search.min_price is not None:
         conds.append(Product.price >= product_search.min_price)
@@ -91,33 +296,135 @@ async def search_products(db: AsyncSession, product_search: ProductSearch, page_
     if product_search.max_price is not None:
         conds.append(Product.price <= product_search.max_price)
 
-    stmt = select(Product)
+    stmt = select(*PRODUCT_COLUMNS)
     if conds:
         stmt = stmt.where(*conds)
-    stmt = stmt.order_by(order_expr).offset(page_params.offset).limit(page_params.limit)
-    result = await db.execute(stmt)
-    items = result.scalars().all()
+    result = await db.execute(_paginate(stmt, page_params, await _sort_columns(db, page_params, rank)))
+    rows = result.all()
 
-    count_stmt = select(func.count()).select_from(Product)
-    if conds:
-        count_stmt = count_stmt.where(*conds)
-
-    total = await db.scalar(count_stmt)
+    cache_key = (
+        "search", product_search.q, product_search.match,
+        product_search.min_price, product_search.max_price,
+    )
+    total = await _total(db, page_params, cache_key, conds)
 
-    return items, int(total or 0)
+    return _page_result(rows, total, page_params)
 
 
 async def list_products(
     db: AsyncSession,
     *,
     page_params: PageParams
-) -> tuple[Sequence[Product], int]:
-    col = SORT_MAP[page_params.sort_by]
-    order_expr = col.desc() if page_params.sort_order == "desc" else col.asc()
+) -> ProductPageResult:
+    result = await db.execute(_paginate(select(*PRODUCT_COLUMNS), page_params, await _sort_columns(db, page_params)))
+    rows = result.all()
+    total = await _total(db, page_params, ("list",), [])
+    return _page_result(rows, total, page_params)
 
-    total = await db.scalar(select(func.count()).select_from(Product))
-    result = await db.execute(
-        select(Product).order_by(order_expr).offset(page_params.offset).limit(page_params.limit)
-    )
-    items = result.scalars().all()
-    return items, int(total or 0)
\ No newline at end of file
+
+# --- Массовый upsert каталога ---
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+# С этого числа строк payload идёт через COPY во временную таблицу, а не пачками INSERT
+BULK_COPY_THRESHOLD = int(os.getenv("BULK_COPY_THRESHOLD", "5000"))
+
+# xmax = 0 только у строки, вставленной этим же оператором; после ON CONFLICT DO UPDATE он ненулевой
+_INSERTED = literal_column("(xmax = 0)").label("inserted")
+
+
+def _bulk_outcomes(rows: Sequence[tuple[int, ProductCreate]], returned) -> list[BulkRowResult]:
+    """
+    Раскладывает RETURNING (id, name, inserted) обратно по исходным строкам.
+    Повтор имени внутри payload — всегда updated: строку уже создала первая позиция.
+    """
+    by_name: dict = {}
+    for r in returned:
+        # Имя могло попасть в несколько пачек — исход первой позиции решает первая пачка
+        by_name.setdefault(r.name, r)
+    outcomes, seen = [], set()
+    for index, product in rows:
+        r = by_name[product.name]
+        status = "inserted" if r.inserted and product.name not in seen else "updated"
+        seen.add(product.name)
+        outcomes.append(BulkRowResult(index=index, status=status, id=r.id))
+    return outcomes
+
+
+async def _bulk_insert_batches(db: AsyncSession, rows: Sequence[tuple[int, ProductCreate]]) -> list:
+    returned = []
+    for start in range(0, len(rows), BULK_BATCH_SIZE):
+        # ON CONFLICT не может дважды обновить одну строку за оператор — схлопываем имена в пачке
+        merged: dict[str, dict] = {}
+        for _, product in rows[start:start + BULK_BATCH_SIZE]:
+            if product.name in merged:
+                merged[product.name]["quantity"] += product.quantity
+            else:
+                merged[product.name] = product.model_dump()
+
+        stmt = insert(Product).values(list(merged.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Product.name],
+            set_={"quantity": Product.quantity + stmt.excluded.quantity},
+        ).returning(*_RETURNING, _INSERTED)
+        result = await db.execute(stmt)
+        returned.extend(result.all())
+    return returned
+
+
+async def _bulk_copy_merge(db: AsyncSession, rows: Sequence[tuple[int, ProductCreate]]) -> list:
+    await db.execute(text(
+        "CREATE TEMP TABLE products_stage "
+        "(ord int, name text, description text, price float8, quantity int) ON COMMIT DROP"
+    ))
+
+    conn = await db.connection()
+    raw = await conn.get_raw_connection()
+    async with raw.driver_connection.cursor() as cur:
+        async with cur.copy(
+            "COPY products_stage (ord, name, description, price, quantity) FROM STDIN"
+        ) as copy:
+            for index, p in rows:
+                await copy.write_row((index, p.name, p.description, p.price, p.quantity))
+
+    # price/description берутся из первой строки с этим именем — как у одиночного upsert
+    result = await db.execute(text("""
+        INSERT INTO products (name, description, price, quantity)
+        SELECT name,
+               (array_agg(description ORDER BY ord))[1],
+               (array_agg(price ORDER BY ord))[1],
+               sum(quantity)
+        FROM products_stage
+        GROUP BY name
+        ON CONFLICT (name) DO UPDATE SET quantity = products.quantity + EXCLUDED.quantity
+        RETURNING id, name, description, price, quantity, stock_shards, (xmax = 0) AS inserted
+    """))
+    return result.all()
+
+
+async def bulk_upsert_products(
+    db: AsyncSession, rows: Sequence[tuple[int, ProductCreate]]
+) -> tuple[list[BulkRowResult], str]:
+    """
+    Та же семантика, что у create_product (вставить или прибавить quantity), для
+    всего payload в одной транзакции. rows — пары (индекс в payload, товар).
+    Возвращает исходы по строкам и использованный способ: insert или copy.
+    """
+    if not rows:
+        return [], "insert"
+
+    method = "copy" if len(rows) >= BULK_COPY_THRESHOLD else "insert"
+    if method == "copy":
+        returned = await _bulk_copy_merge(db, rows)
+    else:
+        returned = await _bulk_insert_batches(db, rows)
+    snapshots = await _snapshots(db, returned)
+    await outbox.add_events(db, [
+        outbox.event("product", r.id, "product.created" if r.inserted else "product.updated", snapshot)
+        for r, snapshot in zip(returned, snapshots)
+    ])
+    await db.commit()
+    outbox.notifier.notify()
+
+    count_cache.clear()
+    await product_cache.invalidate(*(r.id for r in returned if not r.inserted))
+    return _bulk_outcomes(rows, returned), method
@@ -0,0 +1,453 @@
+import logging
+from decimal import Decimal
+from typing import Iterable, NamedTuple, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import Integer, Numeric, case, cast, column, func, select, text, update, values
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.product import Product
+from app.models.order_item import OrderItem
+from app.models.product_stock_shard import ProductStockShard
+from app.schemas.order_item import OrderItemCreate
+
+logger = logging.getLogger(__name__)
+
+# Полный остаток товара: пул в products.quantity плюс сумма шардов.
+# Подзапрос выполняется только для шардированных товаров — CASE в Postgres ленивый
+QUANTITY_TOTAL = case(
+    (
+        Product.stock_shards > 0,
+        Product.quantity + func.coalesce(
+            select(func.sum(ProductStockShard.quantity))
+            .where(ProductStockShard.product_id == Product.id)
+            .correlate_except(ProductStockShard)
+            .scalar_subquery(),
+            0,
+        ),
+    ),
+    else_=Product.quantity,
+)
+
+# Цена позиции фиксируется при резервировании: округлённая до копеек цена товара в этот момент
+UNIT_PRICE = cast(Product.price, Numeric(12, 2))
+
+
+class Reservation(NamedTuple):
+    id: int
+    name: str
+    unit_price: Decimal
+    # Остаток после списания
+    quantity: int
+    need: int
+
+
+def merge_items(items: Iterable[OrderItemCreate]) -> dict[int, int]:
+    """
+    Схлопывает повторяющиеся product_id в одну потребность.
+    Ключи отсортированы — строки товаров блокируются в одном и том же порядке,
+    поэтому параллельные заказы не ловят дедлок друг на друге.
+    """
+    need: dict[int, int] = {}
+    for item in items:
+        need[item.product_id] = need.get(item.product_id, 0) + item.quantity
+    return dict(sorted(need.items()))
+
+
+async def reserve_stock(db: AsyncSession, need: dict[int, int], trace_id: str = "-") -> dict[int, Reservation]:
+    """
+    Резервирует остатки под все позиции.
+
+    Обычные товары списываются одним UPDATE ... FROM (VALUES ...): строка
+    списывается только если quantity >= need, поэтому два параллельных заказа
+    не могут увести остаток в минус. Шардированные товары (stock_shards > 0)
+    затем списываются по одному — со случайного свободного шарда.
+    Если хоть одна позиция не прошла, транзакция откатывается целиком и
+    поднимается HTTPException с указанием конкретного товара.
+
+    Порядок блокировок у всех заказов один: обычные товары по id, затем
+    шардированные по id — поэтому дедлоков между заказами нет.
+    """
+    need_values = values(
+        column("product_id", Integer),
+        column("need", Integer),
+        name="need",
+    ).data(list(need.items()))
+
+    locked = (
+        select(Product.id)
+        .where(Product.id.in_(need.keys()), Product.stock_shards == 0)
+        .order_by(Product.id)
+        .with_for_update()
+        .cte("locked")
+        .prefix_with("MATERIALIZED")
+    )
+
+    stmt = (
+        update(Product)
+        .where(
+            Product.id == need_values.c.product_id,
+            locked.c.id == need_values.c.product_id,
+            Product.quantity >= need_values.c.need,
+        )
+        .values(quantity=Product.quantity - need_values.c.need)
+        .returning(Product.id, Product.name, UNIT_PRICE, Product.quantity, need_values.c.need)
+    )
+
+    result = await db.execute(stmt)
+    reserved = {row.id: Reservation(*row) for row in result.all()}
+
+    # Не списанные первым UPDATE: шардированные товары, нехватка или нет такого товара.
+    # По id по возрастанию — тот же порядок блокировок, что у всех заказов
+    for product_id in need:
+        if product_id in reserved:
+            continue
+        reservation = await _reserve_sharded(db, product_id, need[product_id])
+        if reservation is None:
+            break
+        reserved[product_id] = reservation
+
+    if len(reserved) < len(need):
+        await db.rollback()
+        await _raise_shortage(db, need, reserved, trace_id)
+
+    return reserved
+
+
+_TAKE_FROM_SHARD = """
+    WITH p AS (
+        SELECT id, name, price, quantity, stock_shards,
+               floor(random() * stock_shards)::int AS start
+        FROM products
+        WHERE id = :product_id AND stock_shards > 0
+    ),
+    pick AS (
+        SELECT s.shard
+        FROM product_stock_shards AS s, p
+        WHERE s.product_id = p.id AND s.quantity >= :need
+        ORDER BY mod(s.shard - p.start + p.stock_shards, p.stock_shards)
+        LIMIT 1
+        {lock}
+    )
+    UPDATE product_stock_shards AS s
+    SET quantity = s.quantity - :need
+    FROM pick, p
+    WHERE s.product_id = p.id AND s.shard = pick.shard AND s.quantity >= :need
+    RETURNING p.id, p.name, p.price::numeric(12, 2),
+              p.quantity + (SELECT sum(quantity) FROM product_stock_shards WHERE product_id = p.id) - :need,
+              :need
+"""
+# SKIP LOCKED — занятые другими заказами шарды пропускаются без ожидания
+_TAKE_FREE_SHARD = text(_TAKE_FROM_SHARD.format(lock="FOR UPDATE OF s SKIP LOCKED"))
+# Шард выбирается без блокировки, UPDATE ждёт только его — а не следующий в случайном
+# порядке, как ждал бы SELECT ... FOR UPDATE после отвергнутой строки
+_WAIT_FOR_SHARD = text(_TAKE_FROM_SHARD.format(lock=""))
+
+
+async def _reserve_sharded(db: AsyncSession, product_id: int, need: int) -> Reservation | None:
+    # Быстрый путь: первый незанятый шард с достаточным остатком, начиная со случайного
+    params = {"product_id": product_id, "need": need}
+    row = (await db.execute(_TAKE_FREE_SHARD, params)).first()
+    if row is None:
+        # Заказов больше, чем шардов, и все подходящие заняты: ждём один шард, а не блокировку
+        # пула и всех шардов — иначе каждый такой заказ выстраивал бы в очередь остальные.
+        # Если после ожидания остатка не хватило, UPDATE всё равно оставил блокировку шарда;
+        # откат к savepoint снимает её до медленного пути, который блокирует пул раньше шардов
+        async with db.begin_nested() as savepoint:
+            row = (await db.execute(_WAIT_FOR_SHARD, params)).first()
+            if row is None:
+                await savepoint.rollback()
+    if row is not None:
+        return Reservation(*row)
+    return await _reserve_across_shards(db, product_id, need)
+
+
+async def _reserve_across_shards(db: AsyncSession, product_id: int, need: int) -> Reservation | None:
+    """
+    Медленный путь: ни один шард не покрывает need целиком (или товар
+    не шардирован и остатка не хватило). Ждём блокировки пула и всех шардов
+    (в порядке shard) и списываем сначала с пула, потом с шардов.
+    """
+    # FOR NO KEY UPDATE: не конфликтует с KEY SHARE, который берёт FK order_items у заказов,
+    # уже списавших с шарда, — иначе они ждали бы нас, а мы их шарды
+    product = (await db.execute(
+        select(Product.name, UNIT_PRICE.label("unit_price"), Product.quantity)
+        .where(Product.id == product_id)
+        .with_for_update(key_share=True)
+    )).first()
+    if product is None:
+        return None
+    shards = (await db.execute(
+        select(ProductStockShard.shard, ProductStockShard.quantity)
+        .where(ProductStockShard.product_id == product_id)
+        .order_by(ProductStockShard.shard)
+        .with_for_update()
+    )).all()
+    total = product.quantity + sum(s.quantity for s in shards)
+    if total < need:
+        return None
+
+    take_pool, takes = _plan_takes(product.quantity, shards, need)
+    if take_pool:
+        await db.execute(update(Product).where(Product.id == product_id).values(quantity=Product.quantity - take_pool))
+    if takes:
+        await _add_to_shards(db, product_id, [(shard, -take) for shard, take in takes])
+    return Reservation(product_id, product.name, product.unit_price, total - need, need)
+
+
+def _plan_takes(pool: int, shards: Sequence, need: int) -> tuple[int, list[tuple[int, int]]]:
+    # Сначала пул, потом самые полные шарды — шарды остаются ровнее
+    take_pool = min(pool, need)
+    left = need - take_pool
+    takes = []
+    for shard in sorted(shards, key=lambda s: -s.quantity):
+        if left == 0:
+            break
+        take = min(shard.quantity, left)
+        takes.append((shard.shard, take))
+        left -= take
+    return take_pool, takes
+
+
+class BatchStock(NamedTuple):
+    name: str
+    unit_price: Decimal
+    # Остаток после списания всего пакета
+    quantity: int
+
+
+async def reserve_batch(db: AsyncSession, needs: Sequence[dict[int, int]]) -> tuple[dict[int, BatchStock], dict[int, str]]:
+    """
+    Резервирует остатки сразу под пакет заказов (needs[i] — merge_items заказа i).
+    Заказы обслуживаются по порядку: заказ, которому не хватило хоть одного товара,
+    отклоняется целиком, остальные проходят. Возвращает остатки затронутых товаров
+    и {i: причина} для отклонённых.
+
+    Блокировки — в том же порядке, что у reserve_stock: обычные товары одним
+    SELECT ... FOR UPDATE по id, затем шардированные по id (пул, потом шарды).
+    Списание — одним UPDATE на все строки products и по одному на шарды товара.
+    """
+    product_ids = sorted({pid for need in needs for pid in need})
+    if not product_ids:
+        return {}, {}
+    plain = (await db.execute(
+        select(Product.id, Product.name, UNIT_PRICE.label("unit_price"), Product.quantity)
+        .where(Product.id.in_(product_ids), Product.stock_shards == 0)
+        .order_by(Product.id)
+        .with_for_update()
+    )).all()
+    info = {row.id: row for row in plain}
+    available = {row.id: row.quantity for row in plain}
+
+    shards: dict[int, Sequence] = {}
+    for product_id in product_ids:
+        if product_id in info:
+            continue
+        product = (await db.execute(
+            select(Product.id, Product.name, UNIT_PRICE.label("unit_price"), Product.quantity)
+            .where(Product.id == product_id)
+            .with_for_update(key_share=True)
+        )).first()
+        if product is None:
+            continue
+        shards[product_id] = (await db.execute(
+            select(ProductStockShard.shard, ProductStockShard.quantity)
+            .where(ProductStockShard.product_id == product_id)
+            .order_by(ProductStockShard.shard)
+            .with_for_update()
+        )).all()
+        info[product_id] = product
+        available[product_id] = product.quantity + sum(s.quantity for s in shards[product_id])
+
+    rejected: dict[int, str] = {}
+    for index, need in enumerate(needs):
+        missing = next((pid for pid in need if pid not in info), None)
+        if missing is not None:
+            rejected[index] = f"Product ID {missing} not found"
+            continue
+        short = next((pid for pid, n in need.items() if available[pid] < n), None)
+        if short is not None:
+            rejected[index] = f"Not enough stock for product {info[short].name}"
+            continue
+        for pid, n in need.items():
+            available[pid] -= n
+
+    pool_takes, touched = [], {}
+    for product_id, row in info.items():
+        taken = row.quantity + sum(s.quantity for s in shards.get(product_id, ())) - available[product_id]
+        if not taken:
+            continue
+        touched[product_id] = BatchStock(row.name, row.unit_price, available[product_id])
+        take_pool, shard_takes = _plan_takes(row.quantity, shards.get(product_id, ()), taken)
+        if take_pool:
+            pool_takes.append((product_id, take_pool))
+        if shard_takes:
+            await _add_to_shards(db, product_id, [(shard, -take) for shard, take in shard_takes])
+
+    if pool_takes:
+        takes = values(column("product_id", Integer), column("take", Integer), name="take").data(pool_takes)
+        await db.execute(
+            update(Product)
+            .where(Product.id == takes.c.product_id)
+            .values(quantity=Product.quantity - takes.c.take)
+        )
+    return touched, rejected
+
+
+async def restore_stock(db: AsyncSession, order_ids: list[int]) -> dict[int, int]:
+    """
+    Возвращает на склад позиции отменённых заказов одним UPDATE ... FROM
+    (SELECT product_id, sum(quantity) ... GROUP BY product_id) — сколько бы ни было
+    позиций и заказов. У шардированных товаров остаток возвращается в пул.
+    Возвращает {product_id: полный остаток после возврата}.
+    """
+    restored = (
+        select(OrderItem.product_id, func.sum(OrderItem.quantity).label("quantity"))
+        .where(OrderItem.order_id.in_(order_ids))
+        .group_by(OrderItem.product_id)
+        .subquery("restored")
+    )
+    # Порядок блокировок как при резервировании: обычные товары по id, затем шардированные
+    # по id — иначе дедлок с create_order и пакетом заказов на те же товары.
+    # FOR NO KEY UPDATE не ждёт KEY SHARE от FK order_items у заказов, списавших с шардов
+    locked = (
+        select(Product.id)
+        .where(Product.id.in_(select(restored.c.product_id)))
+        .order_by(Product.stock_shards > 0, Product.id)
+        .with_for_update(key_share=True)
+        .cte("locked")
+        .prefix_with("MATERIALIZED")
+    )
+    result = await db.execute(
+        update(Product)
+        .where(Product.id == restored.c.product_id, locked.c.id == restored.c.product_id)
+        .values(quantity=Product.quantity + restored.c.quantity)
+        .returning(Product.id, QUANTITY_TOTAL)
+    )
+    return dict(result.all())
+
+
+async def _add_to_shards(db: AsyncSession, product_id: int, deltas: list[tuple[int, int]]) -> None:
+    delta_values = values(column("shard", Integer), column("delta", Integer), name="delta").data(deltas)
+    await db.execute(
+        update(ProductStockShard)
+        .where(
+            ProductStockShard.product_id == product_id,
+            ProductStockShard.shard == delta_values.c.shard,
+        )
+        .values(quantity=ProductStockShard.quantity + delta_values.c.delta)
+    )
+
+
+async def _raise_shortage(db: AsyncSession, need: dict[int, int], reserved: dict[int, Reservation], trace_id: str):
+    # Сюда попадаем только на неуспешном пути — лишний SELECT нужен ради понятной ошибки
+    missing = [pid for pid in need if pid not in reserved]
+    result = await db.execute(
+        select(Product.id, Product.name, QUANTITY_TOTAL.label("quantity")).where(Product.id.in_(missing))
+    )
+    found = {row.id: row for row in result.all()}
+
+    for product_id in missing:
+        product = found.get(product_id)
+        if product is None:
+            logger.warning("[%s] ❌ Product ID %s not found", trace_id, product_id)
+            raise HTTPException(status_code=404, detail=f"Product ID {product_id} not found")
+
+        if product.quantity >= need[product_id]:
+            continue
+
+        logger.warning(
+            "[%s] ❗ Not enough stock for product %s (have %d, need %d)",
+            trace_id, product.name, product.quantity, need[product_id],
+        )
+        raise HTTPException(status_code=400, detail=f"Not enough stock for product {product.name}")
+
+    # Остаток успели пополнить между UPDATE и проверкой — резерв уже откатан, пусть клиент повторит
+    raise HTTPException(status_code=409, detail="Stock changed concurrently, please retry")
+
+
+def _split(total: int, shards: int) -> list[int]:
+    base, extra = divmod(total, shards)
+    return [base + (1 if i < extra else 0) for i in range(shards)]
+
+
+async def set_stock_shards(db: AsyncSession, product_id: int, shards: int) -> list[int] | None:
+    """
+    Включает (shards > 0), меняет число или выключает (0) шардирование остатка товара.
+    Остаток собирается и раскладывается заново поровну; пул обнуляется.
+    Возвращает остатки по шардам; None — товара нет.
+    """
+    pool = await db.scalar(
+        select(Product.quantity).where(Product.id == product_id).with_for_update(key_share=True)
+    )
+    if pool is None:
+        return None
+    current = (await db.execute(
+        select(ProductStockShard.quantity)
+        .where(ProductStockShard.product_id == product_id)
+        .order_by(ProductStockShard.shard)
+        .with_for_update()
+    )).scalars().all()
+    total = pool + sum(current)
+
+    await db.execute(ProductStockShard.__table__.delete().where(ProductStockShard.product_id == product_id))
+    split = _split(total, shards) if shards else []
+    if split:
+        await db.execute(ProductStockShard.__table__.insert().values([
+            {"product_id": product_id, "shard": i, "quantity": q} for i, q in enumerate(split)
+        ]))
+    await db.execute(
+        update(Product).where(Product.id == product_id)
+        .values(stock_shards=shards, quantity=0 if shards else total)
+    )
+    await db.commit()
+    return split
+
+
+async def rebalance_shards(db: AsyncSession, product_id: int) -> bool:
+    """
+    Переносит пул в шарды и выравнивает шарды между собой. Если пул или шарды
+    сейчас заняты заказами, товар пропускается до следующего прохода (NOWAIT).
+    Возвращает True, если что-то изменилось.
+    """
+    try:
+        pool = await db.scalar(
+            select(Product.quantity).where(Product.id == product_id, Product.stock_shards > 0)
+            .with_for_update(nowait=True, key_share=True)
+        )
+        shards = (await db.execute(
+            select(ProductStockShard.shard, ProductStockShard.quantity)
+            .where(ProductStockShard.product_id == product_id)
+            .order_by(ProductStockShard.shard)
+            .with_for_update(nowait=True)
+        )).all()
+    except OperationalError:
+        await db.rollback()
+        return False
+    if pool is None or not shards:
+        await db.rollback()
+        return False
+
+    target = _split(pool + sum(s.quantity for s in shards), len(shards))
+    deltas = [(s.shard, t - s.quantity) for s, t in zip(shards, target) if t != s.quantity]
+    if not deltas and pool == 0:
+        await db.rollback()
+        return False
+
+    await db.execute(update(Product).where(Product.id == product_id).values(quantity=0))
+    if deltas:
+        await _add_to_shards(db, product_id, deltas)
+    await db.commit()
+    return True
+
+
+async def rebalance_all(db: AsyncSession) -> int:
+    product_ids = (await db.execute(
+        select(Product.id).where(Product.stock_shards > 0).order_by(Product.id)
+    )).scalars().all()
+    await db.rollback()
+    rebalanced = 0
+    for product_id in product_ids:
+        rebalanced += await rebalance_shards(db, product_id)
+    return rebalanced
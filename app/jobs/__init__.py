@@ -0,0 +1,6 @@
+from app.core.scheduler import scheduler
+from app.jobs import (
+    analytics_rollup, idempotency_cleanup, metrics, order_archive, order_expiry, outbox_relay, stock_rebalancer,
+)
+
+__all__ = ["scheduler"]
@@ -0,0 +1,54 @@
+"""
+Фоновое сложение дельт аналитики в rollup-таблицы и команда полного пересчёта:
+
+    python -m app.jobs.analytics_rollup --rebuild
+"""
+import argparse
+import asyncio
+import logging
+import os
+
+from app.core.database import SessionLocal
+from app.core.scheduler import scheduler
+from app.crud import analytics
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_ROLLUP_INTERVAL = float(os.getenv("ANALYTICS_ROLLUP_INTERVAL", "5"))
+ANALYTICS_ROLLUP_BATCH = int(os.getenv("ANALYTICS_ROLLUP_BATCH", "5000"))
+
+
+async def fold_rollups(session_factory=SessionLocal) -> int:
+    """
+    Складывает все накопившиеся дельты пачками по ANALYTICS_ROLLUP_BATCH.
+    """
+    folded = 0
+    async with session_factory() as db:
+        while True:
+            batch = await analytics.fold_deltas(db, ANALYTICS_ROLLUP_BATCH)
+            if batch is None:
+                break
+            folded += batch
+            if batch < ANALYTICS_ROLLUP_BATCH:
+                break
+    if folded:
+        logger.info("📊 Folded %d analytics deltas into rollups", folded)
+    return folded
+
+
+async def rebuild_rollups(session_factory=SessionLocal) -> dict[str, int]:
+    async with session_factory() as db:
+        counts = await analytics.rebuild(db)
+    logger.info("📊 Rebuilt analytics rollups: %s", counts)
+    return counts
+
+
+job = scheduler.add("analytics_rollup", ANALYTICS_ROLLUP_INTERVAL, fold_rollups)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analytics rollups maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="пересчитать rollup-таблицы с нуля по orders и order_items")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(rebuild_rollups() if args.rebuild else fold_rollups()))
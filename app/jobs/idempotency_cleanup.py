@@ -0,0 +1,22 @@
+import logging
+import os
+
+from app.core.database import SessionLocal
+from app.core.scheduler import scheduler
+from app.crud import idempotency
+
+logger = logging.getLogger(__name__)
+
+# 0 — не запускать (например, если чистка вынесена в отдельный процесс)
+IDEMPOTENCY_CLEANUP_INTERVAL = float(os.getenv("IDEMPOTENCY_CLEANUP_INTERVAL", "300"))
+
+
+async def purge_expired_keys(session_factory=SessionLocal) -> int:
+    async with session_factory() as db:
+        purged = await idempotency.purge_expired(db)
+    if purged:
+        logger.info("🧹 Purged %d expired idempotency keys", purged)
+    return purged
+
+
+job = scheduler.add("idempotency_cleanup", IDEMPOTENCY_CLEANUP_INTERVAL, purge_expired_keys)
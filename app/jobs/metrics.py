@@ -0,0 +1,17 @@
+import asyncio
+import os
+
+from app.core import prometheus
+from app.core.metrics import measure_loop_lag
+from app.core.scheduler import scheduler
+
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "1"))
+
+
+async def flush_metrics() -> None:
+    await asyncio.to_thread(prometheus.write_snapshot)
+
+
+scheduler.add("event_loop_lag", EVENT_LOOP_LAG_INTERVAL, measure_loop_lag)
+if prometheus.METRICS_MULTIPROC_DIR is not None:
+    scheduler.add("metrics_flush", prometheus.METRICS_FLUSH_INTERVAL, flush_metrics)
@@ -0,0 +1,75 @@
+"""
+Обслуживание секций заказов: секции на месяцы вперёд и перенос старых месяцев в архив.
+
+    python -m app.jobs.order_archive              — создать секции и заархивировать старые месяцы
+    python -m app.jobs.order_archive --partitions — только создать секции
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from app.core.database import SessionLocal
+from app.core.scheduler import scheduler
+from app.crud import archive
+
+logger = logging.getLogger(__name__)
+
+# Месяц уходит в архив, когда закончился раньше, чем ORDER_ARCHIVE_AFTER_DAYS дней назад; 0 — не архивировать
+ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "180"))
+ORDER_PARTITIONS_AHEAD = int(os.getenv("ORDER_PARTITIONS_AHEAD", "3"))
+ORDER_ARCHIVE_INTERVAL = float(os.getenv("ORDER_ARCHIVE_INTERVAL", "3600"))
+# Сколько DETACH/CREATE ждут блокировку orders, прежде чем отступить до следующего запуска
+ORDER_ARCHIVE_LOCK_TIMEOUT_MS = int(os.getenv("ORDER_ARCHIVE_LOCK_TIMEOUT_MS", "2000"))
+
+
+def _today():
+    return datetime.now(timezone.utc).date()
+
+
+async def ensure_partitions(session_factory=SessionLocal) -> list[str]:
+    async with session_factory() as db:
+        created = await archive.ensure_partitions(
+            db, _today(), ORDER_PARTITIONS_AHEAD, ORDER_ARCHIVE_LOCK_TIMEOUT_MS,
+        )
+    if created:
+        logger.info("🗓️ Created order partitions: %s", ", ".join(created))
+    return created
+
+
+async def archive_orders(session_factory=SessionLocal, after_days: int | None = None) -> dict[str, int]:
+    """
+    Переносит в архив все месяцы, закончившиеся раньше чем after_days дней назад.
+    Каждый месяц — отдельная транзакция; занятые и незавершённые месяцы пропускаются.
+    Возвращает {секция: число заказов} для перенесённых.
+    """
+    after_days = ORDER_ARCHIVE_AFTER_DAYS if after_days is None else after_days
+    cutoff = _today() - timedelta(days=after_days)
+    archived = {}
+    async with session_factory() as db:
+        for month in await archive.live_months(db):
+            if archive.next_month(month) > cutoff:
+                break
+            orders = await archive.archive_month(db, month, ORDER_ARCHIVE_LOCK_TIMEOUT_MS)
+            if orders is not None:
+                archived[archive.partition_name("orders", month)] = orders
+    return archived
+
+
+async def maintain(session_factory=SessionLocal) -> dict[str, int]:
+    await ensure_partitions(session_factory)
+    if ORDER_ARCHIVE_AFTER_DAYS <= 0:
+        return {}
+    return await archive_orders(session_factory)
+
+
+job = scheduler.add("order_archive", ORDER_ARCHIVE_INTERVAL, maintain)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Order partitions and archive maintenance")
+    parser.add_argument("--partitions", action="store_true", help="только создать секции на месяцы вперёд")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(ensure_partitions() if args.partitions else maintain()))
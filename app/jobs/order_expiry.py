@@ -0,0 +1,39 @@
+import logging
+import os
+import time
+
+from app.core.database import SessionLocal
+from app.core.metrics import order_expiry_run_seconds, orders_expired_per_run
+from app.core.scheduler import scheduler
+from app.crud import order as crud_order
+
+logger = logging.getLogger(__name__)
+
+# Через сколько секунд неоплаченный pending-заказ отменяется и возвращает остаток; 0 — не отменять
+ORDER_RESERVATION_TTL = float(os.getenv("ORDER_RESERVATION_TTL", "1800"))
+ORDER_EXPIRY_INTERVAL = float(os.getenv("ORDER_EXPIRY_INTERVAL", "60"))
+ORDER_EXPIRY_BATCH = int(os.getenv("ORDER_EXPIRY_BATCH", "500"))
+
+
+async def expire_reservations(session_factory=SessionLocal, ttl: float | None = None) -> int:
+    """
+    Отменяет все просроченные pending-заказы пачками по ORDER_EXPIRY_BATCH,
+    каждая пачка — отдельная короткая транзакция.
+    """
+    ttl = ORDER_RESERVATION_TTL if ttl is None else ttl
+    started = time.perf_counter()
+    expired = 0
+    async with session_factory() as db:
+        while True:
+            orders = await crud_order.expire_pending_orders(db, ttl, ORDER_EXPIRY_BATCH)
+            expired += len(orders)
+            if len(orders) < ORDER_EXPIRY_BATCH:
+                break
+    order_expiry_run_seconds.observe(time.perf_counter() - started)
+    orders_expired_per_run.observe(expired)
+    if expired:
+        logger.info("⌛ Expired %d pending orders older than %.0fs", expired, ttl)
+    return expired
+
+
+scheduler.add("order_expiry", ORDER_EXPIRY_INTERVAL if ORDER_RESERVATION_TTL > 0 else 0, expire_reservations)
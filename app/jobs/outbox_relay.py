@@ -0,0 +1,48 @@
+import logging
+import os
+
+from app.core.database import SessionLocal
+from app.core.scheduler import scheduler
+from app.core.sinks import EventSink, sink_from_env
+from app.crud import outbox
+from app.schemas.change import ChangeEvent
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_RELAY_INTERVAL = float(os.getenv("OUTBOX_RELAY_INTERVAL", "1"))
+OUTBOX_RELAY_BATCH = int(os.getenv("OUTBOX_RELAY_BATCH", "500"))
+# Сколько хранятся события (для GET /changes); неотправленные при настроенном sink не удаляются
+OUTBOX_RETENTION = float(os.getenv("OUTBOX_RETENTION", str(7 * 24 * 3600)))
+OUTBOX_CLEANUP_INTERVAL = float(os.getenv("OUTBOX_CLEANUP_INTERVAL", "3600"))
+
+sink = sink_from_env()
+
+
+async def relay_once(session_factory=SessionLocal, event_sink: EventSink | None = None) -> int:
+    """
+    Отправляет следующую пачку событий в sink и помечает их отправленными.
+    Если sink упал, транзакция откатывается и пачка уйдёт повторно.
+    """
+    event_sink = event_sink or sink
+    async with session_factory() as db:
+        events = await outbox.claim_unpublished(db, OUTBOX_RELAY_BATCH)
+        if not events:
+            return 0
+        await event_sink.publish([ChangeEvent.model_validate(e).model_dump(mode="json") for e in events])
+        await outbox.mark_published(db, [e.seq for e in events])
+        await db.commit()
+    logger.info("📤 Relayed %d outbox events up to seq %d", len(events), events[-1].seq)
+    return len(events)
+
+
+async def purge_old_events(session_factory=SessionLocal) -> int:
+    async with session_factory() as db:
+        purged = await outbox.purge_events(db, OUTBOX_RETENTION, require_published=sink is not None)
+    if purged:
+        logger.info("🧹 Purged %d old outbox events", purged)
+    return purged
+
+
+if sink is not None:
+    scheduler.add("outbox_relay", OUTBOX_RELAY_INTERVAL, relay_once)
+scheduler.add("outbox_cleanup", OUTBOX_CLEANUP_INTERVAL, purge_old_events)
@@ -0,0 +1,22 @@
+import logging
+import os
+
+from app.core.database import SessionLocal
+from app.core.scheduler import scheduler
+from app.crud import stock
+
+logger = logging.getLogger(__name__)
+
+# Как часто пополнения пула и перекосы между шардами раскладываются заново
+STOCK_REBALANCE_INTERVAL = float(os.getenv("STOCK_REBALANCE_INTERVAL", "5"))
+
+
+async def rebalance_stock_shards(session_factory=SessionLocal) -> int:
+    async with session_factory() as db:
+        rebalanced = await stock.rebalance_all(db)
+    if rebalanced:
+        logger.info("⚖️ Rebalanced stock shards of %d products", rebalanced)
+    return rebalanced
+
+
+job = scheduler.add("stock_rebalancer", STOCK_REBALANCE_INTERVAL, rebalance_stock_shards)
@@ -1,3 +1,6 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from dotenv import load_dotenv
 load_dotenv()
@@ -5,15 +8,50 @@ load_dotenv()
 from app.api import product as product_router
 from app.api import order as order_router
 from app.api import system as system_router
+from app.api import changes as changes_router
+from app.api import analytics as analytics_router
 
+from app.core.database import PrimaryPinMiddleware, engine, replica_engine
+from app.core.health import install_sigterm_drain, readiness, wait_for_in_flight
+from app.core.instrumentation import QueryStatsMiddleware
+from app.core.metrics import MetricsMiddleware
+from app.core.prometheus import remove_snapshot
 from app.core.logging import setup_logging
+from app.jobs import scheduler
 setup_logging()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Фоновые задачи (чистка ключей идемпотентности и т.п.) живут вместе с приложением
+    scheduler.start()
+    restore_sigterm = install_sigterm_drain(readiness)
+    yield
+    # Остановка: новых запросов не берём, дожидаемся начатых (заказы не теряются),
+    # потом фоновые задачи и только затем закрываем пулы соединений
+    readiness.draining = True
+    await wait_for_in_flight()
+    await scheduler.stop()
+    remove_snapshot()
+    for db_engine in (engine, replica_engine):
+        if db_engine is not None:
+            await db_engine.dispose()
+    restore_sigterm()
+    logger.info("👋 Shutdown complete")
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(PrimaryPinMiddleware)
+app.add_middleware(QueryStatsMiddleware)
+# Снаружи всех: в длительность входит работа остальных middleware
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(system_router.router)
 app.include_router(product_router.router)
 app.include_router(order_router.router)
+app.include_router(changes_router.router)
+app.include_router(analytics_router.router)
 
 @app.get("/")
 def root():
@@ -1,3 +1,11 @@
 from .product import Product
 from .order import Order
 from .order_item import OrderItem
+from .idempotency_key import IdempotencyKey
+from .outbox_event import OutboxEvent
+from .product_stock_shard import ProductStockShard
+from .sales_daily import SalesDaily
+from .order_status_daily import OrderStatusDaily
+from .rollup_delta import RollupDelta
+from .order_archive import OrderArchive
+from .order_item_archive import OrderItemArchive
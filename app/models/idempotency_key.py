@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, PrimaryKeyConstraint, func
+from app.core.database import Base
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # Ручка, к которой относится ключ: один и тот же ключ в разных ручках независим
+    scope = Column(String(64), nullable=False)
+    key = Column(String(255), nullable=False)
+    # sha256 тела запроса — повтор ключа с другим телом отклоняется
+    request_hash = Column(String(64), nullable=False)
+    # Пусто, пока исходный запрос не завершился
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        PrimaryKeyConstraint("scope", "key", name="pk_idempotency_keys"),
+        # Под удаление просроченных ключей
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
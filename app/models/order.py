@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Enum, func
+from sqlalchemy import Column, Integer, String, DateTime, Numeric, Enum, Index, PrimaryKeyConstraint, DDL, event, func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 import enum
@@ -11,14 +11,38 @@ class OrderStatusEnum(str, enum.Enum):
     cancelled = "отменён"
 
 
+# Итоговые статусы: заказ завершён, его месяц может уйти в архив
+FINAL_STATUSES = (OrderStatusEnum.delivered, OrderStatusEnum.cancelled)
+
+
 class Order(Base):
+    """
+    Заказы секционированы по месяцам created_at (orders_pYYYY_MM, см. app/crud/archive.py);
+    orders_default принимает строки вне созданных секций. Ключ секционирования входит
+    в первичный ключ таблицы, но заказ по-прежнему идентифицируется одним id.
+    """
     __tablename__ = "orders"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, autoincrement=True, nullable=False)
     customer_name = Column(String, nullable=False)
-    total_price = Column(Float, nullable=False, default=0.0)  # ← Рассчитывается по items
+    total_price = Column(Numeric(14, 2), nullable=False, default=0)  # ← Сумма line_total позиций
     status = Column(Enum(OrderStatusEnum), default=OrderStatusEnum.pending)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "created_at", name="orders_pkey"),
+        # Поиск просроченных резервов: status = pending AND created_at < ...
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        # Фильтры GET /orders и массовой отмены; id — для keyset-порядка
+        Index("ix_orders_customer_name_id", "customer_name", "id"),
+        Index("ix_orders_created_at", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    __mapper_args__ = {"primary_key": [id]}
 
     # Связь с OrderItem
-    items = relationship("OrderItem", back_populates="order", cascade="all, delete")
+    # Позиции в порядке добавления — так же, как их отдаёт список заказов
+    items = relationship("OrderItem", back_populates="order", cascade="all, delete", order_by="OrderItem.id")
+
+
+event.listen(Order.__table__, "after_create", DDL("CREATE TABLE orders_default PARTITION OF orders DEFAULT"))
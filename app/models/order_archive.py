@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, DateTime, Numeric, Enum, PrimaryKeyConstraint
+from sqlalchemy.orm import relationship
+from app.core.database import Base
+from app.models.order import OrderStatusEnum
+
+
+class OrderArchive(Base):
+    """
+    Архив заказов: месячные секции orders, отсоединённые задачей архивации
+    (app/jobs/order_archive.py) и присоединённые сюда без копирования строк.
+    Колонки — как у orders; из индексов остаётся только первичный ключ.
+    """
+    __tablename__ = "orders_archive"
+
+    id = Column(Integer, nullable=False)
+    customer_name = Column(String, nullable=False)
+    total_price = Column(Numeric(14, 2), nullable=False)
+    status = Column(Enum(OrderStatusEnum))
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "created_at", name="orders_archive_pkey"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    __mapper_args__ = {"primary_key": [id]}
+
+    items = relationship(
+        "OrderItemArchive",
+        primaryjoin="and_(OrderArchive.id == foreign(OrderItemArchive.order_id), "
+                    "OrderArchive.created_at == foreign(OrderItemArchive.order_created_at))",
+        order_by="OrderItemArchive.id",
+        viewonly=True,
+    )
@@ -1,16 +1,42 @@
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import (
+    Column, Integer, DateTime, ForeignKey, ForeignKeyConstraint, PrimaryKeyConstraint, Numeric, Computed, Index, DDL, event,
+)
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
 
 class OrderItem(Base):
+    """
+    Позиции секционированы по тем же месяцам, что и заказы: order_created_at —
+    копия orders.created_at, секция позиций отсоединяется вместе с секцией заказов.
+    """
     __tablename__ = "order_items"
 
-    id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False)
+    id = Column(Integer, autoincrement=True, nullable=False)
+    order_id = Column(Integer, nullable=False)
+    order_created_at = Column(DateTime(timezone=True), nullable=False)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     quantity = Column(Integer, nullable=False)
+    # Цена на момент заказа — отчёты не зависят от текущей products.price
+    unit_price = Column(Numeric(12, 2), nullable=False)
+    line_total = Column(Numeric(14, 2), Computed("quantity * unit_price", persisted=True))
+
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "order_created_at", name="order_items_pkey"),
+        ForeignKeyConstraint(
+            ["order_id", "order_created_at"], ["orders.id", "orders.created_at"],
+            name="order_items_order_fkey", ondelete="CASCADE", onupdate="CASCADE",
+        ),
+        # Покрывающие индексы: продажи по товару и суммы по заказу читаются index-only scan
+        Index("ix_order_items_product_sales", "product_id", postgresql_include=["quantity", "line_total"]),
+        Index("ix_order_items_order_totals", "order_id", postgresql_include=["quantity", "line_total"]),
+        {"postgresql_partition_by": "RANGE (order_created_at)"},
+    )
+    __mapper_args__ = {"primary_key": [id]}
 
     # Связи
     order = relationship("Order", back_populates="items")
     product = relationship("Product")
+
+
+event.listen(OrderItem.__table__, "after_create", DDL("CREATE TABLE order_items_default PARTITION OF order_items DEFAULT"))
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, PrimaryKeyConstraint, Numeric, Computed, Index
+from app.core.database import Base
+
+
+class OrderItemArchive(Base):
+    """
+    Архив позиций: секции order_items тех же месяцев, что и в orders_archive.
+    Индекс по order_id совпадает с ix_order_items_order_totals — при присоединении
+    секции он не строится заново.
+    """
+    __tablename__ = "order_items_archive"
+
+    id = Column(Integer, nullable=False)
+    order_id = Column(Integer, nullable=False)
+    order_created_at = Column(DateTime(timezone=True), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    unit_price = Column(Numeric(12, 2), nullable=False)
+    line_total = Column(Numeric(14, 2), Computed("quantity * unit_price", persisted=True))
+
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "order_created_at", name="order_items_archive_pkey"),
+        Index("ix_order_items_archive_order_totals", "order_id", postgresql_include=["quantity", "line_total"]),
+        {"postgresql_partition_by": "RANGE (order_created_at)"},
+    )
+    __mapper_args__ = {"primary_key": [id]}
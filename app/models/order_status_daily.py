@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Date, BigInteger, Enum, PrimaryKeyConstraint
+from app.core.database import Base
+from app.models.order import OrderStatusEnum
+
+
+class OrderStatusDaily(Base):
+    """
+    Сколько заказов, созданных в этот день (UTC), сейчас в каждом статусе.
+    """
+    __tablename__ = "order_status_daily"
+
+    day = Column(Date, nullable=False)
+    status = Column(Enum(OrderStatusEnum), nullable=False)
+    orders = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("day", "status", name="pk_order_status_daily"),
+    )
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Index, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+from app.core.database import Base
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+
+    seq = Column(BigInteger, primary_key=True, autoincrement=True)
+    aggregate = Column(String(32), nullable=False)  # product / order
+    aggregate_id = Column(Integer, nullable=False)
+    event_type = Column(String(64), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    # Транзакция, записавшая событие: seq выдаётся до коммита, поэтому события
+    # отдаются только когда все более ранние транзакции завершились
+    txid = Column(BigInteger, nullable=False, server_default=text("pg_current_xact_id()::text::bigint"))
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # Когда relay отправил событие в sink; пусто — ещё не отправлено
+    published_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbox_events_unpublished", "seq", postgresql_where=text("published_at IS NULL")),
+    )
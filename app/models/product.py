@@ -1,15 +1,40 @@
-from sqlalchemy import Column, Integer, String, Float, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, UniqueConstraint, Index, Computed, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 from app.core.database import Base
 
+# Конфигурация полнотекстового поиска: русские слова стеммятся russian_stem, латиница — english_stem
+SEARCH_CONFIG = "russian"
+
 class Product(Base):
     __tablename__ = "products"
 
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True, nullable=False, unique=True)  # ← добавили unique=True
+    id = Column(Integer, primary_key=True)
+    # Уникальность и поиск по имени — индекс uq_products_name
+    name = Column(String, nullable=False)
     description = Column(String, nullable=True)
     price = Column(Float, nullable=False)
+    # При stock_shards > 0 здесь лежит только нераспределённый пул, остальное — в product_stock_shards
     quantity = Column(Integer, nullable=False)
+    # 0 — обычный товар; N — остаток разнесён по N строкам product_stock_shards
+    stock_shards = Column(Integer, nullable=False, default=0, server_default="0")
+    # Нужен только в WHERE/ORDER BY поиска — в обычные выборки не грузим
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed(
+            f"to_tsvector('{SEARCH_CONFIG}', coalesce(name, '') || ' ' || coalesce(description, ''))",
+            persisted=True,
+        ),
+    ))
 
     __table_args__ = (
         UniqueConstraint("name", name="uq_products_name"),
+        # Составные индексы под keyset-пагинацию: (sort column, id)
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_quantity_id", "quantity", "id"),
+        # Есть ли шардированные товары (сортировка по quantity) и их список для ребалансировки
+        Index("ix_products_sharded", "id", postgresql_where=text("stock_shards > 0")),
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+        # GIN-индекс pg_trgm по name (ix_products_name_trgm) создаётся только миграцией:
+        # расширение pg_trgm может быть недоступно в тестовой БД, где схема строится через create_all
     )
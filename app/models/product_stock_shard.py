@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, ForeignKey, PrimaryKeyConstraint, CheckConstraint
+from app.core.database import Base
+
+
+class ProductStockShard(Base):
+    """
+    Часть остатка товара в режиме шардированного склада: заказы списывают
+    с разных строк параллельно, а не встают в очередь на одной products.quantity.
+    """
+    __tablename__ = "product_stock_shards"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    shard = Column(Integer, nullable=False)
+    quantity = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("product_id", "shard", name="pk_product_stock_shards"),
+        CheckConstraint("quantity >= 0", name="ck_product_stock_shards_quantity"),
+    )
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, BigInteger, Integer, Date, Numeric, Enum
+from app.core.database import Base
+from app.models.order import OrderStatusEnum
+
+
+class RollupDelta(Base):
+    """
+    Изменение аналитики, записанное в транзакции заказа. Заказы только дописывают
+    строки сюда (без UPDATE общих строк — горячих точек нет), фоновая задача
+    складывает их в sales_daily и order_status_daily.
+    Строка с product_id — дельта продаж, со status — дельта числа заказов в статусе.
+    """
+    __tablename__ = "rollup_deltas"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    product_id = Column(Integer, nullable=True)
+    status = Column(Enum(OrderStatusEnum), nullable=True)
+    units = Column(BigInteger, nullable=False, default=0)
+    revenue = Column(Numeric(16, 2), nullable=False, default=0)
+    orders = Column(BigInteger, nullable=False, default=0)
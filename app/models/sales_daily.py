@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Date, Integer, BigInteger, Numeric, PrimaryKeyConstraint, Index
+from app.core.database import Base
+
+
+class SalesDaily(Base):
+    """
+    Продажи товара за день (по дню создания заказа, UTC): штуки, выручка и число заказов.
+    Отменённые заказы вычитаются. Пополняется из rollup_deltas фоновой задачей.
+    """
+    __tablename__ = "sales_daily"
+
+    day = Column(Date, nullable=False)
+    product_id = Column(Integer, nullable=False)
+    units = Column(BigInteger, nullable=False, default=0)
+    revenue = Column(Numeric(16, 2), nullable=False, default=0)
+    orders = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("day", "product_id", name="pk_sales_daily"),
+        # Продажи одного товара за период: stock-risk и фильтр по product_id
+        Index("ix_sales_daily_product_day", "product_id", "day", postgresql_include=["units", "revenue"]),
+    )
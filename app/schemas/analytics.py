@@ -0,0 +1,54 @@
+from datetime import date, datetime, timedelta, timezone
+
+from pydantic import BaseModel, Field, model_validator
+
+# Самый длинный период одного запроса к аналитике
+ANALYTICS_MAX_DAYS = 366
+
+
+class AnalyticsRange(BaseModel):
+    # Дни по UTC, обе границы включительно; по умолчанию — последние 30 дней
+    date_from: date | None = None
+    date_to: date | None = None
+
+    @model_validator(mode="after")
+    def fill_defaults(self):
+        if self.date_to is None:
+            self.date_to = datetime.now(timezone.utc).date()
+        if self.date_from is None:
+            self.date_from = self.date_to - timedelta(days=29)
+        if self.date_from > self.date_to:
+            raise ValueError("date_from должна быть не позже date_to")
+        if (self.date_to - self.date_from).days >= ANALYTICS_MAX_DAYS:
+            raise ValueError(f"Период не длиннее {ANALYTICS_MAX_DAYS} дней")
+        return self
+
+
+class SalesQuery(AnalyticsRange):
+    product_id: int | None = None
+    limit: int = Field(1000, ge=1, le=10000)
+
+
+class SalesDailyRow(BaseModel):
+    day: date
+    product_id: int
+    units: int
+    revenue: float
+    # Сколько заказов с этим товаром
+    orders: int
+
+
+class OrderStatusCounts(BaseModel):
+    date_from: date
+    date_to: date
+    total: int
+    by_status: dict[str, int]
+
+
+class StockRiskRow(BaseModel):
+    product_id: int
+    name: str
+    quantity: int
+    avg_daily_units: float
+    # На сколько дней хватит остатка при среднем темпе продаж
+    days_of_cover: float
@@ -0,0 +1,23 @@
+from datetime import datetime
+from typing import Any
+
+from pydantic import BaseModel
+
+
+class ChangeEvent(BaseModel):
+    seq: int
+    aggregate: str
+    aggregate_id: int
+    event_type: str
+    payload: dict[str, Any]
+    created_at: datetime
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+class ChangesPage(BaseModel):
+    events: list[ChangeEvent]
+    # since для следующего запроса
+    next_since: int
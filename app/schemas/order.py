@@ -1,6 +1,6 @@
-from pydantic import BaseModel, field_validator, ConfigDict
+from pydantic import BaseModel, Field, field_validator, model_validator, ConfigDict
 from datetime import datetime
-from typing import List
+from typing import List, Literal
 import enum
 
 
@@ -31,6 +31,9 @@ class OrderCreate(BaseModel):
 
 class OrderItemRead(OrderItemCreate):
     id: int
+    # Цена и сумма строки на момент заказа
+    unit_price: float
+    line_total: float
 
     model_config = {
         "from_attributes":True
@@ -56,4 +59,62 @@ class OrderRead(BaseModel):
             return v.name  # "delivered", "shipped", etc.
         if isinstance(v, str):
             return v  # уже строка — ок
-        raise ValueError("Недопустимое значение статуса")
\ No newline at end of file
+        raise ValueError("Недопустимое значение статуса")
+
+
+# В фильтре статус задаётся так же, как он отдаётся в OrderRead: pending, shipped, ...
+OrderStatusName = Literal["pending", "shipped", "delivered", "cancelled"]
+
+
+class OrderFilter(BaseModel):
+    status: OrderStatusName | None = None
+    customer_name: str | None = Field(None, min_length=1, max_length=255)
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+
+
+class OrderPageParams(BaseModel):
+    limit: int = Field(100, ge=1, le=1000)
+    # Курсор из заголовка X-Next-Cursor предыдущей страницы
+    cursor: str | None = Field(None, max_length=512)
+
+
+class OrderBulkCancel(BaseModel):
+    # Какие заказы отменить: перечисленные id и/или заказы покупателя; условия складываются через AND
+    order_ids: List[int] | None = Field(None, min_length=1, max_length=1000)
+    customer_name: str | None = Field(None, min_length=1, max_length=255)
+    # Например, только pending — отправленные не трогать
+    status: OrderStatusName | None = None
+    # Не больше limit заказов за запрос, по возрастанию id
+    limit: int = Field(1000, ge=1, le=1000)
+
+    @model_validator(mode="after")
+    def require_target(self):
+        if self.order_ids is None and self.customer_name is None:
+            raise ValueError("Нужно указать order_ids или customer_name")
+        return self
+
+
+class OrderBulkCancelResult(BaseModel):
+    cancelled: int
+    orders: List[OrderRead]
+
+
+# Сколько заказов принимает POST /orders/batch за раз
+ORDER_BATCH_MAX = 1000
+
+
+class OrderBatchRow(BaseModel):
+    index: int
+    status: Literal["created", "rejected"]
+    id: int | None = None
+    total_price: float | None = None
+    error: str | None = None
+
+
+class OrderBatchResult(BaseModel):
+    created: int
+    rejected: int
+    elapsed_ms: float
+    orders_per_sec: float
+    rows: List[OrderBatchRow]
@@ -11,7 +11,8 @@ class ProductBase(BaseModel):
     # Нормализация имени — убираем лишние пробелы и приводим к одному регистру (если нужно)
     @field_validator("name", mode="before")
     def normalize_name(cls, v: str) -> str:
-        return v.strip()
+        # Не-строки оставляем как есть — их отклонит валидация типа, а не AttributeError
+        return v.strip() if isinstance(v, str) else v
 
 
 class ProductCreate(ProductBase):
@@ -25,11 +26,17 @@ class ProductRead(ProductBase):
         "from_attributes": True
     }
 
-SortBy = Literal["id", "name", "price", "quantity"]
+# relevance — ранг полнотекстового совпадения с q (ts_rank_cd), доступен только в /search
+SortBy = Literal["id", "name", "price", "quantity", "relevance"]
 SortOrder = Literal["asc", "desc"]
+# exact — count(*) (с коротким кэшем), estimate — оценка планировщика, none — только has_more
+TotalMode = Literal["exact", "estimate", "none"]
+# substring — name ILIKE %q%, prefix — name ILIKE q%, fulltext — по name + description со стеммингом
+MatchMode = Literal["substring", "prefix", "fulltext"]
 
 class ProductSearch(BaseModel):
     q: str | None = Field(None, min_length=1, max_length=100)
+    match: MatchMode = "substring"
     min_price: float | None = Field(None, ge=0)
     max_price: float | None = Field(None, ge=0)
 
@@ -39,10 +46,44 @@ class PageParams(BaseModel):
     offset: int | None = Field(0, ge=0)
     sort_by: SortBy = "id"
     sort_order: SortOrder = "asc"
+    # Если передан cursor — страница берётся keyset-способом, offset игнорируется
+    cursor: str | None = Field(None, max_length=512)
+    total_mode: TotalMode = "exact"
 
 
 class ProductPage(BaseModel):
     items: list[ProductRead]
-    total: int
+    total: int | None
+    has_more: bool = False
     limit: int
-    offset: int
\ No newline at end of file
+    offset: int
+    next_cursor: str | None = None
+
+
+class BulkRowResult(BaseModel):
+    index: int
+    status: Literal["inserted", "updated", "rejected"]
+    id: int | None = None
+    error: str | None = None
+
+
+class ProductBulkResult(BaseModel):
+    inserted: int
+    updated: int
+    rejected: int
+    method: Literal["insert", "copy"]
+    elapsed_ms: float
+    rows_per_sec: float
+    rows: list[BulkRowResult]
+
+
+class StockShardsUpdate(BaseModel):
+    # 0 — выключить шардирование и собрать остаток обратно в products.quantity
+    shards: int = Field(..., ge=0, le=64)
+
+
+class StockShardsRead(BaseModel):
+    product_id: int
+    shards: int
+    quantity: int
+    shard_quantities: list[int]
@@ -12,4 +12,40 @@ class EchoRequest(BaseModel):
 
 class EchoResponse(BaseModel):
     message: str
-    length: int
\ No newline at end of file
+    length: int
+
+class HistogramSnapshot(BaseModel):
+    buckets: dict[str, int]
+    sum: float
+    count: int
+
+class PoolStatsResponse(BaseModel):
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    capacity: int
+    saturation: float
+    checkout_wait_seconds: HistogramSnapshot
+
+class CacheStatsResponse(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+    evictions: int
+
+class OrderExpiryStatsResponse(BaseModel):
+    # sum гистограммы expired_per_run — всего отменено с запуска процесса
+    expired_per_run: HistogramSnapshot
+    run_seconds: HistogramSnapshot
+
+class ReadinessCheck(BaseModel):
+    ok: bool
+    detail: str | None = None
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    checks: dict[str, ReadinessCheck]
+    # Возраст закэшированного результата проверки, секунды
+    age_seconds: float
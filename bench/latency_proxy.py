@@ -0,0 +1,107 @@
+"""
+TCP-прокси с задержкой: изображает Postgres на отдельном хосте, когда БД локальная.
+
+    python -m bench.latency_proxy --target 127.0.0.1:5432 --rtt-ms 2 --port 6432
+
+Каждый кусок данных доставляется через rtt/2 после получения в каждую сторону, порядок
+внутри соединения сохраняется. Запускается отдельным процессом, чтобы задержка не
+зависела от загрузки event loop бенчмарка.
+"""
+import argparse
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, delay: float) -> None:
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def deliver():
+        while True:
+            due, data = await queue.get()
+            if data is None:
+                break
+            await asyncio.sleep(due - loop.time())
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+
+    sender = asyncio.create_task(deliver())
+    try:
+        while data := await reader.read(65536):
+            queue.put_nowait((loop.time() + delay, data))
+    except ConnectionError:
+        pass
+    queue.put_nowait((0.0, None))
+    try:
+        await sender
+    except ConnectionError:
+        pass
+
+
+async def serve(port: int, target_host: str, target_port: int, rtt_ms: float) -> None:
+    delay = rtt_ms / 2000
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(target_host, target_port)
+        await asyncio.gather(
+            _pipe(client_reader, server_writer, delay),
+            _pipe(server_reader, client_writer, delay),
+        )
+
+    server = await asyncio.start_server(handle, "127.0.0.1", port)
+    async with server:
+        await server.serve_forever()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def proxied_url(database_url: str, rtt_ms: float):
+    """
+    Поднимает прокси к БД из database_url и отдаёт URL, который ходит через него.
+    """
+    parts = urlsplit(database_url)
+    port = _free_port()
+    proxy = subprocess.Popen([
+        sys.executable, "-m", "bench.latency_proxy",
+        "--target", f"{parts.hostname}:{parts.port or 5432}", "--rtt-ms", str(rtt_ms), "--port", str(port),
+    ])
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        else:
+            raise RuntimeError("latency proxy did not start")
+        netloc = parts.netloc.rsplit("@", 1)
+        host = f"127.0.0.1:{port}"
+        yield parts._replace(netloc=f"{netloc[0]}@{host}" if len(netloc) == 2 else host).geturl()
+    finally:
+        proxy.terminate()
+        proxy.wait(timeout=10)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", required=True, help="host:port настоящей БД")
+    parser.add_argument("--rtt-ms", type=float, required=True, help="добавочный round trip, мс")
+    parser.add_argument("--port", type=int, required=True)
+    args = parser.parse_args(argv)
+    host, _, port = args.target.rpartition(":")
+    asyncio.run(serve(args.port, host, int(port), args.rtt_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Сколько времени event loop тратит на логи одного заказа: прежний синхронный
+FileHandler + StreamHandler против очереди с QueueListener (с ограничением
+строк на позиции и без).
+
+    python -m bench.logging_overhead --orders 2000 --items 20
+
+Вызовы логгеров повторяют create_order: входящий запрос, строка на каждую
+позицию, итог и успех. БД не нужна — меряется только время в вызовах logging.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from bench.stats import summarize, write_json
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--out", help="куда записать JSON с результатами")
+    return parser.parse_args(argv)
+
+
+def _sync_logging(log_file: str) -> list[logging.Handler]:
+    # Как было: basicConfig с FileHandler и StreamHandler на корневом логгере
+    handlers = [logging.FileHandler(log_file), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+        logging.getLogger().addHandler(handler)
+    return handlers
+
+
+async def _orders(args) -> list[float]:
+    from app.crud.order import item_logger, logger as order_logger
+    api_logger = logging.getLogger("app.api.order")
+
+    per_order = []
+    for order_id in range(args.orders):
+        trace_id = f"bench-{order_id}"
+        started = time.perf_counter()
+        api_logger.info("[%s] ➕ Incoming create_order request from customer: %s", trace_id, "bench")
+        for item in range(args.items):
+            item_logger.info("[%s] 🛒 Reserved %d of %s for order %d", trace_id, 1, f"product-{item}", order_id)
+        order_logger.info("[%s] 💰 Total price for order %d calculated: %.2f", trace_id, order_id, 9.99)
+        api_logger.info("[%s] ✅ Order created successfully with total: %.2f", trace_id, 9.99)
+        per_order.append(time.perf_counter() - started)
+        # Отдаём управление циклу, как между запросами
+        await asyncio.sleep(0)
+    return per_order
+
+
+async def main(argv=None) -> int:
+    args = parse_args(argv)
+    from app.core import logging as app_logging
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    results = {}
+    stderr = sys.stderr
+    with tempfile.TemporaryDirectory() as tmp:
+        # Консольный вывод логов уходит в /dev/null, чтобы не мешать таблице
+        sys.stderr = open(os.devnull, "w")
+        try:
+            for mode, rate in (("sync", None), ("queue", "0"), ("queue_rate_limited", "50")):
+                log_file = os.path.join(tmp, f"{mode}.log")
+                if rate is None:
+                    handlers = _sync_logging(log_file)
+                else:
+                    os.environ.update(LOG_FILE=log_file, LOG_ITEM_RATE=rate)
+                    app_logging.setup_logging()
+
+                started = time.perf_counter()
+                per_order = await _orders(args)
+                wall = time.perf_counter() - started
+
+                if rate is None:
+                    for handler in handlers:
+                        root.removeHandler(handler)
+                        handler.close()
+                else:
+                    app_logging.shutdown_logging()
+                results[mode] = summarize(per_order, 0, wall)
+                results[mode]["mean_ms"] = round(sum(per_order) / len(per_order) * 1000, 4)
+        finally:
+            sys.stderr.close()
+            sys.stderr = stderr
+
+    print(f"{'mode':<22}{'p50 µs':>10}{'p95 µs':>10}{'p99 µs':>10}{'mean µs':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<22}{r['p50_ms'] * 1000:>10.1f}{r['p95_ms'] * 1000:>10.1f}"
+              f"{r['p99_ms'] * 1000:>10.1f}{r['mean_ms'] * 1000:>10.1f}")
+    base = results["sync"]["mean_ms"]
+    for mode in ("queue", "queue_rate_limited"):
+        saved = base - results[mode]["mean_ms"]
+        print(f"{mode}: saves {saved * 1000:.1f} µs of event-loop time per order ({base / results[mode]['mean_ms']:.1f}x)")
+
+    if args.out:
+        write_json(args.out, {"orders": args.orders, "items": args.items, "results": results})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,68 @@
+"""
+Во что обходится MetricsMiddleware одному запросу: пустое ASGI-приложение
+с middleware и без него.
+
+    python -m bench.metrics_overhead --requests 5000 --repeats 5
+
+БД и HTTP не нужны — меряется только время вызова middleware. Из каждого режима
+берётся лучший из повторов, чтобы шум соседних процессов не попадал в разницу.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from app.core.metrics import MetricsMiddleware, RequestMetrics
+from bench.stats import write_json
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--out", help="куда записать JSON с результатами")
+    return parser.parse_args(argv)
+
+
+async def _app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _send(message):
+    pass
+
+
+async def _per_request(handler, n: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/"}
+    started = time.perf_counter()
+    for _ in range(n):
+        await handler(dict(scope), None, _send)
+    return (time.perf_counter() - started) / n
+
+
+async def main(argv=None) -> int:
+    args = parse_args(argv)
+    wrapped = MetricsMiddleware(_app, RequestMetrics())
+
+    await _per_request(wrapped, args.requests)  # прогрев
+    bare = min([await _per_request(_app, args.requests) for _ in range(args.repeats)])
+    with_metrics = min([await _per_request(wrapped, args.requests) for _ in range(args.repeats)])
+    overhead = with_metrics - bare
+
+    print(f"{'mode':<16}{'µs/request':>12}")
+    print(f"{'bare':<16}{bare * 1e6:>12.2f}")
+    print(f"{'metrics':<16}{with_metrics * 1e6:>12.2f}")
+    print(f"overhead: {overhead * 1e6:.2f} µs per request")
+
+    if args.out:
+        write_json(args.out, {
+            "requests": args.requests, "repeats": args.repeats,
+            "bare_us": round(bare * 1e6, 3), "metrics_us": round(with_metrics * 1e6, 3),
+            "overhead_us": round(overhead * 1e6, 3),
+        })
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
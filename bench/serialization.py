@@ -0,0 +1,132 @@
+"""
+Микробенчмарк сериализации страниц /products/list и GET /orders без БД и сети.
+
+    python -m bench.serialization --rows 100 --repeat 300
+
+legacy — прежний путь: ORM-объекты -> model_validate в ручке -> повторная проверка
+response_model и jsonable_encoder в FastAPI -> json.dumps.
+fast — строки из колонок -> одна проверка схемой -> FastJSONResponse (orjson).
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import orjson
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from pydantic import TypeAdapter
+
+from app.core.responses import validated_response
+from app.models.order import Order, OrderStatusEnum
+from app.models.order_item import OrderItem
+from app.models.product import Product
+from app.schemas.order import OrderRead
+from app.schemas.product import ProductPage, ProductRead
+
+
+def product_rows(n: int) -> list[dict]:
+    return [
+        {"id": i, "name": f"Товар {i}", "description": "Тёплые зимние носки", "price": 199.99, "quantity": i}
+        for i in range(1, n + 1)
+    ]
+
+
+def order_rows(n: int, items_per_order: int = 3) -> list[dict]:
+    created_at = datetime.now(timezone.utc)
+    return [
+        {
+            "id": i,
+            "customer_name": f"Клиент {i}",
+            "created_at": created_at,
+            "status": "pending",
+            "items": [
+                {"product_id": j, "quantity": 2, "id": i * 10 + j, "unit_price": Decimal("199.99"), "line_total": Decimal("399.98")}
+                for j in range(items_per_order)
+            ],
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def as_orm_products(rows: list[dict]) -> list[Product]:
+    return [Product(**row) for row in rows]
+
+
+def as_orm_orders(rows: list[dict]) -> list[Order]:
+    return [
+        Order(
+            id=row["id"], customer_name=row["customer_name"], created_at=row["created_at"],
+            status=OrderStatusEnum[row["status"]], items=[OrderItem(**item) for item in row["items"]],
+        )
+        for row in rows
+    ]
+
+
+PAGE_FIELD = create_model_field("Response_list_products", ProductPage, mode="serialization")
+ORDERS_FIELD = create_model_field("Response_read_orders", list[OrderRead], mode="serialization")
+PRODUCT_PAGE = TypeAdapter(ProductPage)
+ORDER_LIST = TypeAdapter(list[OrderRead])
+
+
+async def legacy_products(products: list[Product]) -> bytes:
+    page = ProductPage(
+        items=[ProductRead.model_validate(p) for p in products],
+        total=len(products), has_more=False, limit=len(products), offset=0,
+    )
+    content = await serialize_response(field=PAGE_FIELD, response_content=page)
+    return JSONResponse(content).body
+
+
+async def fast_products(rows: list[dict]) -> bytes:
+    page = {"items": rows, "total": len(rows), "has_more": False, "limit": len(rows), "offset": 0, "next_cursor": None}
+    return validated_response(PRODUCT_PAGE, page).body
+
+
+async def legacy_orders(orders: list[Order]) -> bytes:
+    content = await serialize_response(field=ORDERS_FIELD, response_content=orders)
+    return JSONResponse(content).body
+
+
+async def fast_orders(rows: list[dict]) -> bytes:
+    return validated_response(ORDER_LIST, rows).body
+
+
+async def measure(fn, arg, repeat: int) -> float:
+    await fn(arg)  # прогрев
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await fn(arg)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+async def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=300)
+    args = parser.parse_args(argv)
+
+    products, orders = product_rows(args.rows), order_rows(args.rows)
+    cases = {
+        "/products/list": (
+            (legacy_products, as_orm_products(products)),
+            (fast_products, products),
+        ),
+        "GET /orders": (
+            (legacy_orders, as_orm_orders(orders)),
+            (fast_orders, orders),
+        ),
+    }
+
+    print(f"rows={args.rows} repeat={args.repeat} orjson={orjson.__version__}")
+    print(f"{'endpoint':<16}{'legacy ms':>12}{'fast ms':>12}{'speedup':>10}")
+    for name, ((legacy, legacy_arg), (fast, fast_arg)) in cases.items():
+        legacy_ms = await measure(legacy, legacy_arg, args.repeat)
+        fast_ms = await measure(fast, fast_arg, args.repeat)
+        print(f"{name:<16}{legacy_ms:>12.3f}{fast_ms:>12.3f}{legacy_ms / fast_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
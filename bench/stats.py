@@ -0,0 +1,65 @@
+import json
+import math
+from typing import Sequence
+
+# Метрики, где рост — регрессия, и где регрессия — падение
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "db_round_trips_per_request", "pool_wait_mean_ms")
+HIGHER_IS_BETTER = ("throughput_rps",)
+# Параметры прогона: с другими значениями сравнение с baseline не имеет смысла
+RUN_PARAMETERS = ("mode", "concurrency", "mix", "products", "hot_skus", "hot_ratio", "workers")
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """
+    Перцентиль по nearest-rank на заранее отсортированных значениях.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies_s: list[float], errors: int, elapsed_s: float) -> dict:
+    values = sorted(latencies_s)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "throughput_rps": round(len(values) / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Сравнивает результаты по сценариям с baseline.
+    Возвращает список регрессий; пустой список — всё в пределах tolerance.
+    """
+    regressions = []
+    base_meta, cur_meta = baseline.get("meta", {}), current.get("meta", {})
+    for key in RUN_PARAMETERS:
+        if key in base_meta and cur_meta.get(key) != base_meta[key]:
+            regressions.append(f"meta.{key}: baseline ran with {base_meta[key]}, current with {cur_meta.get(key)}")
+    for name, base in baseline.get("scenarios", {}).items():
+        cur = current.get("scenarios", {}).get(name)
+        if cur is None:
+            regressions.append(f"{name}: scenario missing in current run")
+            continue
+        for metric in LOWER_IS_BETTER:
+            if base.get(metric) and cur.get(metric) is not None and cur[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}.{metric}: {base[metric]} -> {cur[metric]}")
+        for metric in HIGHER_IS_BETTER:
+            if base.get(metric) and cur.get(metric) is not None and cur[metric] < base[metric] * (1 - tolerance):
+                regressions.append(f"{name}.{metric}: {base[metric]} -> {cur[metric]}")
+    return regressions
+
+
+def write_json(path: str, data: dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def read_json(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
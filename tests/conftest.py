@@ -1,5 +1,6 @@
 # tests/conftest.py
 import os
+from contextlib import contextmanager
 import pytest
 import pytest_asyncio
 from dotenv import load_dotenv
@@ -7,7 +8,9 @@ from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
-from app.core.database import Base, get_db
+from app.core.instrumentation import capture_queries, instrument
+from app.core.database import Base, get_db, get_read_session_factory, make_read_session_factory
+from app.crud.product import count_cache, product_cache
 from app.main import app
 from httpx import AsyncClient
 from httpx import ASGITransport
@@ -32,6 +35,8 @@ if "warehouse_test" not in TEST_DATABASE_URL:
 # --- async engine / session strictly for tests ---
 engine_test = create_async_engine(TEST_DATABASE_URL, echo=False, future=True)
 SessionTest = sessionmaker(bind=engine_test, class_=AsyncSession, expire_on_commit=False)
+# Тот же учёт SQL, что у основного движка: Server-Timing и assert_max_queries
+instrument(engine_test.sync_engine)
 
 
 # --- FastAPI dependency override: всегда отдаём тестовую сессию ---
@@ -40,6 +45,8 @@ async def override_get_db():
         yield session
 
 app.dependency_overrides[get_db] = override_get_db
+# Чтения по умолчанию тоже идут в тестовую БД (без реплики)
+app.dependency_overrides[get_read_session_factory] = make_read_session_factory(SessionTest)
 
 
 # --- schema lifecycle ---
@@ -67,6 +74,9 @@ async def clear_db():
     async with engine_test.begin() as conn:
         for table in reversed(Base.metadata.sorted_tables):
             await conn.execute(table.delete())
+    # Таблицы чистятся мимо API — закэшированные total больше не актуальны
+    count_cache.clear()
+    product_cache.clear()
 
 
 # --- HTTP клиент для тестов ---
@@ -75,3 +85,19 @@ async def client():
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
         yield ac
+
+
+# --- ограничение числа SQL-операторов ---
+@pytest.fixture
+def assert_max_queries():
+    """
+    with assert_max_queries(3): await client.get(...) — падает, если внутри блока
+    выполнено больше 3 SQL-операторов. Ловит N+1 в ручках.
+    """
+    @contextmanager
+    def check(limit: int):
+        with capture_queries() as stats:
+            yield stats
+        assert stats.statements <= limit, f"expected at most {limit} queries, got {stats.statements}"
+
+    return check
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.jobs.analytics_rollup import fold_rollups, rebuild_rollups
+from app.models.rollup_delta import RollupDelta
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine(os.environ["TEST_DATABASE_URL"])
+    yield sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _product(client, name, price, quantity):
+    resp = await client.post("/products/", json={"name": name, "price": price, "quantity": quantity})
+    assert resp.status_code == 200
+    return resp.json()["id"]
+
+
+async def _order(client, items):
+    resp = await client.post("/orders/", json={
+        "customer_name": "Аналитика", "items": [{"product_id": p, "quantity": q} for p, q in items],
+    })
+    assert resp.status_code == 200
+    return resp.json()["id"]
+
+
+async def _snapshot(client, product_ids):
+    sales = (await client.get("/analytics/sales/daily")).json()
+    statuses = (await client.get("/analytics/orders/status")).json()
+    return [r for r in sales if r["product_id"] in product_ids], statuses["by_status"]
+
+
+@pytest.mark.asyncio
+async def test_rollups_follow_orders_and_status_changes(client, session_factory):
+    socks = await _product(client, "Носки для отчёта", 2.5, 100)
+    hat = await _product(client, "Шапка для отчёта", 10.0, 100)
+
+    first = await _order(client, [(socks, 2), (hat, 1)])
+    await _order(client, [(socks, 3)])
+    cancelled = await _order(client, [(hat, 5)])
+    batch = (await client.post("/orders/batch", json=[
+        {"customer_name": "Пакет", "items": [{"product_id": socks, "quantity": 1}]},
+    ])).json()
+    assert batch["created"] == 1
+    await client.patch(f"/orders/{first}/status", json={"status": "отправлен"})
+    await client.patch(f"/orders/{cancelled}/status", json={"status": "отменен"})
+
+    # До фоновой задачи ответ собирается из дельт — уже точный
+    sales, statuses = await _snapshot(client, {socks, hat})
+    assert [(r["product_id"], r["units"], r["revenue"], r["orders"]) for r in sales] == [
+        (socks, 6, 15.0, 3),
+        (hat, 1, 10.0, 1),
+    ]
+    assert statuses == {"pending": 2, "shipped": 1, "delivered": 0, "cancelled": 1}
+
+    assert await fold_rollups(session_factory) > 0
+    async with session_factory() as db:
+        assert await db.scalar(select(func.count()).select_from(RollupDelta)) == 0
+    assert await _snapshot(client, {socks, hat}) == (sales, statuses)
+
+    # Полный пересчёт даёт то же, что инкрементальное обновление
+    await rebuild_rollups(session_factory)
+    assert await _snapshot(client, {socks, hat}) == (sales, statuses)
+
+
+@pytest.mark.asyncio
+async def test_deleted_order_leaves_rollups(client, session_factory):
+    product = await _product(client, "Удаляемый из отчёта", 1.0, 10)
+    order_id = await _order(client, [(product, 4)])
+    await fold_rollups(session_factory)
+
+    assert (await client.delete(f"/orders/{order_id}")).status_code == 200
+    sales, statuses = await _snapshot(client, {product})
+    assert sales == []
+    assert statuses["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_stock_risk_ranks_by_days_of_cover(client, session_factory):
+    fast = await _product(client, "Быстро кончается", 1.0, 20)
+    slow = await _product(client, "Залежался", 1.0, 1000)
+    await _order(client, [(fast, 14), (slow, 14)])
+
+    rows = (await client.get("/analytics/stock-risk", params={"days": 7, "horizon": 7})).json()
+    # Продано 14 за 7 дней — 2 в день; у fast осталось 6 — на 3 дня, у slow — на 493
+    assert [(r["product_id"], r["quantity"], r["avg_daily_units"], r["days_of_cover"]) for r in rows] == [
+        (fast, 6, 2.0, 3.0),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rollups_backdated_by_order_day(client, session_factory):
+    product = await _product(client, "Вчерашние продажи", 1.0, 10)
+    order_id = await _order(client, [(product, 2)])
+    async with session_factory() as db:
+        await db.execute(text("UPDATE orders SET created_at = created_at - interval '1 day' WHERE id = :id"), {"id": order_id})
+        await db.commit()
+    await rebuild_rollups(session_factory)
+
+    rows = (await client.get("/analytics/sales/daily", params={"product_id": product})).json()
+    today = (await client.get("/analytics/orders/status")).json()["date_to"]
+    assert len(rows) == 1 and rows[0]["day"] < today and rows[0]["units"] == 2
+
+
+@pytest.mark.asyncio
+async def test_analytics_range_validation(client):
+    assert (await client.get("/analytics/sales/daily", params={"date_from": "2026-02-01", "date_to": "2026-01-01"})).status_code == 422
+    assert (await client.get("/analytics/orders/status", params={"date_from": "2024-01-01", "date_to": "2026-01-01"})).status_code == 422
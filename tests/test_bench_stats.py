@@ -0,0 +1,30 @@
+from bench.stats import compare, percentile, summarize
+
+
+def test_percentile_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.05
+    assert percentile(values, 99) == 0.099
+    assert percentile([], 95) == 0.0
+
+
+def test_compare_reports_regressions_beyond_tolerance():
+    baseline = {"scenarios": {"order": {**summarize([0.01] * 100, 0, 1.0), "db_round_trips_per_request": 4.0}}}
+    same = {"scenarios": {"order": {**summarize([0.0105] * 100, 0, 1.0), "db_round_trips_per_request": 4.0}}}
+    assert compare(same, baseline, tolerance=0.15) == []
+
+    slower = {"scenarios": {"order": {**summarize([0.02] * 50, 0, 1.0), "db_round_trips_per_request": 9.0}}}
+    regressions = compare(slower, baseline, tolerance=0.15)
+    assert any(r.startswith("order.p95_ms") for r in regressions)
+    assert any(r.startswith("order.throughput_rps") for r in regressions)
+    assert any(r.startswith("order.db_round_trips_per_request") for r in regressions)
+
+    assert compare({"scenarios": {}}, baseline, tolerance=0.15) == ["order: scenario missing in current run"]
+
+
+def test_compare_rejects_baseline_with_other_parameters():
+    baseline = {"meta": {"mode": "asgi", "concurrency": 32}, "scenarios": {}}
+    assert compare({"meta": {"mode": "asgi", "concurrency": 32}, "scenarios": {}}, baseline, tolerance=0.15) == []
+    assert compare({"meta": {"mode": "asgi", "concurrency": 16}, "scenarios": {}}, baseline, tolerance=0.15) == [
+        "meta.concurrency: baseline ran with 32, current with 16",
+    ]
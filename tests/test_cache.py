@@ -0,0 +1,108 @@
+import pytest
+
+from app.core.cache import LRUCache, ModelCache, InMemoryCacheBackend
+from app.schemas.product import ProductRead
+
+
+def _product(quantity: int = 1) -> ProductRead:
+    return ProductRead(id=1, name="Носки", description=None, price=10.0, quantity=quantity)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1   # "a" становится свежим
+    cache.set("c", 3)            # вытесняется "b"
+
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 2, "misses": 1, "evictions": 1}
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_workers():
+    backend = InMemoryCacheBackend()
+    worker_a = ModelCache("product", ProductRead, maxsize=10, ttl=60, backend=backend)
+    worker_b = ModelCache("product", ProductRead, maxsize=10, ttl=60, backend=backend)
+
+    await worker_a.set(1, _product(), worker_a.generation(1))
+    # Второй воркер получает значение из общего бэкенда и кладёт в свой LRU
+    assert (await worker_b.get(1)).quantity == 1
+
+    await worker_a.invalidate(1)
+
+    assert await worker_b.get(1) is None
+
+
+@pytest.mark.asyncio
+async def test_stale_read_is_not_cached_after_invalidation():
+    cache = ModelCache("product", ProductRead, maxsize=10, ttl=60)
+
+    generation = cache.generation(1)   # чтение из БД началось
+    await cache.invalidate(1)          # параллельно товар изменили
+    await cache.set(1, _product(), generation)
+
+    assert await cache.get(1) is None
+
+
+@pytest.mark.asyncio
+async def test_lagging_read_is_not_cached_right_after_invalidation():
+    cache = ModelCache("product", ProductRead, maxsize=10, ttl=60, stale_window=60)
+    await cache.invalidate(1)
+
+    await cache.set(1, _product(), cache.generation(1), lagging=True)
+    assert await cache.get(1) is None
+    # Чтение с основной БД кэшируется как обычно
+    await cache.set(1, _product(), cache.generation(1))
+    assert (await cache.get(1)).quantity == 1
+
+
+@pytest.mark.asyncio
+async def test_remembered_invalidations_are_bounded():
+    cache = ModelCache("product", ProductRead, maxsize=2, ttl=60)
+    generation = cache.generation(1)
+    await cache.invalidate(1, 2, 3, 4)
+
+    assert len(cache._invalidated) == 2
+    # Инвалидация ключа 1 забыта, но чтение, начатое до неё, всё равно не кэшируется
+    await cache.set(1, _product(), generation)
+    assert await cache.get(1) is None
+
+
+@pytest.mark.asyncio
+async def test_product_cache_follows_stock_changes(client):
+    product = (await client.post("/products/", json={
+        "name": "Кэшируемый", "price": 10.0, "quantity": 5
+    })).json()
+
+    assert (await client.get(f"/products/{product['id']}")).json()["quantity"] == 5
+    hits_before = (await client.get("/system/cache")).json()["hits"]
+    assert (await client.get(f"/products/{product['id']}")).json()["quantity"] == 5
+    assert (await client.get("/system/cache")).json()["hits"] == hits_before + 1
+
+    order = (await client.post("/orders/", json={
+        "customer_name": "Кэш", "items": [{"product_id": product["id"], "quantity": 2}]
+    })).json()
+    assert (await client.get(f"/products/{product['id']}")).json()["quantity"] == 3
+
+    await client.patch(f"/orders/{order['id']}/status", json={"status": "отменен"})
+    assert (await client.get(f"/products/{product['id']}")).json()["quantity"] == 5
+
+    await client.put(f"/products/{product['id']}", json={"name": "Кэшируемый", "price": 12.0, "quantity": 7})
+    assert (await client.get(f"/products/{product['id']}")).json()["price"] == 12.0
+
+    await client.post("/products/", json={"name": "Кэшируемый", "price": 12.0, "quantity": 1})
+    assert (await client.get(f"/products/{product['id']}")).json()["quantity"] == 8
+
+
+@pytest.mark.asyncio
+async def test_deleted_product_is_not_served_from_cache(client):
+    product = (await client.post("/products/", json={
+        "name": "Удаляемый", "price": 1.0, "quantity": 1
+    })).json()
+    assert (await client.get(f"/products/{product['id']}")).status_code == 200
+
+    await client.delete(f"/products/{product['id']}")
+
+    assert (await client.get(f"/products/{product['id']}")).status_code == 404
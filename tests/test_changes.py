@@ -0,0 +1,108 @@
+import asyncio
+import json
+import os
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.sinks import FileSink, WebhookSink, WebhookStub
+from app.jobs.outbox_relay import relay_once
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine(os.environ["TEST_DATABASE_URL"])
+    yield sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _changes(client, since=0, **params):
+    resp = await client.get("/changes", params={"since": since, "wait": 0, **params})
+    assert resp.status_code == 200
+    return resp.json()
+
+
+@pytest.mark.asyncio
+async def test_changes_follow_writes_in_order(client):
+    product = (await client.post("/products/", json={"name": "Событие", "price": 5.0, "quantity": 10})).json()
+    await client.post("/products/", json={"name": "Событие", "price": 5.0, "quantity": 1})
+    order = (await client.post("/orders/", json={
+        "customer_name": "Подписчик", "items": [{"product_id": product["id"], "quantity": 3}],
+    })).json()
+    await client.patch(f"/orders/{order['id']}/status", json={"status": "отменён"})
+
+    page = await _changes(client)
+    assert [(e["event_type"], e["aggregate_id"]) for e in page["events"]] == [
+        ("product.created", product["id"]),
+        ("product.updated", product["id"]),
+        ("order.created", order["id"]),
+        ("product.stock_changed", product["id"]),
+        ("order.status_changed", order["id"]),
+        ("product.stock_changed", product["id"]),
+    ]
+    stock = [e["payload"]["quantity"] for e in page["events"] if e["event_type"] == "product.stock_changed"]
+    assert stock == [8, 11]
+    assert page["events"][4]["payload"] == {"id": order["id"], "status": "cancelled", "previous": "pending"}
+
+    # Постранично через next_since — без пропусков и повторов
+    first = await _changes(client, limit=4)
+    rest = await _changes(client, since=first["next_since"])
+    assert [e["seq"] for e in first["events"] + rest["events"]] == [e["seq"] for e in page["events"]]
+    assert (await _changes(client, since=page["next_since"]))["events"] == []
+
+    await client.delete(f"/orders/{order['id']}")
+    await client.delete(f"/products/{product['id']}")
+    last = (await _changes(client, since=page["next_since"]))["events"]
+    assert [e["event_type"] for e in last] == ["product.deleted"]
+
+
+@pytest.mark.asyncio
+async def test_failed_write_leaves_no_event(client):
+    await client.post("/orders/", json={"customer_name": "X", "items": [{"product_id": 999999, "quantity": 1}]})
+    assert (await _changes(client))["events"] == []
+
+
+@pytest.mark.asyncio
+async def test_long_poll_wakes_on_commit(client):
+    waiting = asyncio.create_task(client.get("/changes", params={"since": 0, "wait": 10}))
+    await asyncio.sleep(0.2)
+    assert not waiting.done()
+
+    await client.post("/products/", json={"name": "Разбудить", "price": 1.0, "quantity": 1})
+    resp = await asyncio.wait_for(waiting, timeout=2)
+    assert [e["event_type"] for e in resp.json()["events"]] == ["product.created"]
+
+
+@pytest.mark.asyncio
+async def test_relay_publishes_once_to_webhook(client, session_factory):
+    await client.post("/products/", json={"name": "Вебхук", "price": 1.0, "quantity": 1})
+    await client.post("/products/", json={"name": "Вебхук 2", "price": 1.0, "quantity": 1})
+
+    stub = WebhookStub(fail=True).start()
+    try:
+        sink = WebhookSink(stub.url, timeout=2)
+        # Получатель недоступен — события остаются неотправленными
+        with pytest.raises(Exception):
+            await relay_once(session_factory, sink)
+
+        stub.fail = False
+        assert await relay_once(session_factory, sink) == 2
+        assert await relay_once(session_factory, sink) == 0
+    finally:
+        stub.stop()
+
+    assert [e["payload"]["name"] for e in stub.events] == ["Вебхук", "Вебхук 2"]
+    async with session_factory() as db:
+        assert await db.scalar(text("SELECT count(*) FROM outbox_events WHERE published_at IS NULL")) == 0
+
+
+@pytest.mark.asyncio
+async def test_relay_to_file(client, session_factory, tmp_path):
+    await client.post("/products/", json={"name": "В файл", "price": 1.0, "quantity": 1})
+    path = tmp_path / "outbox.ndjson"
+    assert await relay_once(session_factory, FileSink(str(path))) == 1
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert lines[0]["event_type"] == "product.created"
@@ -0,0 +1,27 @@
+from app.core.config import DatabaseSettings
+
+
+def test_database_settings_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "25")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "5")
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS", "3000")
+    monkeypatch.setenv("DB_PREPARE_THRESHOLD", "")
+
+    settings = DatabaseSettings.from_env()
+    options = settings.engine_options()
+
+    assert options["pool_size"] == 25
+    assert options["max_overflow"] == 5
+    assert options["connect_args"]["options"] == "-c statement_timeout=3000"
+    assert options["connect_args"]["prepare_threshold"] is None
+
+
+def test_pgbouncer_mode_disables_prepared_statements(monkeypatch):
+    monkeypatch.setenv("DB_PGBOUNCER", "true")
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS", "3000")
+
+    options = DatabaseSettings.from_env().engine_options()
+
+    assert options["connect_args"]["prepare_threshold"] is None
+    # PgBouncer не пропускает startup-параметр options
+    assert "options" not in options["connect_args"]
@@ -0,0 +1,107 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.crud import idempotency
+from app.crud import order as order_crud
+from app.jobs.idempotency_cleanup import purge_expired_keys
+
+
+async def _product_quantity(client, product_id: int) -> int:
+    return (await client.get(f"/products/{product_id}")).json()["quantity"]
+
+
+@pytest.mark.asyncio
+async def test_create_product_replay_does_not_add_quantity_twice(client):
+    payload = {"name": "Идемпотентный", "price": 10.0, "quantity": 5}
+    headers = {"Idempotency-Key": "product-1"}
+
+    first = await client.post("/products/", json=payload, headers=headers)
+    second = await client.post("/products/", json=payload, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert await _product_quantity(client, first.json()["id"]) == 5
+
+    # Без ключа upsert по-прежнему прибавляет количество
+    await client.post("/products/", json=payload)
+    assert await _product_quantity(client, first.json()["id"]) == 10
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicate_orders_create_one_order(client):
+    product = (await client.post("/products/", json={"name": "Под ретраи", "price": 3.0, "quantity": 100})).json()
+    payload = {"customer_name": "Балансировщик", "items": [{"product_id": product["id"], "quantity": 2}]}
+    headers = {"Idempotency-Key": "order-1"}
+
+    responses = await asyncio.gather(*[client.post("/orders/", json=payload, headers=headers) for _ in range(5)])
+
+    assert {r.status_code for r in responses} == {200}
+    assert len({r.json()["id"] for r in responses}) == 1
+    assert len((await client.get("/orders/")).json()) == 1
+    assert await _product_quantity(client, product["id"]) == 98
+
+
+@pytest.mark.asyncio
+async def test_key_reused_with_different_body(client):
+    headers = {"Idempotency-Key": "product-2"}
+    await client.post("/products/", json={"name": "Первый", "price": 1.0, "quantity": 1}, headers=headers)
+    resp = await client.post("/products/", json={"name": "Второй", "price": 1.0, "quantity": 1}, headers=headers)
+    assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_failed_request_does_not_keep_key(client):
+    product = (await client.post("/products/", json={"name": "Мало", "price": 1.0, "quantity": 1})).json()
+    payload = {"customer_name": "Клиент", "items": [{"product_id": product["id"], "quantity": 2}]}
+    headers = {"Idempotency-Key": "order-2"}
+
+    assert (await client.post("/orders/", json=payload, headers=headers)).status_code == 400
+    # Ошибка откатила и ключ: после пополнения повтор выполняется заново
+    await client.post("/products/", json={"name": "Мало", "price": 1.0, "quantity": 5})
+    assert (await client.post("/orders/", json=payload, headers=headers)).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_crash_after_commit_still_replays(client, monkeypatch):
+    product = (await client.post("/products/", json={"name": "Сбой", "price": 1.0, "quantity": 10})).json()
+    payload = {"customer_name": "Клиент", "items": [{"product_id": product["id"], "quantity": 1}]}
+    headers = {"Idempotency-Key": "order-3"}
+
+    async def crash(*keys):
+        raise RuntimeError("процесс упал после коммита")
+
+    # Заказ уже закоммичен, но ответ клиенту не ушёл
+    monkeypatch.setattr(order_crud.product_cache, "invalidate", crash)
+    with pytest.raises(RuntimeError):
+        await client.post("/orders/", json=payload, headers=headers)
+    monkeypatch.undo()
+
+    # Повтор получает ответ, сохранённый вместе с заказом, а не 409 до истечения TTL
+    resp = await client.post("/orders/", json=payload, headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["Idempotent-Replayed"] == "true"
+    assert len((await client.get("/orders/")).json()) == 1
+    assert await _product_quantity(client, product["id"]) == 9
+
+
+@pytest.mark.asyncio
+async def test_purge_expired_keys(client, monkeypatch):
+    engine = create_async_engine(os.environ["TEST_DATABASE_URL"])
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await client.post("/products/", json={"name": "Старый", "price": 1.0, "quantity": 1}, headers={"Idempotency-Key": "old"})
+    await client.post("/products/", json={"name": "Свежий", "price": 1.0, "quantity": 1}, headers={"Idempotency-Key": "new"})
+    async with engine.begin() as conn:
+        await conn.execute(text("UPDATE idempotency_keys SET created_at = now() - interval '2 days' WHERE key = 'old'"))
+
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_TTL", 3600)
+    assert await purge_expired_keys(session_factory) == 1
+    async with engine.connect() as conn:
+        keys = (await conn.execute(text("SELECT key FROM idempotency_keys"))).scalars().all()
+    assert keys == ["new"]
+    await engine.dispose()
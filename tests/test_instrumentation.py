@@ -0,0 +1,72 @@
+import logging
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.instrumentation import capture_queries, instrument
+
+
+def _timing(resp):
+    # db;dur=1.23;desc="4 statements, 2 rows", app;dur=5.67
+    db, app = resp.headers["server-timing"].rsplit(", ", 1)
+    assert app.startswith("app;dur=")
+    return db
+
+
+@pytest.mark.asyncio
+async def test_server_timing_and_trace_id(client):
+    resp = await client.post("/products/", json={"name": "Тайминг", "price": 1.0, "quantity": 5})
+    assert resp.status_code == 200
+    assert _timing(resp).startswith("db;dur=")
+    assert "statements" in _timing(resp)
+    assert resp.headers["x-trace-id"]
+
+    resp = await client.get("/products/list", headers={"X-Trace-Id": "abc-123"})
+    assert resp.headers["x-trace-id"] == "abc-123"
+
+    # Некорректный trace id не пробрасывается в заголовок и логи
+    resp = await client.get("/products/list", headers={"X-Trace-Id": "bad id\n"})
+    assert resp.headers["x-trace-id"] != "bad id\n"
+
+
+@pytest.mark.asyncio
+async def test_order_endpoints_query_budget(client, assert_max_queries):
+    products = [
+        (await client.post("/products/", json={"name": f"Бюджет {i}", "price": 1.0, "quantity": 100})).json()["id"]
+        for i in range(20)
+    ]
+
+    # Число операторов не растёт с числом позиций: никаких запросов на каждую позицию
+    for lines in (1, 20):
+        with assert_max_queries(8):
+            resp = await client.post("/orders/", json={
+                "customer_name": "Бюджет",
+                "items": [{"product_id": products[i], "quantity": 1} for i in range(lines)],
+            })
+        assert resp.status_code == 200
+
+    with assert_max_queries(3):
+        assert (await client.get("/orders/")).status_code == 200
+    with assert_max_queries(3):
+        assert (await client.get("/products/list")).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_slow_query_logged_with_plan(caplog):
+    engine = create_async_engine(os.environ["TEST_DATABASE_URL"])
+    instrument(engine.sync_engine, slow_query_ms=1)
+    try:
+        with caplog.at_level(logging.WARNING, logger="app.core.instrumentation"):
+            with capture_queries("slow-trace") as stats:
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT pg_sleep(0.01), CAST(:x AS int)"), {"x": 1})
+    finally:
+        await engine.dispose()
+
+    # EXPLAIN не попадает в счётчики запроса
+    assert stats.statements == 1
+    record = next(r for r in caplog.records if "Slow query" in r.getMessage())
+    assert "[slow-trace]" in record.getMessage()
+    assert "Result" in record.getMessage()
@@ -0,0 +1,80 @@
+import json
+import logging
+import logging.handlers
+
+import pytest
+
+from app.core import logging as app_logging
+from app.core.instrumentation import capture_queries
+from app.core.logging import JsonFormatter, RateLimitFilter, TraceIdFilter
+
+
+def _record(msg="line %d", *args):
+    return logging.LogRecord("app.items", logging.INFO, __file__, 1, msg, args or (1,), None)
+
+
+def test_rate_limit_filter_drops_and_reports(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(app_logging.time, "monotonic", lambda: now[0])
+    limiter = RateLimitFilter(rate=10, burst=2)
+
+    passed = [limiter.filter(_record()) for _ in range(5)]
+    assert passed == [True, True, False, False, False]
+
+    now[0] += 0.15  # накопился один токен
+    record = _record()
+    assert limiter.filter(record)
+    assert record.getMessage() == "line 1 (+3 similar suppressed)"
+
+
+def test_json_formatter_includes_trace_id():
+    record = _record("reserved %d", 3)
+    with capture_queries("trace-42"):
+        TraceIdFilter().filter(record)
+    payload = json.loads(JsonFormatter().format(record))
+    assert payload["trace_id"] == "trace-42"
+    assert payload["message"] == "reserved 3"
+    assert payload["level"] == "INFO"
+
+
+@pytest.fixture
+def isolated_logging():
+    # Приложение уже поставило свой конвейер при импорте — снимаем и возвращаем после теста
+    app_logging.shutdown_logging()
+    yield
+    app_logging.shutdown_logging()
+    app_logging.setup_logging()
+
+
+def test_queue_pipeline_writes_json_and_rotates(tmp_path, monkeypatch, isolated_logging):
+    log_file = tmp_path / "app.log"
+    monkeypatch.setenv("LOG_FILE", str(log_file))
+    monkeypatch.setenv("LOG_FORMAT", "json")
+    monkeypatch.setenv("LOG_MAX_BYTES", "2000")
+    monkeypatch.setenv("LOG_BACKUP_COUNT", "2")
+    app_logging.setup_logging()
+
+    logger = logging.getLogger("app.test")
+    with capture_queries("rotating"):
+        for i in range(100):
+            logger.info("message %d", i)
+    app_logging.shutdown_logging()
+
+    lines = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+    assert lines[-1]["message"] == "message 99"
+    assert lines[-1]["trace_id"] == "rotating"
+    assert (tmp_path / "app.log.1").exists()
+    assert not (tmp_path / "app.log.3").exists()
+
+
+@pytest.mark.parametrize("max_bytes, worker", [("10485760", True), ("0", False)])
+def test_external_rotation_shares_one_file(tmp_path, monkeypatch, isolated_logging, max_bytes, worker):
+    monkeypatch.setenv("LOG_FILE", str(tmp_path / "app.log"))
+    monkeypatch.setenv("LOG_MAX_BYTES", max_bytes)
+    monkeypatch.setattr(app_logging.multiprocessing, "parent_process", lambda: object() if worker else None)
+    listener = app_logging.setup_logging()
+
+    # Ротирует logrotate — все воркеры пишут в один файл и переоткрывают его после переименования
+    file_handler = listener.handlers[0]
+    assert isinstance(file_handler, logging.handlers.WatchedFileHandler)
+    assert file_handler.baseFilename == str(tmp_path / "app.log")
@@ -0,0 +1,52 @@
+import json
+import os
+
+import pytest
+
+from app.core import prometheus
+from app.core.metrics import RequestMetrics
+
+
+def _sample(text, line_prefix):
+    return [line for line in text.splitlines() if line.startswith(line_prefix)]
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_routes_and_gauges(client):
+    product = (await client.post("/products/", json={"name": "Метрики", "price": 1.0, "quantity": 1})).json()
+    await client.get(f"/products/{product['id']}")
+    await client.get("/products/999999999")
+    await client.get("/no-such-path")
+
+    resp = await client.get("/system/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = resp.text
+
+    assert _sample(text, 'warehouse_http_requests_total{method="GET",route="/products/{product_id:int}",status="200"}')
+    assert _sample(text, 'warehouse_http_requests_total{method="GET",route="/products/{product_id:int}",status="404"}')
+    assert _sample(text, 'warehouse_http_requests_total{method="GET",route="unmatched",status="404"}')
+    assert _sample(text, 'warehouse_http_request_duration_seconds_bucket{method="POST",route="/products/",le="+Inf"}')
+    # Запрос к /system/metrics ещё в работе, пока собирается ответ
+    assert _sample(text, "warehouse_http_requests_in_flight 1")
+    for name in ("db_pool_size", "db_pool_checked_out", "event_loop_lag_seconds_count", "db_pool_checkout_wait_seconds_sum"):
+        assert _sample(text, f"warehouse_{name}")
+
+
+def test_multiprocess_snapshots_are_merged(tmp_path, monkeypatch):
+    metrics = RequestMetrics()
+    metrics.observe("GET", "/orders/", 200, 0.01)
+    monkeypatch.setattr(prometheus, "http_metrics", metrics)
+
+    # Второй живой воркер (родительский процесс) и умерший воркер
+    other = prometheus.local_snapshot()
+    (tmp_path / f"{os.getppid()}.json").write_text(json.dumps(other))
+    dead = tmp_path / "999999999.json"
+    dead.write_text(json.dumps(other))
+
+    text = prometheus.render(prometheus.collect(str(tmp_path)))
+
+    assert 'warehouse_http_requests_total{method="GET",route="/orders/",status="200"} 2' in text
+    assert 'warehouse_http_request_duration_seconds_count{method="GET",route="/orders/"} 2' in text
+    assert not dead.exists()
+    assert (tmp_path / f"{os.getpid()}.json").exists()
@@ -0,0 +1,140 @@
+import os
+from datetime import date, datetime, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.crud import archive
+from app.jobs.analytics_rollup import rebuild_rollups
+from app.jobs.order_archive import archive_orders, ensure_partitions
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine(os.environ["TEST_DATABASE_URL"])
+    yield sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _order(client, product_id, quantity):
+    resp = await client.post("/orders/", json={
+        "customer_name": "Давний покупатель", "items": [{"product_id": product_id, "quantity": quantity}],
+    })
+    assert resp.status_code == 200
+    return resp.json()["id"]
+
+
+async def _move_to(session_factory, order_ids, month: date):
+    """
+    Переносит заказы в секцию месяца month: позиции переезжают следом (ON UPDATE CASCADE).
+    """
+    async with session_factory() as db:
+        await archive.create_month_partitions(db, month)
+        await db.execute(
+            text("UPDATE orders SET created_at = :at WHERE id = ANY(:ids)"),
+            {"at": archive.month_range(month)[0].replace(day=15), "ids": order_ids},
+        )
+        await db.commit()
+
+
+async def _parent(session_factory, name):
+    async with session_factory() as db:
+        return await db.scalar(text(
+            "SELECT p.relname FROM pg_inherits i JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE i.inhrelid = CAST(:name AS regclass)"
+        ), {"name": name})
+
+
+@pytest.mark.asyncio
+async def test_old_month_moves_to_archive(client, session_factory):
+    product = (await client.post("/products/", json={"name": "Архивный товар", "price": 2.5, "quantity": 100})).json()["id"]
+    delivered = await _order(client, product, 2)
+    cancelled = await _order(client, product, 3)
+    await client.patch(f"/orders/{delivered}/status", json={"status": "доставлен"})
+    await client.patch(f"/orders/{cancelled}/status", json={"status": "отменен"})
+    await _move_to(session_factory, [delivered, cancelled], date(2025, 1, 1))
+    await rebuild_rollups(session_factory)
+    before = [(await client.get(f"/orders/{order_id}")).json() for order_id in (delivered, cancelled)]
+    sales = (await client.get("/analytics/sales/daily", params={"date_from": "2025-01-01", "date_to": "2025-01-31"})).json()
+
+    # Другие тесты могли оставить пустые старые секции — они уходят в архив с нулём
+    assert (await archive_orders(session_factory, after_days=30))["orders_p2025_01"] == 2
+
+    assert await _parent(session_factory, "orders_p2025_01") == "orders_archive"
+    assert await _parent(session_factory, "order_items_p2025_01") == "order_items_archive"
+    # В архиве остаются только первичные ключи и индекс позиций по order_id
+    async with session_factory() as db:
+        indexes = (await db.execute(text(
+            "SELECT tablename, count(*) FROM pg_indexes WHERE tablename IN ('orders_p2025_01', 'order_items_p2025_01') "
+            "GROUP BY tablename ORDER BY tablename"
+        ))).all()
+    assert indexes == [("order_items_p2025_01", 2), ("orders_p2025_01", 1)]
+    # Заказ читается как раньше, но из архива; в живом списке его нет
+    assert [(await client.get(f"/orders/{order_id}")).json() for order_id in (delivered, cancelled)] == before
+    assert (await client.get("/orders/", params={"customer_name": "Давний покупатель"})).json() == []
+    resp = await client.patch(f"/orders/{delivered}/status", json={"status": "отправлен"})
+    assert resp.status_code == 400
+    assert (await client.delete(f"/orders/{cancelled}")).status_code == 400
+
+    # Пересчёт аналитики учитывает архивные заказы
+    await rebuild_rollups(session_factory)
+    assert (await client.get("/analytics/sales/daily", params={"date_from": "2025-01-01", "date_to": "2025-01-31"})).json() == sales
+    assert sales[0]["units"] == 2
+
+
+@pytest.mark.asyncio
+async def test_month_with_open_orders_stays_live(client, session_factory):
+    product = (await client.post("/products/", json={"name": "Незавершённый", "price": 1.0, "quantity": 10})).json()["id"]
+    shipped = await _order(client, product, 1)
+    await client.patch(f"/orders/{shipped}/status", json={"status": "отправлен"})
+    await _move_to(session_factory, [shipped], date(2025, 2, 1))
+
+    assert "orders_p2025_02" not in await archive_orders(session_factory, after_days=30)
+    assert await _parent(session_factory, "orders_p2025_02") == "orders"
+    assert (await client.get(f"/orders/{shipped}")).json()["status"] == "shipped"
+
+
+@pytest.mark.asyncio
+async def test_partitions_created_ahead(client, session_factory):
+    await ensure_partitions(session_factory)
+    async with session_factory() as db:
+        months = await archive.live_months(db)
+    current = archive.month_start(datetime.now(timezone.utc).date())
+    assert current in months and archive.next_month(current) in months
+
+    product = (await client.post("/products/", json={"name": "Свежий", "price": 1.0, "quantity": 10})).json()["id"]
+    order_id = await _order(client, product, 1)
+    async with session_factory() as db:
+        partitions = (await db.execute(text(
+            "SELECT o.tableoid::regclass::text, i.tableoid::regclass::text "
+            "FROM orders o JOIN order_items i ON i.order_id = o.id WHERE o.id = :id"
+        ), {"id": order_id})).one()
+    assert partitions == (f"orders_p{current:%Y_%m}", f"order_items_p{current:%Y_%m}")
+
+
+@pytest.mark.asyncio
+async def test_maintenance_runs_in_one_worker_at_a_time(client, session_factory):
+    product = (await client.post("/products/", json={"name": "Спорный месяц", "price": 1.0, "quantity": 10})).json()["id"]
+    delivered = await _order(client, product, 1)
+    await client.patch(f"/orders/{delivered}/status", json={"status": "доставлен"})
+    await _move_to(session_factory, [delivered], date(2025, 3, 1))
+    async with session_factory() as db:
+        months = await archive.live_months(db)
+
+    # Другой воркер держит блокировку обслуживания — этот ничего не трогает
+    async with session_factory() as other:
+        await other.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": archive.ORDER_ARCHIVE_LOCK})
+        assert "orders_p2025_03" not in await archive_orders(session_factory, after_days=30)
+        assert await ensure_partitions(session_factory) == []
+        await other.rollback()
+    assert await _parent(session_factory, "orders_p2025_03") == "orders"
+
+    assert (await archive_orders(session_factory, after_days=30))["orders_p2025_03"] == 1
+    # Воркер со списком месяцев, прочитанным до чужого архивирования, пропускает месяц без ошибки
+    assert date(2025, 3, 1) in months
+    async with session_factory() as db:
+        assert await archive.archive_month(db, date(2025, 3, 1), 1000) is None
+    assert await _parent(session_factory, "orders_p2025_03") == "orders_archive"
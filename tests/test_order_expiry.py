@@ -0,0 +1,75 @@
+import asyncio
+import os
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.jobs import order_expiry
+from app.jobs.order_expiry import expire_reservations
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine(os.environ["TEST_DATABASE_URL"])
+    yield sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _order(client, product_id, quantity=1):
+    resp = await client.post("/orders/", json={
+        "customer_name": "Забытая корзина", "items": [{"product_id": product_id, "quantity": quantity}],
+    })
+    assert resp.status_code == 200
+    return resp.json()["id"]
+
+
+async def _age(session_factory, order_ids, seconds):
+    async with session_factory() as db:
+        await db.execute(
+            text("UPDATE orders SET created_at = now() - make_interval(secs => :s) WHERE id = ANY(:ids)"),
+            {"s": seconds, "ids": order_ids},
+        )
+        await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_expire_old_pending_orders(client, session_factory):
+    product = (await client.post("/products/", json={"name": "Резерв", "price": 1.0, "quantity": 10})).json()
+    old = await _order(client, product["id"], 3)
+    shipped = await _order(client, product["id"], 2)
+    fresh = await _order(client, product["id"], 1)
+    await client.patch(f"/orders/{shipped}/status", json={"status": "отправлен"})
+    await _age(session_factory, [old, shipped], 3600)
+
+    assert await expire_reservations(session_factory, ttl=60) == 1
+
+    assert (await client.get(f"/orders/{old}")).json()["status"] == "cancelled"
+    assert (await client.get(f"/orders/{shipped}")).json()["status"] == "shipped"
+    assert (await client.get(f"/orders/{fresh}")).json()["status"] == "pending"
+    assert (await client.get(f"/products/{product['id']}")).json()["quantity"] == 7
+    assert await expire_reservations(session_factory, ttl=60) == 0
+
+    stats = (await client.get("/system/order-expiry")).json()
+    assert stats["run_seconds"]["count"] >= 2
+    assert stats["expired_per_run"]["sum"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_parallel_expiry_does_not_double_cancel(client, session_factory, monkeypatch):
+    monkeypatch.setattr(order_expiry, "ORDER_EXPIRY_BATCH", 3)
+    product = (await client.post("/products/", json={"name": "Резерв параллельно", "price": 1.0, "quantity": 100})).json()
+    orders = [await _order(client, product["id"], 2) for _ in range(20)]
+    await _age(session_factory, orders, 3600)
+
+    results = await asyncio.gather(*[expire_reservations(session_factory, ttl=60) for _ in range(4)])
+    # Воркер, которому досталась неполная пачка, останавливается — хвост добирает следующий запуск
+    results.append(await expire_reservations(session_factory, ttl=60))
+
+    assert sum(results) == 20
+    assert (await client.get(f"/products/{product['id']}")).json()["quantity"] == 100
+    async with session_factory() as db:
+        events = await db.scalar(text("SELECT count(*) FROM outbox_events WHERE event_type = 'order.status_changed'"))
+    assert events == 20
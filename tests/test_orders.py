@@ -1,3 +1,5 @@
+import json
+import asyncio
 import pytest
 
 @pytest.mark.asyncio
@@ -169,3 +171,338 @@ async def test_order_with_empty_items(client):
     }
     response = await client.post("/orders/", json=payload)
     assert response.status_code in [400, 422]
+
+
+@pytest.mark.asyncio
+async def test_create_order_merges_duplicate_lines(client):
+    product_response = await client.post("/products/", json={
+        "name": "Дублирующийся продукт",
+        "price": 10.0,
+        "quantity": 5
+    })
+    product_id = product_response.json()["id"]
+
+    payload = {
+        "customer_name": "Дубли",
+        "items": [
+            {"product_id": product_id, "quantity": 2},
+            {"product_id": product_id, "quantity": 3},
+        ]
+    }
+    response = await client.post("/orders/", json=payload)
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 2
+
+    product = (await client.get(f"/products/{product_id}")).json()
+    assert product["quantity"] == 0
+
+    # Суммарно позиций больше, чем на складе — заказ целиком отклоняется
+    response = await client.post("/orders/", json=payload)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_create_order_is_atomic_on_shortage(client):
+    first = (await client.post("/products/", json={
+        "name": "Хватает",
+        "price": 10.0,
+        "quantity": 10
+    })).json()
+    second = (await client.post("/products/", json={
+        "name": "Не хватает",
+        "price": 20.0,
+        "quantity": 1
+    })).json()
+
+    payload = {
+        "customer_name": "Атомарность",
+        "items": [
+            {"product_id": first["id"], "quantity": 3},
+            {"product_id": second["id"], "quantity": 2},
+        ]
+    }
+    response = await client.post("/orders/", json=payload)
+    assert response.status_code == 400
+    assert "Не хватает" in response.json()["detail"]
+
+    # Первый товар не должен быть списан
+    product = (await client.get(f"/products/{first['id']}")).json()
+    assert product["quantity"] == 10
+
+    orders = (await client.get("/orders/")).json()
+    assert orders == []
+
+
+@pytest.mark.asyncio
+async def test_create_order_unknown_product(client):
+    payload = {
+        "customer_name": "Призрак",
+        "items": [{"product_id": 999999, "quantity": 1}]
+    }
+    response = await client.post("/orders/", json=payload)
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_parallel_orders_do_not_oversell(client):
+    product = (await client.post("/products/", json={
+        "name": "Горячий товар",
+        "price": 5.0,
+        "quantity": 5
+    })).json()
+
+    payload = {
+        "customer_name": "Гонка",
+        "items": [{"product_id": product["id"], "quantity": 1}]
+    }
+    responses = await asyncio.gather(*[client.post("/orders/", json=payload) for _ in range(10)])
+
+    assert sum(r.status_code == 200 for r in responses) == 5
+    assert all(r.status_code in (200, 400) for r in responses)
+
+    left = (await client.get(f"/products/{product['id']}")).json()
+    assert left["quantity"] == 0
+
+
+async def _make_orders(client, names: list[str]) -> list[int]:
+    product = (await client.post("/products/", json={
+        "name": "Товар для списка заказов", "price": 1.0, "quantity": 100
+    })).json()
+    ids = []
+    for name in names:
+        resp = await client.post("/orders/", json={
+            "customer_name": name, "items": [{"product_id": product["id"], "quantity": 1}]
+        })
+        ids.append(resp.json()["id"])
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_list_orders_keyset_pagination(client):
+    ids = await _make_orders(client, ["a", "b", "c", "d", "e"])
+
+    seen, params = [], {"limit": 2}
+    while True:
+        resp = await client.get("/orders/", params=params)
+        assert resp.status_code == 200
+        seen.extend(o["id"] for o in resp.json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {"limit": 2, "cursor": cursor}
+
+    assert seen == ids
+
+
+@pytest.mark.asyncio
+async def test_list_orders_filters(client):
+    ids = await _make_orders(client, ["Иван", "Пётр", "Иван"])
+    await client.patch(f"/orders/{ids[0]}/status", json={"status": "отменен"})
+
+    by_name = (await client.get("/orders/", params={"customer_name": "Иван"})).json()
+    assert [o["id"] for o in by_name] == [ids[0], ids[2]]
+
+    cancelled = (await client.get("/orders/", params={"status": "cancelled"})).json()
+    assert [o["id"] for o in cancelled] == [ids[0]]
+
+    future = (await client.get("/orders/", params={"created_from": "2999-01-01T00:00:00Z"})).json()
+    assert future == []
+
+    resp = await client.get("/orders/", params={"status": "unknown"})
+    assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_export_orders_ndjson(client):
+    ids = await _make_orders(client, ["x", "y", "x"])
+
+    resp = await client.get("/orders/export", params={"customer_name": "x"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r["id"] for r in rows] == [ids[0], ids[2]]
+    assert all(len(r["items"]) == 1 for r in rows)
+
+
+@pytest.mark.asyncio
+async def test_list_orders_matches_order_read(client):
+    # Быстрый путь списка отдаёт ровно то же, что OrderRead по одному заказу
+    p1 = (await client.post("/products/", json={"name": "Сериализация 1", "price": 10.0, "quantity": 10})).json()
+    p2 = (await client.post("/products/", json={"name": "Сериализация 2", "price": 20.0, "quantity": 10})).json()
+    await client.post("/orders/", json={"customer_name": "Пустая страница", "items": [{"product_id": p1["id"], "quantity": 1}]})
+    created = (await client.post("/orders/", json={
+        "customer_name": "Сериализация",
+        "items": [{"product_id": p1["id"], "quantity": 1}, {"product_id": p2["id"], "quantity": 2}],
+    })).json()
+
+    listed = (await client.get("/orders/", params={"customer_name": "Сериализация"})).json()
+    single = (await client.get(f"/orders/{created['id']}")).json()
+    assert listed == [single]
+
+
+@pytest.mark.asyncio
+async def test_bulk_cancel_customer_pending_orders(client):
+    p1 = (await client.post("/products/", json={"name": "Массовая отмена 1", "price": 10.0, "quantity": 10})).json()
+    p2 = (await client.post("/products/", json={"name": "Массовая отмена 2", "price": 20.0, "quantity": 10})).json()
+
+    async def order(customer, items):
+        resp = await client.post("/orders/", json={"customer_name": customer, "items": items})
+        assert resp.status_code == 200
+        return resp.json()["id"]
+
+    first = await order("Отменяет всё", [{"product_id": p1["id"], "quantity": 2}, {"product_id": p2["id"], "quantity": 1}])
+    second = await order("Отменяет всё", [{"product_id": p1["id"], "quantity": 3}])
+    shipped = await order("Отменяет всё", [{"product_id": p2["id"], "quantity": 4}])
+    other = await order("Другой покупатель", [{"product_id": p1["id"], "quantity": 1}])
+    await client.patch(f"/orders/{shipped}/status", json={"status": "отправлен"})
+
+    resp = await client.post("/orders/cancel", json={"customer_name": "Отменяет всё", "status": "pending"})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["cancelled"] == 2
+    assert [o["id"] for o in data["orders"]] == [first, second]
+    assert all(o["status"] == "cancelled" for o in data["orders"])
+    assert [len(o["items"]) for o in data["orders"]] == [2, 1]
+
+    assert (await client.get(f"/products/{p1['id']}")).json()["quantity"] == 9
+    assert (await client.get(f"/products/{p2['id']}")).json()["quantity"] == 6
+    assert (await client.get(f"/orders/{shipped}")).json()["status"] == "shipped"
+    assert (await client.get(f"/orders/{other}")).json()["status"] == "pending"
+
+    # Повторная отмена ничего не возвращает на склад
+    again = (await client.post("/orders/cancel", json={"order_ids": [first, second]})).json()
+    assert again == {"cancelled": 0, "orders": []}
+    assert (await client.get(f"/products/{p1['id']}")).json()["quantity"] == 9
+
+
+@pytest.mark.asyncio
+async def test_bulk_cancel_requires_target(client):
+    resp = await client.post("/orders/cancel", json={"status": "pending"})
+    assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_cancel_round_trips_do_not_grow_with_lines(client):
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    products = [
+        (await client.post("/products/", json={"name": f"Много позиций {i}", "price": 1.0, "quantity": 100})).json()["id"]
+        for i in range(20)
+    ]
+    small = (await client.post("/orders/", json={
+        "customer_name": "Мало позиций", "items": [{"product_id": products[0], "quantity": 1}],
+    })).json()["id"]
+    large = (await client.post("/orders/", json={
+        "customer_name": "Много позиций",
+        "items": [{"product_id": products[i % 20], "quantity": 1} for i in range(500)],
+    })).json()["id"]
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", count)
+    try:
+        assert (await client.patch(f"/orders/{small}/status", json={"status": "отменен"})).status_code == 200
+        small_count = len(statements)
+        statements.clear()
+        resp = await client.patch(f"/orders/{large}/status", json={"status": "отменен"})
+    finally:
+        event.remove(Engine, "before_cursor_execute", count)
+
+    assert resp.status_code == 200
+    assert len(resp.json()["items"]) == 500
+    assert len(statements) == small_count
+    assert (await client.get(f"/products/{products[0]}")).json()["quantity"] == 100
+
+
+@pytest.mark.asyncio
+async def test_batch_orders_partial_failure(client):
+    p1 = (await client.post("/products/", json={"name": "Пакет 1", "price": 10.0, "quantity": 5})).json()
+    p2 = (await client.post("/products/", json={"name": "Пакет 2", "price": 2.5, "quantity": 100})).json()
+
+    batch = [
+        {"customer_name": "Маркетплейс", "items": [{"product_id": p1["id"], "quantity": 3}, {"product_id": p2["id"], "quantity": 2}]},
+        # Остатка p1 после первого заказа не хватает — отклоняется целиком, p2 не списывается
+        {"customer_name": "Маркетплейс", "items": [{"product_id": p1["id"], "quantity": 3}, {"product_id": p2["id"], "quantity": 10}]},
+        {"customer_name": "Маркетплейс", "items": [{"product_id": p1["id"], "quantity": 1}, {"product_id": p1["id"], "quantity": 1}]},
+        {"customer_name": "Маркетплейс", "items": [{"product_id": 999999, "quantity": 1}]},
+        {"customer_name": "Маркетплейс", "items": []},
+        {"customer_name": "Маркетплейс"},
+    ]
+    resp = await client.post("/orders/batch", json=batch)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert (data["created"], data["rejected"]) == (2, 4)
+    assert [r["status"] for r in data["rows"]] == ["created", "rejected", "created", "rejected", "rejected", "rejected"]
+    assert data["rows"][0]["total_price"] == 35.0
+    assert data["rows"][1]["error"] == "Not enough stock for product Пакет 1"
+    assert data["rows"][3]["error"] == "Product ID 999999 not found"
+    assert data["rows"][4]["error"] == "Order must contain at least one item"
+    assert data["rows"][5]["error"].startswith("items:")
+
+    first = (await client.get(f"/orders/{data['rows'][0]['id']}")).json()
+    assert first["status"] == "pending"
+    assert sorted((i["product_id"], i["quantity"]) for i in first["items"]) == [(p1["id"], 3), (p2["id"], 2)]
+    assert len((await client.get(f"/orders/{data['rows'][2]['id']}")).json()["items"]) == 2
+    assert (await client.get(f"/products/{p1['id']}")).json()["quantity"] == 0
+    assert (await client.get(f"/products/{p2['id']}")).json()["quantity"] == 98
+
+
+@pytest.mark.asyncio
+async def test_batch_orders_rejects_bad_body(client):
+    assert (await client.post("/orders/batch", json={"customer_name": "x"})).status_code == 400
+    too_many = [{"customer_name": "x", "items": []}] * 1001
+    assert (await client.post("/orders/batch", json=too_many)).status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_batch_orders_statements_do_not_grow_with_batch(client, assert_max_queries):
+    products = [
+        (await client.post("/products/", json={"name": f"Пакет на поток {i}", "price": 1.0, "quantity": 1000})).json()["id"]
+        for i in range(10)
+    ]
+
+    def batch(n):
+        return [
+            {"customer_name": f"Поток {i}", "items": [{"product_id": products[i % 10], "quantity": 1}]}
+            for i in range(n)
+        ]
+
+    with assert_max_queries(10) as small:
+        assert (await client.post("/orders/batch", json=batch(2))).json()["created"] == 2
+    with assert_max_queries(small.statements) as large:
+        assert (await client.post("/orders/batch", json=batch(300))).json()["created"] == 300
+    assert large.statements == small.statements
+    assert (await client.get(f"/products/{products[0]}")).json()["quantity"] == 969
+
+
+@pytest.mark.asyncio
+async def test_order_lines_keep_price_at_order_time(client):
+    import os
+    from decimal import Decimal
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    product = (await client.post("/products/", json={"name": "Цена на момент заказа", "price": 0.1, "quantity": 10})).json()
+    order = (await client.post("/orders/", json={
+        "customer_name": "Копейки", "items": [{"product_id": product["id"], "quantity": 3}],
+    })).json()
+    assert order["items"][0]["unit_price"] == 0.1
+    assert order["items"][0]["line_total"] == 0.3
+
+    await client.put(f"/products/{product['id']}", json={"name": product["name"], "price": 5.0, "quantity": 7})
+    item = (await client.get(f"/orders/{order['id']}")).json()["items"][0]
+    assert (item["unit_price"], item["line_total"]) == (0.1, 0.3)
+
+    engine = create_async_engine(os.environ["TEST_DATABASE_URL"])
+    async with engine.connect() as conn:
+        total, lines = (await conn.execute(text(
+            "SELECT o.total_price, (SELECT sum(line_total) FROM order_items WHERE order_id = o.id) FROM orders o WHERE o.id = :id"
+        ), {"id": order["id"]})).one()
+    await engine.dispose()
+    # Numeric без накопления ошибки float: 3 × 0.1 ровно 0.30
+    assert total == lines == Decimal("0.30")
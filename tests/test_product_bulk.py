@@ -0,0 +1,77 @@
+# tests/test_product_bulk.py
+import json
+
+import pytest
+
+import app.crud.product as product_crud
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_bulk_json_array_inserts_updates_and_rejects(client):
+    await client.post("/products/", json={"name": "Уже есть", "price": 5.0, "quantity": 5})
+
+    payload = [
+        {"name": "Новый", "price": 1.0, "quantity": 2},
+        {"name": "Уже есть", "price": 99.0, "quantity": 3},
+        {"name": "", "price": 1.0, "quantity": 1},
+        {"name": "Новый", "price": 7.0, "quantity": 4},
+    ]
+    resp = await client.post("/products/bulk", json=payload)
+    assert resp.status_code == 200
+    data = resp.json()
+
+    assert (data["inserted"], data["updated"], data["rejected"]) == (1, 2, 1)
+    assert data["method"] == "insert"
+    assert [r["status"] for r in data["rows"]] == ["inserted", "updated", "rejected", "updated"]
+    assert data["rows"][2]["error"].startswith("name")
+
+    products = {p["name"]: p for p in (await client.get("/products/")).json()}
+    assert products["Новый"]["quantity"] == 6
+    assert products["Новый"]["price"] == 1.0      # цена от первой строки
+    assert products["Уже есть"]["quantity"] == 8
+    assert products["Уже есть"]["price"] == 5.0   # цена существующего товара не меняется
+
+
+async def test_bulk_ndjson_stream(client):
+    lines = [
+        json.dumps({"name": "A", "price": 1.0, "quantity": 1}),
+        "{broken",
+        json.dumps({"name": "B", "price": 2.0, "quantity": 2}),
+    ]
+    resp = await client.post(
+        "/products/bulk",
+        content="\n".join(lines) + "\n",
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert [r["status"] for r in data["rows"]] == ["inserted", "rejected", "inserted"]
+    assert data["rows"][1]["error"] == "invalid JSON"
+    assert data["rows_per_sec"] > 0
+
+
+@pytest.mark.parametrize("threshold,batch", [(1, 1000), (10_000, 2)])
+async def test_bulk_copy_and_batched_paths_agree(client, monkeypatch, threshold, batch):
+    monkeypatch.setattr(product_crud, "BULK_COPY_THRESHOLD", threshold)
+    monkeypatch.setattr(product_crud, "BULK_BATCH_SIZE", batch)
+    await client.post("/products/", json={"name": "p1", "price": 1.0, "quantity": 10})
+
+    payload = [
+        {"name": "p1", "price": 1.0, "quantity": 1},
+        {"name": "p2", "price": 2.0, "quantity": 2},
+        {"name": "p3", "price": 3.0, "quantity": 3},
+        {"name": "p2", "price": 2.0, "quantity": 5},
+    ]
+    data = (await client.post("/products/bulk", json=payload)).json()
+
+    assert data["method"] == ("copy" if threshold == 1 else "insert")
+    assert [r["status"] for r in data["rows"]] == ["updated", "inserted", "inserted", "updated"]
+
+    products = {p["name"]: p["quantity"] for p in (await client.get("/products/")).json()}
+    assert products == {"p1": 11, "p2": 7, "p3": 3}
+
+
+async def test_bulk_rejects_non_array_body(client):
+    resp = await client.post("/products/bulk", json={"name": "x"})
+    assert resp.status_code == 400
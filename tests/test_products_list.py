@@ -7,6 +7,8 @@ from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy import text
 
+from app.core.pagination import encode_cursor
+
 # Все тесты асинхронные
 pytestmark = pytest.mark.asyncio
 
@@ -175,3 +177,163 @@ async def test_validation_errors(client: AsyncClient, params):
     data = resp.json()
     # FastAPI вернёт подробности ошибок — убедимся, что есть detail
     assert "detail" in data and isinstance(data["detail"], list)
+
+
+# --- Keyset-пагинация через cursor ---
+
+
+async def _walk_cursor(client: AsyncClient, params: dict) -> list[dict]:
+    items: list[dict] = []
+    resp = await client.get("/products/list", params=params)
+    while True:
+        assert resp.status_code == 200
+        payload = resp.json()
+        items.extend(payload["items"])
+        if payload["next_cursor"] is None:
+            return items
+        resp = await client.get("/products/list", params={**params, "cursor": payload["next_cursor"]})
+
+
+@pytest.mark.parametrize("sort_by", ["id", "name", "price", "quantity"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+async def test_cursor_pagination_matches_offset(client: AsyncClient, sample_products, sort_by, order):
+    params = {"sort_by": sort_by, "sort_order": order}
+    full = (await client.get("/products/list", params={**params, "limit": 100})).json()["items"]
+
+    # Страницы по 2 элемента (есть дубли quantity=5) — ничего не теряем и не повторяем
+    walked = await _walk_cursor(client, {**params, "limit": 2})
+    assert [it["id"] for it in walked] == [it["id"] for it in full]
+
+
+async def test_last_page_has_no_cursor(client: AsyncClient, sample_products):
+    resp = await client.get("/products/list", params={"limit": 5})
+    assert resp.json()["next_cursor"] is None
+
+
+@pytest.mark.parametrize("cursor", ["garbage", "eyJzIjoiaWQifQ"])
+async def test_invalid_cursor(client: AsyncClient, cursor):
+    resp = await client.get("/products/list", params={"cursor": cursor})
+    assert resp.status_code == 400
+
+
+@pytest.mark.parametrize("sort_by,key", [("price", ["abc", 1]), ("id", [2**70]), ("name", [1, 1]), ("quantity", [True, 1])])
+async def test_tampered_cursor_key(client: AsyncClient, sample_products, sort_by, key):
+    cursor = encode_cursor(sort_by, "asc", key)
+    resp = await client.get("/products/list", params={"sort_by": sort_by, "cursor": cursor})
+    assert resp.status_code == 400
+
+
+async def test_cursor_bound_to_sort(client: AsyncClient, sample_products):
+    first = (await client.get("/products/list", params={"limit": 2, "sort_by": "price"})).json()
+    resp = await client.get("/products/list", params={"cursor": first["next_cursor"], "sort_by": "name"})
+    assert resp.status_code == 400
+
+
+async def test_search_cursor_pagination(client: AsyncClient, sample_products):
+    params = {"q": "a", "sort_by": "price", "sort_order": "desc", "limit": 1}
+    seen = []
+    resp = await client.get("/products/search", params=params)
+    while True:
+        payload = resp.json()
+        seen.extend(it["name"] for it in payload["items"])
+        if payload["next_cursor"] is None:
+            break
+        resp = await client.get("/products/search", params={**params, "cursor": payload["next_cursor"]})
+
+    assert seen == ["Gamma", "delta", "Omega", "Alpha", "beta"]
+
+
+# --- Режимы подсчёта total ---
+
+
+async def test_total_mode_none_reports_has_more(client: AsyncClient, sample_products):
+    resp = await client.get("/products/list", params={"limit": 2, "total_mode": "none"})
+    assert resp.status_code == 200
+    payload = resp.json()
+    assert payload["total"] is None
+    assert payload["has_more"] is True
+
+    resp = await client.get("/products/list", params={"limit": 5, "total_mode": "none"})
+    assert resp.json()["has_more"] is False
+
+
+@pytest.mark.parametrize("path,params", [
+    ("/products/list", {}),
+    ("/products/search", {"q": "a", "min_price": 10}),
+])
+async def test_total_mode_estimate(client: AsyncClient, sample_products, db_engine, path, params):
+    async with db_engine.begin() as conn:
+        await conn.execute(text("ANALYZE products"))
+
+    resp = await client.get(path, params={**params, "total_mode": "estimate"})
+    assert resp.status_code == 200
+    total = resp.json()["total"]
+    assert isinstance(total, int) and total >= 0
+
+
+async def test_exact_total_is_cached_and_invalidated(client: AsyncClient, sample_products, db_engine):
+    assert (await client.get("/products/list")).json()["total"] == 5
+
+    # Вставка мимо API не сбрасывает кэш — total берётся из кэша
+    await insert_products(db_engine, [{"name": "Hidden", "price": 1.0, "quantity": 1}])
+    assert (await client.get("/products/list")).json()["total"] == 5
+
+    # Запись через API сбрасывает кэш
+    await client.post("/products/", json={"name": "Visible", "price": 1.0, "quantity": 1})
+    assert (await client.get("/products/list")).json()["total"] == 7
+
+
+# --- Режимы поиска ---
+
+
+@pytest.fixture
+async def catalog(db_engine):
+    rows = [
+        {"name": "Носки шерстяные", "description": "Тёплые зимние носки", "price": 300.0, "quantity": 10},
+        {"name": "Шапка", "description": "Шерстяная шапка к носкам", "price": 500.0, "quantity": 3},
+        {"name": "Перчатки", "description": "Кожаные", "price": 900.0, "quantity": 1},
+        {"name": "100%_cotton", "description": None, "price": 50.0, "quantity": 1},
+    ]
+    return await insert_products(db_engine, rows)
+
+
+async def test_search_prefix_match(client: AsyncClient, catalog):
+    resp = await client.get("/products/search", params={"q": "нос", "match": "prefix"})
+    assert resp.status_code == 200
+    assert [it["name"] for it in resp.json()["items"]] == ["Носки шерстяные"]
+
+
+async def test_search_substring_escapes_wildcards(client: AsyncClient, catalog):
+    resp = await client.get("/products/search", params={"q": "%_"})
+    assert [it["name"] for it in resp.json()["items"]] == ["100%_cotton"]
+
+
+async def test_search_fulltext_ranked(client: AsyncClient, catalog):
+    resp = await client.get("/products/search", params={
+        "q": "носки", "match": "fulltext", "sort_by": "relevance", "sort_order": "desc",
+    })
+    assert resp.status_code == 200
+    payload = resp.json()
+    # Стемминг находит и «носки», и «носкам» в описании; точное совпадение в name + description выше
+    assert [it["name"] for it in payload["items"]] == ["Носки шерстяные", "Шапка"]
+    assert payload["total"] == 2
+
+
+async def test_search_relevance_cursor(client: AsyncClient, catalog):
+    params = {"q": "носки", "match": "fulltext", "sort_by": "relevance", "sort_order": "desc", "limit": 1}
+    first = (await client.get("/products/search", params=params)).json()
+    second = (await client.get("/products/search", params={**params, "cursor": first["next_cursor"]})).json()
+    assert [it["name"] for it in first["items"] + second["items"]] == ["Носки шерстяные", "Шапка"]
+    assert second["next_cursor"] is None
+
+
+async def test_relevance_requires_query(client: AsyncClient):
+    resp = await client.get("/products/list", params={"sort_by": "relevance"})
+    assert resp.status_code == 400
+
+
+async def test_list_items_match_product_read(client: AsyncClient):
+    created = (await client.post("/products/", json={"name": "Карточка", "description": "ё", "price": 12.5, "quantity": 3})).json()
+    page = (await client.get("/products/list")).json()
+    assert page["items"] == [created]
+    assert page["next_cursor"] is None
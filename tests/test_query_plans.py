@@ -0,0 +1,108 @@
+import os
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.query_plans import capture_statements, large_tables, seq_scans
+from app.jobs.analytics_rollup import fold_rollups
+from app.jobs.order_expiry import expire_reservations
+
+PRODUCTS = 5000
+ORDERS = 20000
+ITEMS_PER_ORDER = 3
+# С какого размера таблица считается большой: Seq Scan по ней в запросе ручки — ошибка
+LARGE_TABLE_ROWS = 1000
+
+
+@pytest_asyncio.fixture
+async def seeded_engine():
+    """
+    Засеянная БД как у живого склада: заказы за 60 дней, большинство доставлено,
+    pending — меньшинство и только за последние минуты. ANALYZE — чтобы планировщик знал размеры таблиц.
+    """
+    engine = create_async_engine(os.environ["TEST_DATABASE_URL"])
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            INSERT INTO products (name, price, quantity)
+            SELECT 'seed-' || g, (g % 100) + 0.99, 1000 FROM generate_series(1, :n) AS g
+        """), {"n": PRODUCTS})
+        await conn.execute(text("""
+            INSERT INTO orders (customer_name, total_price, status, created_at)
+            SELECT 'customer-' || (g % 2000), 10,
+                   (CASE WHEN g % 20 = 0 THEN 'pending' WHEN g % 20 = 1 THEN 'cancelled' ELSE 'delivered' END)::orderstatusenum,
+                   CASE WHEN g % 20 = 0
+                        -- pending — свежие, моложе TTL резерва
+                        THEN now() - (g % 600) * interval '1 second'
+                        ELSE now() - (g % 60) * interval '1 day' - (g % 1440) * interval '1 minute' END
+            FROM generate_series(1, :n) AS g
+        """), {"n": ORDERS})
+        await conn.execute(text("""
+            INSERT INTO order_items (order_id, order_created_at, product_id, quantity, unit_price)
+            SELECT o.id, o.created_at, p.id, 1, p.price::numeric(12, 2)
+            FROM orders o
+            CROSS JOIN generate_series(0, :k - 1) AS k
+            JOIN products p ON p.id = (SELECT min(id) FROM products) + (o.id * 7 + k * 13) % :products
+        """), {"k": ITEMS_PER_ORDER, "products": PRODUCTS})
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("ANALYZE products, orders, order_items"))
+    yield engine
+    await engine.dispose()
+
+
+async def _exercise(client, engine):
+    """
+    Ходит по ручкам, которые обслуживают живой трафик; каждая вызывает свой CRUD.
+    """
+    async with engine.connect() as conn:
+        product_ids = list((await conn.execute(text("SELECT id FROM products ORDER BY id LIMIT 3"))).scalars())
+        order_id = (await conn.execute(text("SELECT max(id) FROM orders"))).scalar_one()
+
+    assert (await client.get(f"/products/{product_ids[0]}")).status_code == 200
+    for sort_by in ("id", "price", "quantity", "name"):
+        resp = await client.get("/products/list", params={"sort_by": sort_by, "limit": 20})
+        assert resp.status_code == 200
+        cursor = resp.json().get("next_cursor")
+        if cursor:
+            assert (await client.get("/products/list", params={"sort_by": sort_by, "cursor": cursor})).status_code == 200
+    assert (await client.put(f"/products/{product_ids[2]}", json={"name": "seed-renamed", "price": 1.0, "quantity": 5})).status_code == 200
+
+    created = (await client.post("/orders/", json={
+        "customer_name": "customer-7", "items": [{"product_id": p, "quantity": 1} for p in product_ids],
+    })).json()
+    batch = (await client.post("/orders/batch", json=[
+        {"customer_name": "customer-8", "items": [{"product_id": product_ids[0], "quantity": 1}]},
+    ])).json()
+    assert batch["created"] == 1
+
+    assert (await client.get(f"/orders/{order_id}")).status_code == 200
+    assert (await client.get("/orders/", params={"limit": 50})).status_code == 200
+    assert (await client.get("/orders/", params={"customer_name": "customer-42"})).status_code == 200
+    assert (await client.get("/orders/", params={"status": "pending", "limit": 50})).status_code == 200
+    assert (await client.get("/orders/", params={"created_from": "2026-01-01T00:00:00Z", "limit": 50})).status_code == 200
+    assert (await client.patch(f"/orders/{created['id']}/status", json={"status": "отправлен"})).status_code == 200
+    assert (await client.patch(f"/orders/{created['id']}/status", json={"status": "отменен"})).status_code == 200
+    assert (await client.post("/orders/cancel", json={"customer_name": "customer-8", "status": "pending"})).status_code == 200
+    assert (await client.delete(f"/orders/{order_id}")).status_code == 200
+    assert (await client.get("/analytics/sales/daily", params={"product_id": product_ids[0]})).status_code == 200
+
+    # Фоновые задачи ходят по тем же таблицам
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await expire_reservations(session_factory)
+    await fold_rollups(session_factory)
+
+
+@pytest.mark.asyncio
+async def test_crud_queries_avoid_seq_scans_on_large_tables(client, seeded_engine):
+    with capture_statements() as statements:
+        await _exercise(client, seeded_engine)
+    assert len(statements) > 20
+
+    async with seeded_engine.connect() as conn:
+        tables = await large_tables(conn, LARGE_TABLE_ROWS)
+        assert {"products", "orders", "order_items"} <= tables
+        found = await seq_scans(conn, statements, tables)
+    assert not found, "\n".join(str(scan) for scan in found)
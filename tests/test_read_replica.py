@@ -0,0 +1,106 @@
+# tests/test_read_replica.py
+import os
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base, get_read_session_factory, make_read_session_factory, PRIMARY_PIN_COOKIE
+from app.main import app
+
+# Вторая локальная БД изображает реплику: данные в неё пишем напрямую,
+# чтобы по содержимому ответа было видно, откуда читала ручка.
+TEST_REPLICA_DATABASE_URL = os.getenv("TEST_REPLICA_DATABASE_URL")
+
+pytestmark = [
+    pytest.mark.asyncio,
+    pytest.mark.skipif(not TEST_REPLICA_DATABASE_URL, reason="TEST_REPLICA_DATABASE_URL is not set"),
+]
+
+
+@pytest.fixture
+async def replica():
+    if "warehouse_test" not in TEST_REPLICA_DATABASE_URL:
+        raise RuntimeError("TEST_REPLICA_DATABASE_URL must point to a dedicated test DB")
+
+    primary = create_async_engine(os.environ["TEST_DATABASE_URL"], future=True)
+    engine = create_async_engine(TEST_REPLICA_DATABASE_URL, future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text(
+            "INSERT INTO products (name, description, price, quantity) "
+            "VALUES ('Только на реплике', NULL, 1.0, 1)"
+        ))
+
+    previous = app.dependency_overrides[get_read_session_factory]
+    app.dependency_overrides[get_read_session_factory] = make_read_session_factory(
+        sessionmaker(bind=primary, class_=AsyncSession, expire_on_commit=False),
+        sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False),
+    )
+    try:
+        yield engine
+    finally:
+        app.dependency_overrides[get_read_session_factory] = previous
+        await engine.dispose()
+        await primary.dispose()
+
+
+async def _names(client) -> list[str]:
+    resp = await client.get("/products/list")
+    assert resp.status_code == 200
+    return [it["name"] for it in resp.json()["items"]]
+
+
+async def test_reads_go_to_replica(client, replica):
+    assert await _names(client) == ["Только на реплике"]
+
+
+async def test_client_reads_own_write_from_primary(client, replica):
+    resp = await client.post("/products/", json={"name": "Свежий", "price": 1.0, "quantity": 1})
+    assert resp.status_code == 200
+    assert PRIMARY_PIN_COOKIE in resp.cookies
+
+    # Клиент закреплён за основной БД — видит свою запись, которой нет на реплике
+    assert await _names(client) == ["Свежий"]
+
+    # Окно истекло (кука сброшена) — снова читаем с реплики
+    client.cookies.clear()
+    assert await _names(client) == ["Только на реплике"]
+
+
+async def test_failed_write_does_not_pin(client, replica):
+    resp = await client.post("/products/", json={"name": "", "price": 1.0, "quantity": 1})
+    assert resp.status_code == 422
+    assert PRIMARY_PIN_COOKIE not in resp.cookies
+    assert await _names(client) == ["Только на реплике"]
+
+
+async def test_expired_pin_reads_replica(client, replica):
+    client.cookies.set(PRIMARY_PIN_COOKIE, "1.0")
+    assert await _names(client) == ["Только на реплике"]
+
+
+@pytest.mark.parametrize("until", ["1e12", "inf", "nan"])
+async def test_forged_pin_reads_replica(client, replica, until):
+    # Срок дальше окна сервер не выдаёт — такую куку клиент подделал
+    client.cookies.set(PRIMARY_PIN_COOKIE, until)
+    assert await _names(client) == ["Только на реплике"]
+
+
+async def test_lagging_replica_read_is_not_cached(client, replica):
+    product = (await client.post("/products/", json={"name": "Горячий", "price": 1.0, "quantity": 5})).json()
+    # Реплика ещё не получила запись: у неё старый остаток
+    async with replica.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO products (id, name, description, price, quantity) VALUES (:id, 'Горячий', NULL, 1.0, 1)"
+        ), {"id": product["id"]})
+
+    client.cookies.clear()
+    assert (await client.get(f"/products/{product['id']}")).json()["quantity"] == 1
+
+    # Закреплённый клиент читает основную БД, а не отставшую строку из кэша
+    client.cookies.set(PRIMARY_PIN_COOKIE, f"{time.time() + 1:.3f}")
+    assert (await client.get(f"/products/{product['id']}")).json()["quantity"] == 5
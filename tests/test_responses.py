@@ -0,0 +1,29 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from pydantic import TypeAdapter
+
+from app.core.responses import validated_response
+from app.schemas.order import OrderRead
+
+ORDER_LIST = TypeAdapter(list[OrderRead])
+
+
+def test_validated_response_matches_response_model_output():
+    rows = [{
+        "id": 1,
+        "customer_name": "Клиент",
+        "created_at": datetime(2025, 1, 15, 12, 30, tzinfo=timezone.utc),
+        "status": "pending",
+        "internal_note": "не для клиента",
+        "items": [{"id": 7, "product_id": 3, "quantity": 2, "unit_price": Decimal("199.99"), "line_total": Decimal("399.98")}],
+    }]
+
+    body = json.loads(validated_response(ORDER_LIST, rows).body)
+
+    # То же, что отдал бы FastAPI через response_model
+    assert body == json.loads(ORDER_LIST.dump_json(ORDER_LIST.validate_python(rows)))
+    assert "internal_note" not in body[0]
+    assert body[0]["items"][0]["unit_price"] == 199.99
+    assert body[0]["created_at"] == "2025-01-15T12:30:00Z"
@@ -0,0 +1,177 @@
+import asyncio
+import os
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.crud import stock
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine(os.environ["TEST_DATABASE_URL"])
+    yield sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _sharded_product(client, quantity: int, shards: int) -> dict:
+    product = (await client.post("/products/", json={"name": "Горячий SKU", "price": 2.0, "quantity": quantity})).json()
+    resp = await client.put(f"/products/{product['id']}/stock-shards", json={"shards": shards})
+    assert resp.status_code == 200
+    return resp.json()
+
+
+@pytest.mark.asyncio
+async def test_enable_shards_keeps_total(client):
+    sharded = await _sharded_product(client, quantity=10, shards=4)
+    assert sharded["shard_quantities"] == [3, 3, 2, 2]
+    assert sharded["quantity"] == 10
+
+    product = (await client.get(f"/products/{sharded['product_id']}")).json()
+    assert product["quantity"] == 10
+    page = (await client.get("/products/list")).json()
+    assert page["items"][0]["quantity"] == 10
+
+    # Поступление ложится в пул и тоже видно в сумме
+    added = (await client.post("/products/", json={"name": "Горячий SKU", "price": 2.0, "quantity": 5})).json()
+    assert added["quantity"] == 15
+
+    off = (await client.put(f"/products/{sharded['product_id']}/stock-shards", json={"shards": 0})).json()
+    assert off["shard_quantities"] == [] and off["quantity"] == 15
+
+
+@pytest.mark.asyncio
+async def test_parallel_orders_on_sharded_product_never_oversell(client):
+    sharded = await _sharded_product(client, quantity=30, shards=4)
+    payload = {"customer_name": "Распродажа", "items": [{"product_id": sharded["product_id"], "quantity": 1}]}
+
+    responses = await asyncio.gather(*[client.post("/orders/", json=payload) for _ in range(40)])
+
+    assert sum(r.status_code == 200 for r in responses) == 30
+    assert {r.status_code for r in responses} <= {200, 400}
+    assert (await client.get(f"/products/{sharded['product_id']}")).json()["quantity"] == 0
+
+
+@pytest.mark.asyncio
+async def test_order_spanning_shards_and_cancel(client):
+    sharded = await _sharded_product(client, quantity=8, shards=4)
+    product_id = sharded["product_id"]
+
+    # Ни один шард (по 2) не покрывает 7 — списание идёт по нескольким шардам
+    order = await client.post("/orders/", json={"customer_name": "Опт", "items": [{"product_id": product_id, "quantity": 7}]})
+    assert order.status_code == 200
+    assert (await client.get(f"/products/{product_id}")).json()["quantity"] == 1
+
+    too_much = await client.post("/orders/", json={"customer_name": "Опт", "items": [{"product_id": product_id, "quantity": 2}]})
+    assert too_much.status_code == 400
+
+    await client.patch(f"/orders/{order.json()['id']}/status", json={"status": "отменён"})
+    assert (await client.get(f"/products/{product_id}")).json()["quantity"] == 8
+
+
+@pytest.mark.asyncio
+async def test_rebalance_moves_pool_into_shards(client, session_factory):
+    sharded = await _sharded_product(client, quantity=4, shards=2)
+    product_id = sharded["product_id"]
+    await client.post("/products/", json={"name": "Горячий SKU", "price": 2.0, "quantity": 6})
+
+    async with session_factory() as db:
+        assert await stock.rebalance_all(db) == 1
+        pool = await db.scalar(text("SELECT quantity FROM products WHERE id = :id"), {"id": product_id})
+        shards = (await db.execute(
+            text("SELECT quantity FROM product_stock_shards WHERE product_id = :id ORDER BY shard"), {"id": product_id}
+        )).scalars().all()
+        # Уже ровно — второй проход ничего не меняет
+        assert await stock.rebalance_all(db) == 0
+
+    assert pool == 0
+    assert shards == [5, 5]
+
+
+@pytest.mark.asyncio
+async def test_stock_shards_unknown_product(client):
+    resp = await client.put("/products/999999/stock-shards", json={"shards": 2})
+    assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_batch_orders_on_sharded_product(client):
+    sharded = await _sharded_product(client, quantity=10, shards=4)
+    product_id = sharded["product_id"]
+    batch = [
+        {"customer_name": "Пакет по шардам", "items": [{"product_id": product_id, "quantity": 4}]}
+        for _ in range(3)
+    ]
+    data = (await client.post("/orders/batch", json=batch)).json()
+    assert [r["status"] for r in data["rows"]] == ["created", "created", "rejected"]
+    assert (await client.get(f"/products/{product_id}")).json()["quantity"] == 2
+
+    # Отмена возвращает остаток, как у обычного заказа
+    await client.patch(f"/orders/{data['rows'][0]['id']}/status", json={"status": "отменен"})
+    assert (await client.get(f"/products/{product_id}")).json()["quantity"] == 6
+
+
+@pytest.mark.asyncio
+async def test_cancel_mixed_order_while_batch_reserves(client):
+    # Шардированный товар с меньшим id: резервирование блокирует его после обычного
+    sharded = await _sharded_product(client, quantity=1000, shards=2)
+    plain = (await client.post("/products/", json={"name": "Обычный рядом", "price": 1.0, "quantity": 1000})).json()
+    items = [{"product_id": sharded["product_id"], "quantity": 1}, {"product_id": plain["id"], "quantity": 1}]
+    orders = [
+        (await client.post("/orders/", json={"customer_name": "Смешанный", "items": items})).json()["id"]
+        for _ in range(6)
+    ]
+
+    # Отмена возвращает остаток в том же порядке блокировок, что и пакет, — без дедлока
+    responses = await asyncio.gather(*[
+        request
+        for order_id in orders
+        for request in (
+            client.patch(f"/orders/{order_id}/status", json={"status": "отменен"}),
+            client.post("/orders/batch", json=[{"customer_name": "Пакет рядом", "items": items}]),
+        )
+    ])
+
+    assert {r.status_code for r in responses} == {200}
+    assert (await client.get(f"/products/{sharded['product_id']}")).json()["quantity"] == 994
+    assert (await client.get(f"/products/{plain['id']}")).json()["quantity"] == 994
+
+
+@pytest.mark.asyncio
+async def test_busy_shards_are_waited_for_not_locked_together(client, monkeypatch):
+    sharded = await _sharded_product(client, quantity=1000, shards=2)
+    payload = {"customer_name": "Очередь", "items": [{"product_id": sharded["product_id"], "quantity": 1}]}
+    slow_path = []
+    across = stock._reserve_across_shards
+
+    async def counted(*args):
+        slow_path.append(args)
+        return await across(*args)
+
+    monkeypatch.setattr(stock, "_reserve_across_shards", counted)
+    # Заказов больше, чем шардов: занятый шард ждут, а не блокируют пул и все шарды
+    responses = await asyncio.gather(*[client.post("/orders/", json=payload) for _ in range(10)])
+
+    assert {r.status_code for r in responses} == {200}
+    assert slow_path == []
+    assert (await client.get(f"/products/{sharded['product_id']}")).json()["quantity"] == 990
+
+
+@pytest.mark.asyncio
+async def test_sort_by_quantity_uses_full_stock(client):
+    sharded = await _sharded_product(client, quantity=10, shards=4)
+    await client.post("/products/", json={"name": "Обычный", "price": 1.0, "quantity": 5})
+
+    # Пул шардированного товара пуст: сортировка по products.quantity поставила бы его первым
+    page = (await client.get("/products/list", params={"sort_by": "quantity"})).json()
+    assert [(it["id"] == sharded["product_id"], it["quantity"]) for it in page["items"]] == [(False, 5), (True, 10)]
+
+    first = (await client.get("/products/list", params={"sort_by": "quantity", "sort_order": "desc", "limit": 1})).json()
+    second = (await client.get("/products/list", params={
+        "sort_by": "quantity", "sort_order": "desc", "limit": 1, "cursor": first["next_cursor"],
+    })).json()
+    assert [first["items"][0]["quantity"], second["items"][0]["quantity"]] == [10, 5]
+    assert second["next_cursor"] is None
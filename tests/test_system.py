@@ -34,3 +34,12 @@ async def test_echo_validation_error(client, payload):
     data = resp.json()
     assert "detail" in data
 
+
+@pytest.mark.asyncio
+async def test_pool_stats(client):
+    response = await client.get("/system/pool")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["capacity"] >= data["size"]
+    assert 0.0 <= data["saturation"] <= 1.0
+    assert data["checkout_wait_seconds"]["buckets"]["+Inf"] == data["checkout_wait_seconds"]["count"]